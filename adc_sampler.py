@@ -0,0 +1,163 @@
+"""Высокочастотное сэмплирование АЦП (температура, Vsys) с агрегацией за интервал.
+
+Отсчёты снимаются по machine.Timer и сразу идут в накопители интервала,
+сами отсчёты не хранятся. В обработчике таймера только целочисленные
+операции над готовыми переменными и массивом гистограммы, без выделения
+памяти: сумма, min/max, сумма квадратов отклонений с переносом в старший
+разряд и гистограмма для p95.
+"""
+
+from array import array
+
+import machine
+
+# Гистограмма вокруг среднего прошлого интервала: 64 корзины по 2 отсчёта 12-бит АЦП
+HIST_BINS = 64
+HIST_SHIFT = 1
+
+# Сумма квадратов хранится в двух small int, чтобы не выйти в длинную арифметику
+CARRY_BITS = 24
+CARRY_MASK = (1 << CARRY_BITS) - 1
+
+# Вольт на отсчёт 12-бит АЦП
+VOLTS_PER_COUNT = 3.3 / 4095
+
+
+class ChannelStats:
+    """Накопители одного канала АЦП за текущий интервал."""
+
+    def __init__(self, adc):
+        self.adc = adc
+        self.hist = array("I", bytes(4 * HIST_BINS))
+        # Первый отсчёт задаёт центр гистограммы для первого интервала
+        self.reset(adc.read_u16() >> 4)
+
+    def reset(self, reference: int):
+        """Начать новый интервал с опорной точкой reference (отсчёты 12-бит)."""
+        self.count = 0
+        self.total = 0
+        self.sq_low = 0
+        self.sq_high = 0
+        self.low = 4095
+        self.high = 0
+        self.reference = reference
+        self.hist_base = reference - (HIST_BINS << HIST_SHIFT) // 2
+        for i in range(HIST_BINS):
+            self.hist[i] = 0
+
+    def add(self):
+        """Снять отсчёт (вызывается из обработчика таймера)."""
+        value = self.adc.read_u16() >> 4
+        self.count += 1
+        self.total += value
+        if value < self.low:
+            self.low = value
+        if value > self.high:
+            self.high = value
+
+        deviation = value - self.reference
+        self.sq_low += deviation * deviation
+        if self.sq_low > CARRY_MASK:
+            self.sq_high += self.sq_low >> CARRY_BITS
+            self.sq_low &= CARRY_MASK
+
+        index = (value - self.hist_base) >> HIST_SHIFT
+        if index < 0:
+            index = 0
+        elif index >= HIST_BINS:
+            index = HIST_BINS - 1
+        self.hist[index] += 1
+
+    def aggregate(self, quantile: float) -> tuple:
+        """(count, mean, min, max, stddev, quantile) в отсчётах 12-бит и сброс интервала."""
+        state = machine.disable_irq()
+        count, total = self.count, self.total
+        sq_sum = (self.sq_high << CARRY_BITS) + self.sq_low
+        low, high, reference, hist_base = self.low, self.high, self.reference, self.hist_base
+
+        # Квантиль по гистограмме считаем до сброса, пока прерывания запрещены
+        target = quantile * count
+        cumulative = 0
+        bin_index = HIST_BINS - 1
+        for i in range(HIST_BINS):
+            cumulative += self.hist[i]
+            if cumulative >= target:
+                bin_index = i
+                break
+
+        mean = total / count if count else 0
+        self.reset(int(mean + 0.5) if count else reference)
+        machine.enable_irq(state)
+
+        if not count:
+            return 0, 0, 0, 0, 0, 0
+
+        offset = mean - reference
+        variance = max(0, sq_sum / count - offset * offset)
+        value_at_quantile = hist_base + (bin_index << HIST_SHIFT) + (1 << HIST_SHIFT) / 2
+        value_at_quantile = max(low, min(high, value_at_quantile))
+        return count, mean, low, high, variance**0.5, value_at_quantile
+
+
+def counts_to_celsius(counts: float) -> float:
+    """Отсчёты 12-бит встроенного датчика в °C (та же формула, что в SystemMetrics)."""
+    return 27 - (counts * VOLTS_PER_COUNT - 0.706) / 0.001721
+
+
+class ADCSampler:
+    def __init__(self, rate_hz: int = 100):
+        self.rate_hz = rate_hz
+        self.temperature = ChannelStats(machine.ADC(4))
+        self.vsys = ChannelStats(machine.ADC(29))
+        self.timer = None
+        # Связанный метод создаётся один раз, а не при каждом срабатывании таймера
+        self._callback = self._tick
+
+    def start(self):
+        """Запустить периодическое сэмплирование."""
+        self.timer = machine.Timer(
+            mode=machine.Timer.PERIODIC, freq=self.rate_hz, callback=self._callback
+        )
+
+    def stop(self):
+        if self.timer is not None:
+            self.timer.deinit()
+            self.timer = None
+
+    def _tick(self, timer):
+        self.sample()
+
+    def sample(self):
+        """Один отсчёт обоих каналов (без таймера - из цикла ядра 1 в режиме "dual")."""
+        self.temperature.add()
+        self.vsys.add()
+
+    def collect(self, registry) -> bool:
+        """Записать агрегаты за прошедший интервал в реестр; False, если отсчётов не было.
+
+        Агрегаты считаются раз за интервал, здесь float допустимы; в реестр
+        уходят целые с множителем схемы.
+        """
+        # Температура убывает с ростом напряжения: p95 температуры - это p5 отсчётов
+        count, mean, low, high, stddev, p05 = self.temperature.aggregate(0.05)
+        if not count:
+            return False
+        celsius_per_count = VOLTS_PER_COUNT / 0.001721
+
+        _, vsys_mean, vsys_low, vsys_high, vsys_stddev, vsys_p95 = self.vsys.aggregate(0.95)
+        volts = VOLTS_PER_COUNT * 3
+
+        put = registry.put
+        slot = registry.index
+        put(slot["temperature_celsius"], round(counts_to_celsius(mean) * 100))
+        put(slot["temperature_min_celsius"], round(counts_to_celsius(high) * 100))
+        put(slot["temperature_max_celsius"], round(counts_to_celsius(low) * 100))
+        put(slot["temperature_stddev_celsius"], round(stddev * celsius_per_count * 100))
+        put(slot["temperature_p95_celsius"], round(counts_to_celsius(p05) * 100))
+        put(slot["vsys_voltage"], round(vsys_mean * volts * 100))
+        put(slot["vsys_min_voltage"], round(vsys_low * volts * 100))
+        put(slot["vsys_max_voltage"], round(vsys_high * volts * 100))
+        put(slot["vsys_stddev_voltage"], round(vsys_stddev * volts * 1000))
+        put(slot["vsys_p95_voltage"], round(vsys_p95 * volts * 100))
+        put(slot["adc_samples"], count)
+        return True
@@ -0,0 +1,240 @@
+"""Неблокирующий режим работы на uasyncio.
+
+Сэмплирование, публикация, надзор за WiFi/MQTT и keepalive - независимые
+задачи, связанные ограниченной очередью. Сэмплы снимаются по расписанию,
+что бы ни происходило с сетью. Здоровье оценивается в самом сэмпле, смену
+статуса публикатор отправляет сразу, минуя пакет.
+
+Вызовы umqtt.simple синхронные: connect(), ожидание SUBACK и запись в
+медленный сокет останавливают весь цикл, включая сэмплер. Замер без
+таких пауз - RUNTIME_MODE = "dual" (dual_core.py).
+"""
+
+import gc
+import time
+
+import uasyncio as asyncio
+
+from metric_registry import MetricSnapshot
+
+
+class SampleQueue:
+    """Ограниченная очередь; при переполнении вытесняется самый старый элемент."""
+
+    def __init__(self, size: int):
+        self.items = [None] * size
+        self.size = size
+        self.head = 0
+        self.count = 0
+        self.dropped = 0
+        self.event = asyncio.Event()
+
+    def put(self, item):
+        if self.count == self.size:
+            self.items[self.head] = None
+            self.head = (self.head + 1) % self.size
+            self.count -= 1
+            self.dropped += 1
+        self.items[(self.head + self.count) % self.size] = item
+        self.count += 1
+        self.event.set()
+
+    async def get(self):
+        while self.count == 0:
+            self.event.clear()
+            await self.event.wait()
+        item = self.items[self.head]
+        self.items[self.head] = None
+        self.head = (self.head + 1) % self.size
+        self.count -= 1
+        return item
+
+
+class AsyncRuntime:
+    def __init__(
+        self,
+        monitor,
+        queue_size: int = 8,
+        wifi_check_ms: int = 2000,
+        ping_interval_ms: int = 30000,
+    ):
+        self.monitor = monitor
+        self.wifi_check_ms = wifi_check_ms
+        self.ping_interval_ms = ping_interval_ms
+
+        self.queue = SampleQueue(queue_size)
+        # Реестр сборщиков общий: в очередь идут копии из кольца заранее созданных
+        # снимков. Ещё два - на сэмпл, который публикуется, и на записываемый
+        registry = monitor.metrics.registry
+        self.snapshots = [MetricSnapshot(registry) for _ in range(queue_size + 2)]
+        self.snapshot_index = 0
+        self.network_ready = asyncio.Event()
+
+        # Отклонение момента сэмпла от расписания
+        self.sample_lateness_ms = 0
+        self.sample_lateness_max_ms = 0
+
+    async def sampler(self):
+        """Снятие сэмплов по фиксированной сетке времени."""
+        deadline = time.ticks_ms()
+        while True:
+            delay = time.ticks_diff(deadline, time.ticks_ms())
+            if delay > 0:
+                await asyncio.sleep_ms(delay)
+            lateness = time.ticks_diff(time.ticks_ms(), deadline)
+            self.sample_lateness_ms = lateness
+            self.sample_lateness_max_ms = max(self.sample_lateness_max_ms, lateness)
+            # Интервал читается каждый раз: его меняет топик конфигурации
+            deadline = time.ticks_add(deadline, self.monitor.schedule.publish_interval_ms)
+            # После долгой блокировки не догоняем пропущенные слоты пачкой
+            if time.ticks_diff(deadline, time.ticks_ms()) < 0:
+                deadline = time.ticks_ms()
+
+            snapshot = self.snapshots[self.snapshot_index]
+            self.snapshot_index = (self.snapshot_index + 1) % len(self.snapshots)
+            self.queue.put(snapshot.copy_from(self.monitor.collect_metrics()))
+            # Сканирование эфира блокирует цикл событий: сразу после сэмпла оно
+            # задерживает публикацию, но не следующий замер
+            self.monitor.wifi.refresh_ap()
+
+    async def publisher(self):
+        """Публикация сэмплов из очереди или сохранение в offline-буфер."""
+        monitor = self.monitor
+        while True:
+            metrics = await self.queue.get()
+            # Только /metrics: сэмпл уже отдан серверу при сборе
+            if not monitor.mqtt_enabled:
+                monitor.print_summary(metrics)
+                continue
+            if not self.network_ready.is_set():
+                monitor.store_offline(metrics)
+                continue
+
+            monitor.print_summary(metrics)
+            print(
+                f"Sample lateness: {self.sample_lateness_ms} ms "
+                f"(max {self.sample_lateness_max_ms} ms, queue dropped {self.queue.dropped})"
+            )
+            monitor.process_sample(metrics)
+            if not monitor.mqtt.is_connected():
+                self.network_ready.clear()
+            await asyncio.sleep_ms(0)
+
+    async def network_supervisor(self):
+        """Надзор за WiFi и MQTT с экспоненциальной паузой и разбросом между попытками."""
+        monitor = self.monitor
+        wifi = monitor.wifi
+        connected_once = False
+        # Отсчёт времени переподключения только после первого выхода в сеть
+        online_once = False
+        fast = True
+        while True:
+            if not wifi.is_connected():
+                self.network_ready.clear()
+                if online_once:
+                    wifi.mark_lost()
+                monitor.mqtt.disconnect()
+                wifi.start_connect(fast)
+                started = time.ticks_ms()
+                while not wifi.connect_finished():
+                    if time.ticks_diff(time.ticks_ms(), started) > wifi.timeout_ms:
+                        break
+                    await asyncio.sleep_ms(wifi.poll_ms)
+
+                if not wifi.finish_connect():
+                    # Запомненная точка не ответила - сразу полное подключение без
+                    # блокирующего сканирования; не вышло и оно - ждать паузу
+                    if wifi.fast_attempt:
+                        fast = False
+                        continue
+                    fast = True
+                    backoff_ms = wifi.next_backoff()
+                    print(f"WiFi connection failed, retry in {backoff_ms} ms")
+                    await asyncio.sleep_ms(backoff_ms)
+                    continue
+
+                fast = True
+                if connected_once:
+                    monitor.reconnect_count += 1
+                connected_once = True
+                monitor.wifi_connected()
+
+            if monitor.mqtt_enabled and not monitor.mqtt.is_connected():
+                if online_once:
+                    wifi.mark_lost(wifi=False)
+                if not monitor.connect_mqtt(max_attempts=1):
+                    backoff_ms = wifi.next_backoff()
+                    print(f"MQTT connection failed, retry in {backoff_ms} ms")
+                    await asyncio.sleep_ms(backoff_ms)
+                    continue
+
+            # Конфигурация из подписок (с MQTTLink её уже вычитал is_connected)
+            if monitor.mqtt_enabled:
+                monitor.mqtt.poll_messages()
+            online_once = True
+            self.network_ready.set()
+            await asyncio.sleep_ms(self.wifi_check_ms)
+
+    async def mqtt_keepalive(self):
+        """Периодический PINGREQ, чтобы брокер не разорвал простаивающее соединение."""
+        while True:
+            await asyncio.sleep_ms(self.ping_interval_ms)
+            if not self.network_ready.is_set():
+                continue
+            # После detach() или обрыва клиента уже нет: переподключит надзор за сетью
+            if not self.monitor.mqtt.is_connected():
+                self.network_ready.clear()
+                continue
+            try:
+                self.monitor.mqtt.ping()
+            except OSError as e:
+                print(f"MQTT ping failed: {e}")
+                self.network_ready.clear()
+                self.monitor.mqtt.disconnect()
+
+    async def metrics_http(self):
+        """Обслуживание скрейпов /metrics между остальными задачами."""
+        http = self.monitor.http
+        while True:
+            http.poll()
+            await asyncio.sleep_ms(http.poll_ms)
+
+    async def watchdog(self):
+        """Кормление сторожевого таймера: блокированный цикл событий его не кормит."""
+        watchdog = self.monitor.watchdog
+        while True:
+            watchdog.feed()
+            await asyncio.sleep_ms(watchdog.slice_ms)
+
+    async def _supervise(self, name: str, task):
+        """Перезапуск задачи после ошибки, чтобы одна ошибка не останавливала остальные."""
+        while True:
+            try:
+                await task()
+            except MemoryError as e:
+                print(f"\n[!] Memory Error in {name}: {e}")
+                self.monitor.metrics.memory.collect()
+                print(f"Memory freed: {gc.mem_free()} bytes available")
+            except Exception as e:
+                print(f"\n[!] Unexpected Error in {name}: {e}")
+                self.monitor.error_count += 1
+            await asyncio.sleep_ms(1000)
+
+    async def main(self):
+        print("Starting async runtime...")
+        tasks = [
+            self._supervise("sampler", self.sampler),
+            self._supervise("publisher", self.publisher),
+            self._supervise("network", self.network_supervisor),
+        ]
+        if self.monitor.mqtt_enabled:
+            tasks.append(self._supervise("keepalive", self.mqtt_keepalive))
+        if self.monitor.http is not None:
+            tasks.append(self._supervise("metrics_http", self.metrics_http))
+        if self.monitor.watchdog is not None:
+            tasks.append(self._supervise("watchdog", self.watchdog))
+        await asyncio.gather(*tasks)
+
+    def run(self):
+        """Запуск планировщика (блокирует навсегда)."""
+        asyncio.run(self.main())
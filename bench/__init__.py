@@ -0,0 +1 @@
+"""Хостовые бенчмарки прошивки и сервисов."""
@@ -0,0 +1,146 @@
+"""Архив pico_metrics: скорость записи и задержка запросов на месяцах данных.
+
+Запись: сообщения JSON с дельтами через Archiver.handle (разбор, дополнение
+дельты, журнал, запечатывание сегментов) и объём на диске на сэмпл против
+размера JSON. Запросы: сырой диапазон и агрегаты одной метрики за 1 час - 90
+дней против полного чтения тех же сегментов (все колонки, как у построчного
+архива).
+
+Запуск из корня репозитория:
+    python -m bench.bench_archive [--days 90] [--interval 30] [--devices 1] [--root DIR]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from bench.sample_metrics import MetricsSimulator
+from delta_filter import DeltaFilter
+from host.archive import Archive, Archiver
+
+RANGES = (("1h", 3600), ("1d", 86400), ("7d", 7 * 86400), ("30d", 30 * 86400), ("90d", 90 * 86400))
+START = 1_700_000_000
+
+
+def directory_bytes(root: str) -> int:
+    total = 0
+    for path, _, files in os.walk(root):
+        total += sum(os.path.getsize(os.path.join(path, name)) for name in files)
+    return total
+
+
+def ingest(archiver: Archiver, devices: int, rows: int, interval: int) -> dict:
+    """Сообщения генерируются заранее кусками, чтобы мерить только архив."""
+    simulators = [MetricsSimulator(interval=interval, seed=i) for i in range(devices)]
+    deltas = [DeltaFilter(keyframe_every=30) for _ in range(devices)]
+    elapsed = 0.0
+    payload_bytes = 0
+    chunk = 10000
+    for first in range(0, rows, chunk):
+        messages = []
+        for row in range(first, min(rows, first + chunk)):
+            for device, simulator in enumerate(simulators):
+                metrics = deltas[device].filter(simulator.next())
+                deltas[device].commit(metrics)
+                payload = json.dumps(metrics).encode()
+                payload_bytes += len(payload)
+                messages.append((f"pico_metrics/{device}", payload, START + row * interval))
+        started = time.perf_counter()
+        for topic, payload, received_at in messages:
+            archiver.handle(topic, payload, received_at)
+        elapsed += time.perf_counter() - started
+    started = time.perf_counter()
+    archiver.archive.seal()
+    elapsed += time.perf_counter() - started
+    samples = rows * devices
+    disk = directory_bytes(archiver.archive.root)
+    return {
+        "samples": samples,
+        "samples/s": samples / elapsed,
+        "json B/sample": payload_bytes / samples,
+        "disk B/sample": disk / samples,
+        "segments": archiver.archive.segments_total,
+    }
+
+
+def timed(function, repeat: int) -> float:
+    """Медиана в мс; первый вызов прогревает кэш страниц и открытых сегментов."""
+    function()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def full_scan(archive: Archive, device: str, key: str, start: float, end: float) -> list:
+    """Базовая линия: распаковать все колонки сегментов диапазона."""
+    start_ms, end_ms = int(start * 1000), int(end * 1000)
+    values = []
+    for segment in archive.segments(device, start_ms, end_ms):
+        timestamps = segment.timestamps()
+        rows = {name: segment.column(name) for name in segment.columns}
+        column = rows.get(key) or []
+        values.extend(
+            v for t, v in zip(timestamps, column) if v is not None and start_ms <= t < end_ms
+        )
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--interval", type=int, default=30, help="секунд между сэмплами")
+    parser.add_argument("--devices", type=int, default=1)
+    parser.add_argument("--metric", default="temperature_celsius")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--root", help="каталог архива (по умолчанию временный)")
+    args = parser.parse_args()
+
+    root = args.root or tempfile.mkdtemp(prefix="pico-archive-")
+    try:
+        archiver = Archiver(Archive(root), root="pico_metrics")
+        rows = args.days * 86400 // args.interval
+        result = ingest(archiver, args.devices, rows, args.interval)
+        print(f"ingest: {args.days} days x {args.devices} devices, interval {args.interval} s")
+        print("  ".join(f"{name:>14}" for name in result))
+        print("  ".join(f"{value:>14.6g}" for value in result.values()))
+        print()
+
+        archive = Archive(root)
+        end = START + rows * args.interval
+        metric = args.metric
+        print(
+            f"{'range':>6} {'points':>8} {'range, ms':>10} {'agg, ms':>9} "
+            f"{'agg 1h, ms':>11} {'enum agg, ms':>13} {'scan, ms':>9}"
+        )
+        for label, seconds in RANGES:
+            if seconds > args.days * 86400:
+                break
+            # Диапазон не выровнен по сегментам: края распаковываются
+            start = end - seconds - 0.5 * args.interval
+            points = len(archive.range("0", metric, start, end)[0])
+            row = (
+                timed(lambda: archive.range("0", metric, start, end), args.repeat),
+                timed(lambda: archive.aggregate("0", metric, start, end), args.repeat),
+                timed(lambda: archive.aggregate("0", metric, start, end, 3600), args.repeat),
+                timed(lambda: archive.aggregate("0", "health_status", start, end), args.repeat),
+                timed(lambda: full_scan(archive, "0", metric, start, end), 1),
+            )
+            print(
+                f"{label:>6} {points:>8} {row[0]:>10.2f} {row[1]:>9.2f} "
+                f"{row[2]:>11.2f} {row[3]:>13.2f} {row[4]:>9.1f}"
+            )
+        archive.close()
+    finally:
+        if not args.root:
+            shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
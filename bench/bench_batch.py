@@ -0,0 +1,67 @@
+"""Пакетная публикация: объём, число сообщений и задержка в зависимости от размера пакета.
+
+Запуск из корня репозитория:
+    python -m bench.bench_batch [--interval 1] [--sizes 1,5,10,30,60]
+"""
+
+import argparse
+import time
+
+from bench.sample_metrics import MetricsSimulator
+from host.codec import decode_batch
+from payload_codec import BatchWriter, BinaryEncoder
+
+# Накладные расходы на одно сообщение: TCP/IP заголовки и фиксированная часть PUBLISH
+TCP_IP_OVERHEAD = 40
+MQTT_FIXED_OVERHEAD = 4
+
+
+def run(interval: float, batch_size: int, samples: int = 3600) -> dict:
+    """Прогнать samples сэмплов через BatchWriter и посчитать характеристики."""
+    simulator = MetricsSimulator(interval=int(interval) or 1)
+    encoder = BinaryEncoder()
+    batch = BatchWriter(batch_size, len(encoder.buffer))
+    topic = b"pico_metrics/batch"
+
+    wire_bytes = payload_bytes = messages = decoded = 0
+    started = time.perf_counter()
+    for sequence in range(1, samples + 1):
+        batch.add(int(sequence * interval), sequence, encoder.encode(simulator.next()))
+        if batch.count == batch_size or sequence == samples:
+            payload = bytes(batch.finish(int(sequence * interval)))
+            decoded += len(decode_batch(payload, received_at=sequence * interval))
+            payload_bytes += len(payload)
+            wire_bytes += len(payload) + len(topic) + MQTT_FIXED_OVERHEAD + TCP_IP_OVERHEAD
+            messages += 1
+            batch.reset()
+    elapsed = time.perf_counter() - started
+    assert decoded == samples, "lost samples in batch round-trip"
+
+    hours = samples * interval / 3600
+    return {
+        "batch": batch_size,
+        "buffer": len(batch.buffer),
+        "messages/h": messages / hours,
+        "wire B/h": wire_bytes / hours,
+        "B/sample": wire_bytes / samples,
+        "avg latency s": (batch_size - 1) * interval / 2,
+        "max latency s": (batch_size - 1) * interval,
+        "samples/s host": samples / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--sizes", default="1,5,10,30,60")
+    args = parser.parse_args()
+
+    rows = [run(args.interval, int(size)) for size in args.sizes.split(",")]
+    columns = list(rows[0])
+    print("  ".join(f"{column:>14}" for column in columns))
+    for row in rows:
+        print("  ".join(f"{row[column]:>14.7g}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Байты в час с deadband/delta публикацией и без неё.
+
+Запуск из корня репозитория:
+    python -m bench.bench_delta [--interval 10] [--keyframe-every 30]
+"""
+
+import argparse
+import json
+
+from bench.sample_metrics import MetricsSimulator
+from delta_filter import DeltaFilter
+from payload_codec import BinaryEncoder
+
+
+def bytes_per_hour(interval: int, keyframe_every: int) -> dict:
+    """Прогнать час симуляции и посчитать объём для всех режимов."""
+    cycles = 3600 // interval
+    simulator = MetricsSimulator(interval=interval)
+    delta = DeltaFilter(keyframe_every=keyframe_every)
+    encoder = BinaryEncoder()
+
+    totals = {"json full": 0, "json delta": 0, "binary full": 0, "binary delta": 0}
+    messages = 0
+    for _ in range(cycles):
+        metrics = simulator.next()
+        payload = delta.filter(metrics)
+        delta.commit(payload)
+
+        totals["json full"] += len(json.dumps(metrics))
+        totals["binary full"] += len(encoder.encode(metrics))
+        if payload:
+            messages += 1
+            totals["json delta"] += len(json.dumps(payload))
+            totals["binary delta"] += len(encoder.encode(payload))
+
+    totals["delta messages"] = messages
+    totals["cycles"] = cycles
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--interval", type=int, default=10)
+    parser.add_argument("--keyframe-every", type=int, default=30)
+    args = parser.parse_args()
+
+    totals = bytes_per_hour(args.interval, args.keyframe_every)
+    print(f"interval {args.interval}s, keyframe every {args.keyframe_every} cycles")
+    print(f"messages: {totals['delta messages']}/{totals['cycles']} with delta publishing")
+    for mode in ("json", "binary"):
+        full, delta = totals[f"{mode} full"], totals[f"{mode} delta"]
+        print(f"{mode:<7} before {full:>8} B/h  after {delta:>8} B/h  ({full / delta:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Джиттер сэмплирования и пропускная способность: один цикл против двух потоков с кольцом.
+
+Модель на хосте: сбор - реестр прошивки, кодирование - JSONWriter, сеть -
+блокирующая пауза публикации и периодические долгие зависания (переподключение
+WiFi). Однопоточный цикл держит сетку времени, как RUNTIME_MODE = "async",
+двухпоточный повторяет DualCoreRuntime: сэмплер пишет в SampleRing, второй
+поток кодирует и публикует. На устройстве те же величины - метрики
+sample_jitter_us, sample_jitter_max_us и samples_total.
+
+Запуск из корня репозитория:
+    python -m bench.bench_dual_core [--interval-ms 20] [--duration 5] [--stall-ms 300]
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+from bench.sample_metrics import MetricsSimulator
+from dual_core import SampleRing
+from metric_registry import JSONWriter, MetricRegistry
+
+
+class Network:
+    """Публикация: publish_ms на сообщение, раз в stall_every секунд - зависание на stall_ms."""
+
+    def __init__(self, publish_ms: float, stall_ms: float, stall_every: float):
+        self.publish = publish_ms / 1000
+        self.stall = stall_ms / 1000
+        self.stall_every = stall_every
+        self.next_stall = time.perf_counter() + stall_every
+        self.writer = JSONWriter()
+        self.published = 0
+
+    def send(self, metrics):
+        self.writer.render(metrics)
+        delay = self.publish
+        if self.stall and time.perf_counter() >= self.next_stall:
+            delay += self.stall
+            self.next_stall += self.stall_every
+        time.sleep(delay)
+        self.published += 1
+
+
+class Sampler:
+    """Сбор в реестр по сетке времени с замером отклонения интервала."""
+
+    def __init__(self, interval_ms: float):
+        self.interval = interval_ms / 1000
+        self.registry = MetricRegistry()
+        self.simulator = MetricsSimulator(seed=0)
+        self.jitter_us = []
+        self.last = None
+        self.deadline = time.perf_counter()
+
+    def wait(self):
+        delay = self.deadline - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        now = time.perf_counter()
+        if self.last is not None:
+            self.jitter_us.append(abs(now - self.last - self.interval) * 1e6)
+        self.last = now
+        self.deadline += self.interval
+        # Как на устройстве: после долгой паузы пропущенные слоты не догоняются
+        if self.deadline < now:
+            self.deadline = now
+
+    def collect(self):
+        self.registry.clear()
+        self.registry.update(self.simulator.next())
+        return self.registry
+
+
+def single_core(args) -> dict:
+    sampler = Sampler(args.interval_ms)
+    network = Network(args.publish_ms, args.stall_ms, args.stall_every)
+    end = time.perf_counter() + args.duration
+    while time.perf_counter() < end:
+        sampler.wait()
+        network.send(sampler.collect())
+    return summary("single", sampler, network, 0, args.duration)
+
+
+def dual_core(args) -> dict:
+    sampler = Sampler(args.interval_ms)
+    network = Network(args.publish_ms, args.stall_ms, args.stall_every)
+    ring = SampleRing(sampler.registry, args.ring)
+    end = time.perf_counter() + args.duration
+    running = True
+
+    def core1():
+        seq = 0
+        while time.perf_counter() < end:
+            sampler.wait()
+            metrics = sampler.collect()
+            record = ring.reserve()
+            if record is not None:
+                seq += 1
+                record.copy_from(metrics)
+                ring.commit(seq)
+
+    def core0():
+        while running or ring.pending():
+            entry = ring.peek()
+            if entry is None:
+                time.sleep(0.001)
+                continue
+            network.send(entry[0])
+            ring.release()
+
+    threads = [threading.Thread(target=core1), threading.Thread(target=core0)]
+    for thread in threads:
+        thread.start()
+    threads[0].join()
+    running = False
+    threads[1].join()
+    return summary("dual", sampler, network, ring.dropped, args.duration)
+
+
+def summary(mode: str, sampler: Sampler, network: Network, dropped: int, duration: float):
+    jitter = sorted(sampler.jitter_us) or [0.0]
+    return {
+        "mode": mode,
+        "jitter p50, us": statistics.median(jitter),
+        "jitter p95, us": jitter[int(len(jitter) * 0.95) - 1] if len(jitter) >= 20 else jitter[-1],
+        "jitter max, us": jitter[-1],
+        "sampled/s": (len(sampler.jitter_us) + 1) / duration,
+        "published/s": network.published / duration,
+        "dropped": dropped,
+    }
+
+
+def print_table(title: str, rows: list):
+    print(title)
+    columns = list(rows[0])
+    print("  ".join(f"{name:>14}" for name in columns))
+    for row in rows:
+        cells = []
+        for name in columns:
+            value = row[name]
+            cells.append(f"{value:>14.1f}" if isinstance(value, float) else f"{value:>14}")
+        print("  ".join(cells))
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--interval-ms", type=float, default=20)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--publish-ms", type=float, default=2)
+    parser.add_argument("--stall-ms", type=float, default=300)
+    parser.add_argument("--stall-every", type=float, default=1)
+    parser.add_argument("--ring", type=int, default=32)
+    args = parser.parse_args()
+
+    print_table(
+        f"interval {args.interval_ms} ms, publish {args.publish_ms} ms, "
+        f"stall {args.stall_ms} ms every {args.stall_every} s",
+        [single_core(args), dual_core(args)],
+    )
+
+    # Пропускная способность: интервал равен стоимости публикации, без зависаний сети.
+    # Сэмплер без паузы на хосте делил бы GIL с публикацией, на RP2040 ядра честные
+    args.interval_ms = args.publish_ms
+    args.stall_ms = 0
+    print_table(
+        f"throughput (interval {args.interval_ms} ms, no stalls)",
+        [single_core(args), dual_core(args)],
+    )
+
+
+if __name__ == "__main__":
+    main()
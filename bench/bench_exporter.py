@@ -0,0 +1,109 @@
+"""Экспортёр: сообщений в секунду, стоимость /metrics и память на устройство.
+
+Запуск из корня репозитория:
+    python -m bench.bench_exporter [--devices 1,10,100,1000] [--rounds 20]
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+from bench.sample_metrics import MetricsSimulator
+from delta_filter import DeltaFilter
+from host.exporter import Exporter
+from payload_codec import BinaryEncoder
+
+
+def rss_bytes() -> int:
+    """Текущий RSS процесса (Linux), иначе 0."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * 4096
+    except OSError:
+        return 0
+
+
+def make_messages(devices: int, rounds: int, payload_format: str) -> list:
+    """Заранее закодированные сообщения, чтобы мерить только экспортёр."""
+    encoder = BinaryEncoder()
+    simulators = [MetricsSimulator(seed=i) for i in range(devices)]
+    deltas = [DeltaFilter(keyframe_every=30) for _ in range(devices)]
+    messages = []
+    for device in range(devices):
+        info = {
+            "sys_unique_id": f"e661{device:012x}",
+            "wifi_ip": f"10.0.{device >> 8}.{device & 255}",
+        }
+        messages.append((f"pico_metrics/{device}/info", json.dumps(info).encode()))
+        messages.append((f"pico_metrics/{device}/status", b"online"))
+    for _ in range(rounds):
+        for device, simulator in enumerate(simulators):
+            metrics = simulator.next()
+            if payload_format == "binary":
+                messages.append((f"pico_metrics/{device}/bin", bytes(encoder.encode(metrics))))
+                continue
+            if payload_format == "delta":
+                metrics = deltas[device].filter(metrics)
+                deltas[device].commit(metrics)
+            messages.append((f"pico_metrics/{device}", json.dumps(metrics).encode()))
+    return messages
+
+
+def run(devices: int, rounds: int, payload_format: str) -> dict:
+    messages = make_messages(devices, rounds, payload_format)
+    rss_before = rss_bytes()
+    tracemalloc.start()
+    exporter = Exporter()
+
+    started = time.perf_counter()
+    for topic, payload in messages:
+        exporter.handle(topic, payload, received_at=0.0)
+    handle_seconds = time.perf_counter() - started
+    traced = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # Первый scrape пересобирает текст, повторный без новых данных - из кэша
+    started = time.perf_counter()
+    body = exporter.metrics_body()
+    render_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    exporter.metrics_body()
+    cached_seconds = time.perf_counter() - started
+
+    return {
+        "format": payload_format,
+        "devices": devices,
+        "msgs/s": len(messages) / handle_seconds,
+        "render ms": render_seconds * 1000,
+        "cached ms": cached_seconds * 1000,
+        "body KB": len(body) / 1024,
+        "store B/dev": traced / devices,
+        "RSS B/dev": max(0, rss_bytes() - rss_before) / devices,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", default="1,10,100,1000")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--formats", default="json,delta,binary")
+    args = parser.parse_args()
+
+    rows = [
+        run(int(devices), args.rounds, payload_format)
+        for payload_format in args.formats.split(",")
+        for devices in args.devices.split(",")
+    ]
+    columns = list(rows[0])
+    print("  ".join(f"{column:>12}" for column in columns))
+    for row in rows:
+        print(
+            "  ".join(
+                f"{row[c]:>12}" if isinstance(row[c], str) else f"{row[c]:>12.6g}" for c in columns
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
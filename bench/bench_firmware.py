@@ -0,0 +1,108 @@
+"""Прогон прошивки в симуляции: время цикла, трафик, аллокации и восстановление после обрывов.
+
+PicoMonitor из main.py работает без изменений на виртуальном времени (host.sim),
+поэтому час работы устройства укладывается в доли секунды.
+
+Запуск из корня репозитория:
+    python -m bench.bench_firmware [--hours 1] [--scenarios steady,wifi_outage]
+"""
+
+import argparse
+import time
+
+from host.sim import Simulation
+
+# Функции, которые проверяют сценарии обрывов и сбросов (по умолчанию выключены)
+BASE_CONFIG = {
+    "WIFI_FAST_REJOIN": True,
+    "OFFLINE_BUFFER_SAMPLES": 64,
+    "OFFLINE_FLASH_SEGMENTS": 4,
+    "STATE_CHECKPOINT_INTERVAL": 300,
+}
+
+# Конфигурации прошивки, которые сравниваются в каждом сценарии
+CONFIGS = {
+    "json": {},
+    "json+delta": {"DELTA_PUBLISHING": True},
+    "binary": {"PAYLOAD_FORMAT": "binary"},
+    "batch10": {"PAYLOAD_FORMAT": "binary", "BATCH_SIZE": 10},
+    "no-rejoin": {"WIFI_FAST_REJOIN": False},
+    "static-ip": {
+        "WIFI_STATIC_IP": ("192.168.1.77", "255.255.255.0", "192.168.1.1", "192.168.1.1"),
+    },
+    "qos1+ping": {
+        "MQTT_QOS": 1,
+        "MQTT_PERSISTENT_SESSION": True,
+        "MQTT_PING_INTERVAL": 5,
+    },
+}
+
+# Сценарии: обрывы WiFi и брокера как (начало, конец) в секундах от старта
+SCENARIOS = {
+    "steady": {},
+    "wifi_outage": {"wifi_outages": [(600, 720)]},
+    "broker_outage": {"broker_outages": [(900, 960)]},
+    "flapping": {"wifi_outages": [(300 + 400 * i, 330 + 400 * i) for i in range(8)]},
+    # Сбросы питания: счётчики продолжаются с записи на flash, WiFi - с кэша точки
+    "resets": {"resets": [900, 2100]},
+}
+
+
+def run(scenario: str, config: str, hours: float) -> dict:
+    """Один прогон сценария с заданной конфигурацией прошивки."""
+    spec = SCENARIOS[scenario]
+    started = time.perf_counter()
+    overrides = dict(BASE_CONFIG, **CONFIGS[config])
+    result = Simulation(duration=hours * 3600, config=overrides, **spec).run()
+    elapsed = time.perf_counter() - started
+
+    outages = list(spec.get("wifi_outages", ())) + list(spec.get("broker_outages", ()))
+    recovery = [t for t in result.recovery_times(outages) if t is not None]
+    summary = result.summary()
+    link = result.monitor.mqtt.get_link_stats()
+    wifi = result.monitor.wifi.get_stats()
+    return {
+        "scenario": scenario,
+        "config": config,
+        "cycles": summary["cycles"],
+        "cycle us": summary["cycle_us_avg"],
+        "cycle p95 us": summary["cycle_us_p95"],
+        "alloc B/cycle": summary["alloc_bytes_per_cycle"],
+        "msgs": summary["messages"],
+        "B/h": summary["bytes_per_hour"],
+        "recovery s": max(recovery) if recovery else 0,
+        "1st pub p95 ms": wifi["wifi_first_publish_ms_p95"],
+        "boots": result.env.boots,
+        "boot pub ms": result.monitor.state.boot_ms.get("first_publish", 0),
+        "scans": result.env.network.scans,
+        "lost msgs": result.env.broker.dropped,
+        "redelivered": link.get("mqtt_redelivered_total", 0),
+        "detect ms": link.get("mqtt_link_detect_ms", 0),
+        "sim x": result.duration / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hours", type=float, default=1.0)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--configs", default=",".join(CONFIGS))
+    args = parser.parse_args()
+
+    rows = [
+        run(scenario, config, args.hours)
+        for scenario in args.scenarios.split(",")
+        for config in args.configs.split(",")
+    ]
+    columns = list(rows[0])
+    print("  ".join(f"{column:>13}" for column in columns))
+    for row in rows:
+        print(
+            "  ".join(
+                f"{row[c]:>13}" if isinstance(row[c], str) else f"{row[c]:>13.6g}" for c in columns
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""Нагрузка парка устройств на брокер и экспортёр.
+
+N виртуальных Pico с отдельными деревьями топиков (DEVICE_TOPICS) публикуют
+payload формы SystemMetrics.get_all_metrics с джиттером интервала, случайными
+обрывами и одновременным переподключением всех устройств (reconnect storm).
+Брокер - host.broker, экспортёр - host.exporter, всё в одном процессе на
+localhost; Mosquitto и реальные Pico не нужны.
+
+Запуск из корня репозитория:
+    python -m bench.bench_fleet [--devices 10,100,500] [--interval 1] [--duration 20]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict, deque
+
+from bench.sample_metrics import MetricsSimulator
+from delta_filter import DeltaFilter
+from host.broker import Broker
+from host.exporter import Exporter
+from host.mqtt_client import MQTTClient
+from payload_codec import BinaryEncoder
+
+ROOT = "pico_metrics"
+
+
+def rss_bytes() -> int:
+    """Текущий RSS процесса (Linux), иначе 0."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * 4096
+    except OSError:
+        return 0
+
+
+class Fleet:
+    """Состояние прогона: время отправки по топикам, задержки и счётчики."""
+
+    def __init__(self, args, port: int):
+        self.args = args
+        self.port = port
+        self.started = time.perf_counter()
+        self.stop_at = self.started + args.duration
+        self.storm_at = self.started + args.duration * args.storm_at
+        self.sent = defaultdict(deque)
+        self.lags = []
+        self.published = 0
+        self.connects = 0
+        self.connect_failures = 0
+        self.outages = 0
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def on_message(self, topic: str):
+        """Задержка от публикации устройством до обработки экспортёром."""
+        queue = self.sent.get(topic)
+        if queue:
+            self.lags.append(time.perf_counter() - queue.popleft())
+
+    async def device(self, index: int):
+        args = self.args
+        rng = random.Random(index)
+        simulator = MetricsSimulator(interval=max(1, int(args.interval)), seed=index)
+        delta = DeltaFilter(keyframe_every=30) if args.format == "delta" else None
+        encoder = BinaryEncoder() if args.format == "binary" else None
+        device_id = f"e661{index:012x}"
+        topic = f"{ROOT}/{device_id}"
+        data_topic = topic + "/bin" if encoder else topic
+        storm_pending = True
+
+        # Устройства стартуют вразнобой в пределах одного интервала
+        await asyncio.sleep(rng.uniform(0, args.interval))
+        backoff = 0.5
+        while time.perf_counter() < self.stop_at:
+            client_id = f"pico-w-micropython-{device_id}"
+            client = MQTTClient("127.0.0.1", self.port, client_id=client_id, keepalive=0)
+            client.set_last_will(topic + "/status", b"offline", retain=True)
+            try:
+                await client.connect()
+            except (ConnectionError, OSError):
+                self.connect_failures += 1
+                await asyncio.sleep(backoff * rng.uniform(0.5, 1.5))
+                backoff = min(backoff * 2, 8)
+                continue
+            backoff = 0.5
+            self.connects += 1
+            self.sent[data_topic].clear()
+            info = {"sys_unique_id": device_id, "wifi_ip": f"10.0.{index >> 8}.{index & 255}"}
+            await client.publish(topic + "/status", b"online", retain=True)
+            await client.publish(topic + "/info", json.dumps(info).encode(), retain=True)
+            if delta is not None:
+                delta.force_keyframe()
+
+            storm = False
+            while time.perf_counter() < self.stop_at:
+                if storm_pending and time.perf_counter() >= self.storm_at:
+                    storm_pending = False
+                    storm = True
+                    break
+                if rng.random() < args.outage_rate:
+                    break
+
+                metrics = simulator.next()
+                if encoder is not None:
+                    payload = bytes(encoder.encode(metrics))
+                else:
+                    if delta is not None:
+                        metrics = delta.filter(metrics)
+                        delta.commit(metrics)
+                    payload = json.dumps(metrics).encode()
+                self.sent[data_topic].append(time.perf_counter())
+                await client.publish(data_topic, payload)
+                self.published += 1
+                jitter = rng.uniform(1 - args.jitter, 1 + args.jitter)
+                await asyncio.sleep(args.interval * jitter)
+            else:
+                await client.disconnect()
+                return
+
+            # Обрыв без DISCONNECT: брокер публикует Last Will
+            self.outages += 1
+            client.abort()
+            if storm:
+                # Все устройства возвращаются почти одновременно
+                await asyncio.sleep(self.storm_at + args.storm_length - time.perf_counter())
+            else:
+                await asyncio.sleep(args.interval * rng.uniform(1, 5))
+
+
+async def consume(client: MQTTClient, exporter: Exporter, fleet: Fleet):
+    async for topic, payload, _ in client.messages():
+        exporter.handle(topic, payload)
+        fleet.on_message(topic)
+
+
+async def run(devices: int, args) -> dict:
+    rss_before = rss_bytes()
+    broker = Broker()
+    server = await broker.start()
+    port = server.sockets[0].getsockname()[1]
+    exporter = Exporter(root=ROOT)
+    consumer = MQTTClient("127.0.0.1", port, client_id="pico-exporter", keepalive=0)
+    await consumer.connect()
+    await consumer.subscribe(ROOT + "/#")
+    fleet = Fleet(args, port)
+    consuming = asyncio.ensure_future(consume(consumer, exporter, fleet))
+
+    await asyncio.gather(*(fleet.device(i) for i in range(devices)))
+    elapsed = fleet.elapsed()
+
+    started = time.perf_counter()
+    body = exporter.metrics_body()
+    render_ms = (time.perf_counter() - started) * 1000
+    await consumer.disconnect()
+    await consuming
+    await broker.close(server)
+
+    lags = sorted(fleet.lags) or [0.0]
+    return {
+        "devices": devices,
+        "published": fleet.published,
+        "broker in/s": broker.messages_in / elapsed,
+        "exporter/s": exporter.messages_total / elapsed,
+        "lag p50 ms": lags[len(lags) // 2] * 1000,
+        "lag p95 ms": lags[int(len(lags) * 0.95)] * 1000,
+        "lag max ms": lags[-1] * 1000,
+        "connects": fleet.connects,
+        "outages": fleet.outages,
+        "render ms": render_ms,
+        "body KB": len(body) / 1024,
+        "RSS MB": rss_bytes() / 1e6,
+        "RSS KB/dev": max(0, rss_bytes() - rss_before) / 1024 / devices,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", default="10,100,500")
+    parser.add_argument("--interval", type=float, default=1.0, help="интервал публикации, с")
+    parser.add_argument("--duration", type=float, default=20.0, help="длительность прогона, с")
+    parser.add_argument("--jitter", type=float, default=0.2, help="разброс интервала, доля")
+    parser.add_argument(
+        "--outage-rate", type=float, default=0.01, help="вероятность обрыва на цикл"
+    )
+    parser.add_argument("--storm-at", type=float, default=0.5, help="момент общего обрыва, доля")
+    parser.add_argument("--storm-length", type=float, default=2.0, help="длительность обрыва, с")
+    parser.add_argument("--format", choices=("json", "delta", "binary"), default="json")
+    args = parser.parse_args()
+
+    rows = [asyncio.run(run(int(devices), args)) for devices in args.devices.split(",")]
+    columns = list(rows[0])
+    print("  ".join(f"{column:>11}" for column in columns))
+    for row in rows:
+        print("  ".join(f"{row[column]:>11.6g}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Задержка скрейпа /metrics: кэшированный текст, рендер после сэмпла, одновременные клиенты.
+
+По умолчанию MetricsServer прошивки запускается на хосте (модули устройства
+подставляет host.sim), с --target скрейпится настоящий Pico.
+
+Запуск из корня репозитория:
+    python -m bench.bench_metrics_http [--scrapes 200]
+    python -m bench.bench_metrics_http --target 192.168.1.77:9100
+"""
+
+import argparse
+import http.client
+import statistics
+import threading
+import time
+
+from bench.sample_metrics import MetricsSimulator
+from host.sim import SimEnvironment, installed, load_config
+
+
+def scrape(host: str, port: int) -> tuple:
+    """(секунды, байт тела) одного GET /metrics."""
+    started = time.perf_counter()
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    try:
+        connection.request("GET", "/metrics")
+        response = connection.getresponse()
+        body = response.read()
+    finally:
+        connection.close()
+    if response.status != 200 or not body.endswith(b"# EOF\n"):
+        raise RuntimeError(f"bad response: {response.status}, {len(body)} bytes")
+    return time.perf_counter() - started, len(body)
+
+
+def report(name: str, samples: list, size: int):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1] if len(samples) >= 20 else samples[-1]
+    print(
+        f"{name:<12} {len(samples):>7} {statistics.median(samples) * 1000:>8.2f} "
+        f"{p95 * 1000:>8.2f} {samples[-1] * 1000:>8.2f} {size:>7}"
+    )
+
+
+def header():
+    print(f"{'case':<12} {'scrapes':>7} {'p50, ms':>8} {'p95, ms':>8} {'max, ms':>8} {'bytes':>7}")
+
+
+def run_remote(target: str, scrapes: int):
+    host, _, port = target.partition(":")
+    results = [scrape(host, int(port or 9100)) for _ in range(scrapes)]
+    header()
+    report("device", [seconds for seconds, _ in results], results[-1][1])
+
+
+def concurrent(host: str, port: int, clients: int, scrapes: int) -> list:
+    """Задержки clients одновременных скрейперов; отказы сервера не считаются."""
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(scrapes):
+            try:
+                seconds, _ = scrape(host, port)
+            except (OSError, RuntimeError, http.client.HTTPException):
+                continue
+            with lock:
+                latencies.append(seconds)
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def run_local(scrapes: int):
+    env = SimEnvironment(duration=float("inf"))
+    with installed(env, load_config()):
+        from metric_registry import MetricRegistry
+        from metrics_server import MetricsServer
+
+        registry = MetricRegistry()
+        simulator = MetricsSimulator(seed=0)
+        registry.update(simulator.next())
+        server = MetricsServer(port=0, max_clients=4)
+        if not server.start():
+            raise SystemExit("cannot start server")
+        host, port = "127.0.0.1", server.sock.getsockname()[1]
+        server.update(registry)
+
+        running = True
+
+        def loop():
+            # Виртуальное время прогона стоит, поэтому ожидание - прямо на poller
+            while running:
+                server.poller.poll(server.poll_ms)
+                server.poll()
+
+        thread = threading.Thread(target=loop)
+        thread.start()
+        try:
+            header()
+            _, size = scrape(host, port)
+            cached = [scrape(host, port)[0] for _ in range(scrapes)]
+            report("cached", cached, size)
+
+            fresh = []
+            for _ in range(scrapes):
+                registry.clear()
+                registry.update(simulator.next())
+                server.update(registry)
+                fresh.append(scrape(host, port)[0])
+            report("render", fresh, size)
+
+            report("2 clients", concurrent(host, port, 2, scrapes // 2), size)
+            rejected = server.errors_total
+            report("8 clients", concurrent(host, port, 8, scrapes // 8), size)
+            print(
+                f"renders: {server.renders_total} for {server.scrapes_total} scrapes, "
+                f"rejected over max_clients: {server.errors_total - rejected}"
+            )
+        finally:
+            running = False
+            thread.join()
+            server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", default=None, help="host:port устройства")
+    parser.add_argument("--scrapes", type=int, default=200)
+    args = parser.parse_args()
+    if args.target:
+        run_remote(args.target, args.scrapes)
+    else:
+        run_local(args.scrapes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Размер, скорость и аллокации кодирования: JSON и бинарная схема, из словаря и из реестра.
+
+Запуск из корня репозитория:
+    python -m bench.bench_payload
+"""
+
+import json
+import timeit
+import tracemalloc
+
+from bench.sample_metrics import SAMPLE_METRICS
+from host.codec import decode
+from metric_registry import JSONWriter, MetricRegistry
+from payload_codec import BinaryEncoder
+
+
+def allocated(encode) -> int:
+    """Пик памяти одного вызова после прогрева (буферы уже выделены)."""
+    encode()
+    tracemalloc.start()
+    try:
+        encode()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    encoder = BinaryEncoder()
+    registry = MetricRegistry()
+    registry.update(SAMPLE_METRICS)
+    writer = JSONWriter()
+
+    json_payload = json.dumps(SAMPLE_METRICS)
+    binary_payload = bytes(encoder.encode(SAMPLE_METRICS))
+    registry_json = bytes(writer.render(registry))
+
+    assert decode(binary_payload) == SAMPLE_METRICS, "binary round-trip mismatch"
+    assert bytes(encoder.encode(registry)) == binary_payload, "registry binary mismatch"
+    assert json.loads(registry_json) == SAMPLE_METRICS, "registry json mismatch"
+
+    cases = (
+        ("json", len(json_payload), lambda: json.dumps(SAMPLE_METRICS)),
+        ("json/reg", len(registry_json), lambda: writer.render(registry)),
+        ("binary", len(binary_payload), lambda: encoder.encode(SAMPLE_METRICS)),
+        ("bin/reg", len(binary_payload), lambda: encoder.encode(registry)),
+    )
+
+    rounds = 10000
+    print(f"{'format':<8} {'bytes':>6} {'encode, us':>11} {'alloc, B':>9}")
+    for name, size, encode in cases:
+        encode_us = timeit.timeit(encode, number=rounds) / rounds * 1e6
+        print(f"{name:<8} {size:>6} {encode_us:>11.1f} {allocated(encode):>9}")
+    print(f"size ratio: {len(json_payload) / len(binary_payload):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
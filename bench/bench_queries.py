@@ -0,0 +1,84 @@
+"""Задержка запросов дашборда: агрегации по сырым сэмплам против правил записи.
+
+Нужен Prometheus со снимком TSDB и дозаписанными правилами за тот же период
+(см. README, "Правила записи и уровни разрешения"). Для каждого диапазона
+запрос идёт с шагом выбранного дашбордом уровня: сырое выражение правила
+против last_over_time() записанной серии.
+
+Запуск из корня репозитория:
+    python -m bench.bench_queries [--url http://localhost:9090] [--ranges 6h,2d,30d]
+    python -m bench.bench_queries --end 1700000000   # снимок из прошлого
+"""
+
+import argparse
+import json
+import statistics
+import time
+import urllib.parse
+import urllib.request
+
+from host.recording_rules import duration_seconds, select_tier, tier_rules
+
+
+def query_range(url: str, expr: str, start: float, end: float, step: int) -> tuple:
+    """(секунды, число точек) одного запроса /api/v1/query_range."""
+    params = urllib.parse.urlencode({"query": expr, "start": start, "end": end, "step": step})
+    started = time.perf_counter()
+    with urllib.request.urlopen(f"{url}/api/v1/query_range?{params}", timeout=120) as response:
+        body = json.load(response)
+    elapsed = time.perf_counter() - started
+    if body.get("status") != "success":
+        raise RuntimeError(f"{expr}: {body.get('error')}")
+    points = sum(len(series["values"]) for series in body["data"]["result"])
+    return elapsed, points
+
+
+def measure(url: str, expr: str, start: float, end: float, step: int, repeat: int) -> tuple:
+    """(медиана в мс, число точек); первый запрос прогревает кэш страниц."""
+    _, points = query_range(url, expr, start, end, step)
+    samples = [query_range(url, expr, start, end, step)[0] for _ in range(repeat)]
+    return statistics.median(samples) * 1000, points
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:9090")
+    parser.add_argument("--ranges", default="6h,2d,30d")
+    parser.add_argument("--end", type=float, default=None, help="конец диапазона, unix-время")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    end = args.end if args.end is not None else time.time()
+    print(
+        f"{'range':<6} {'tier':<5} {'rules':>5} {'raw, ms':>9} {'tier, ms':>9} "
+        f"{'speedup':>8} {'points':>8}"
+    )
+    for label in args.ranges.split(","):
+        range_seconds = duration_seconds(label)
+        tier = select_tier(range_seconds)
+        step = duration_seconds(tier)
+        start = end - range_seconds
+        raw_ms = tier_ms = 0.0
+        points = 0
+        empty = []
+        for record, expr in tier_rules(tier):
+            raw, _ = measure(args.url, expr, start, end, step, args.repeat)
+            recorded, recorded_points = measure(
+                args.url, f"last_over_time({record}[{tier}])", start, end, step, args.repeat
+            )
+            raw_ms += raw
+            tier_ms += recorded
+            points += recorded_points
+            if not recorded_points:
+                empty.append(record)
+        speedup = raw_ms / tier_ms if tier_ms else float("inf")
+        print(
+            f"{label:<6} {tier:<5} {len(tier_rules(tier)):>5} {raw_ms:>9.1f} {tier_ms:>9.1f} "
+            f"{speedup:>7.1f}x {points:>8}"
+        )
+        if empty:
+            print(f"  no recorded data for {len(empty)} rules (backfill with promtool): {empty[0]}")
+
+
+if __name__ == "__main__":
+    main()
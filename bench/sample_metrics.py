@@ -0,0 +1,95 @@
+"""Типичный payload SystemMetrics.get_all_metrics для бенчмарков."""
+
+SAMPLE_METRICS = {
+    "temperature_celsius": 27.58,
+    "uptime_seconds": 86400,
+    "error_count": 0,
+    "memory_free_bytes": 151232,
+    "memory_allocated_bytes": 41600,
+    "memory_total_bytes": 192832,
+    "memory_usage_percent": 21.57,
+    "memory_fragmentation": 3.12,
+    "memory_largest_free_block_bytes": 146512,
+    "wifi_connected": 1,
+    "wifi_status": 3,
+    "wifi_reconnect_count": 2,
+    "wifi_rssi_dbm": -58,
+    "wifi_rssi_min_dbm": -71,
+    "wifi_signal_quality_percent": 84,
+    "wifi_link_quality": "excellent",
+    "wifi_channel": 6,
+    "gc_collections_total": 8640,
+    "gc_pause_us": 2310,
+    "gc_pause_max_us": 4120,
+    "gc_time_since_last": 10,
+    "vsys_voltage": 4.98,
+    "power_source": "usb",
+    "battery_percent": 100,
+    "cpu_frequency_hz": 125000000,
+    "cpu_frequency_mhz": 125.0,
+    "cpu_mode": "normal",
+    "cpu_temp_max_celsius": 31.32,
+    "mqtt_publish_success_total": 8630,
+    "mqtt_publish_failed_total": 10,
+    "mqtt_publish_total": 8640,
+    "mqtt_publish_success_rate": 99.88,
+    "mqtt_publish_interval_seconds": 10,
+    "health_status": "healthy",
+    "health_issues_count": 0,
+    "health_score": 100,
+}
+
+
+class MetricsSimulator:
+    """Правдоподобная последовательность payload одного устройства."""
+
+    def __init__(self, interval: int = 10, seed: int = 0):
+        import random
+
+        self.rng = random.Random(seed)
+        self.interval = interval
+        self.cycle = 0
+        self.temperature = 27.0
+        self.rssi = -60
+        self.allocated = 41600
+        self.max_temp = 0.0
+        self.min_rssi = 0
+
+    def next(self) -> dict:
+        """Следующий цикл: шум датчика, дрейф RSSI и пила занятой памяти."""
+        rng = self.rng
+        self.cycle += 1
+        self.temperature += rng.uniform(-0.05, 0.05) + (27.0 - self.temperature) * 0.01
+        temperature = round(self.temperature + rng.gauss(0, 0.4), 2)
+        self.max_temp = max(self.max_temp, temperature)
+        self.rssi = max(-90, min(-40, self.rssi + rng.choice((-1, 0, 0, 0, 1))))
+        rssi = self.rssi + rng.choice((-2, -1, 0, 0, 1, 2))
+        self.min_rssi = rssi if self.min_rssi == 0 else min(self.min_rssi, rssi)
+        self.allocated = 41600 + (self.cycle % 50) * 16 + rng.randrange(0, 256)
+        free = 192832 - self.allocated
+        quality = max(0, min(100, 2 * (rssi + 100)))
+
+        metrics = dict(SAMPLE_METRICS)
+        metrics.update(
+            {
+                "temperature_celsius": temperature,
+                "uptime_seconds": self.cycle * self.interval,
+                "memory_free_bytes": free,
+                "memory_allocated_bytes": self.allocated,
+                "memory_usage_percent": round(self.allocated / 192832 * 100, 2),
+                "memory_largest_free_block_bytes": free - rng.randrange(0, 4096),
+                "wifi_rssi_dbm": rssi,
+                "wifi_rssi_min_dbm": self.min_rssi,
+                "wifi_signal_quality_percent": quality,
+                "wifi_link_quality": "excellent" if quality >= 80 else "good",
+                "gc_collections_total": self.cycle,
+                "gc_pause_us": 2000 + rng.randrange(0, 600),
+                "vsys_voltage": round(4.98 + rng.uniform(-0.02, 0.02), 2),
+                "cpu_temp_max_celsius": self.max_temp,
+                "mqtt_publish_success_total": self.cycle,
+                "mqtt_publish_failed_total": 0,
+                "mqtt_publish_total": self.cycle,
+                "mqtt_publish_success_rate": 100.0,
+            }
+        )
+        return metrics
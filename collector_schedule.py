@@ -0,0 +1,185 @@
+"""Расписание сборщиков снимка: у каждого свой период и кэш последних значений.
+
+Дешёвые и быстро меняющиеся источники (температура, RSSI) читаются каждый цикл,
+дорогие и медленные (сборка мусора с пробой фрагментации, частота CPU) - реже.
+Пропущенный сборщик отдаёт в сэмпл значения прошлого чтения: они и так лежат
+в слотах реестра, а номер сборщика в маске присутствия показывает, чьи это
+слоты. Выключенный сборщик в сэмпл не попадает.
+
+Периоды задаются в config.py (COLLECTOR_PERIODS) и заменяются на лету вместе
+с интервалом публикации JSON-объектом из retained-топика
+<MQTT_TOPIC>/config/schedule:
+
+    {"publish_interval": 10, "periods": {"memory": 60}, "disabled": ["cpu"]}
+
+Отсутствующие ключи берутся из config.py, пустое сообщение возвращает всё
+к config.py.
+"""
+
+import time
+from array import array
+
+import ujson
+
+COLLECTORS = ("adc", "wifi", "memory", "cpu", "stats")
+ALL_COLLECTORS = (1 << len(COLLECTORS)) - 1
+
+# Номер источника в маске присутствия реестра: 1 - пишется каждый цикл
+# (счётчики, производные метрики), сборщики - с 2
+SOURCE_ALWAYS = 1
+SOURCE_FIRST = 2
+
+MIN_PUBLISH_INTERVAL = 1
+MAX_PERIOD = 86400
+KEYS = ("publish_interval", "periods", "disabled")
+
+
+def source(collector: int) -> int:
+    """Номер источника для маски присутствия по индексу в COLLECTORS."""
+    return SOURCE_FIRST + collector
+
+
+def _number(value, name: str, low: int, high: int):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{name} must be a number")
+    if not low <= value <= high:
+        raise ValueError(f"{name} must be in [{low}, {high}]")
+    return value
+
+
+def validate_schedule(config, defaults: tuple, max_publish_interval: int) -> tuple:
+    """(интервал, {сборщик: период}, выключенные) поверх defaults; ValueError при ошибке."""
+    if not isinstance(config, dict):
+        raise ValueError("schedule must be an object")
+    for key in config:
+        if key not in KEYS:
+            raise ValueError(f"unknown key {key}")
+    interval, periods, disabled = defaults
+
+    if "publish_interval" in config:
+        interval = _number(
+            config["publish_interval"],
+            "publish_interval",
+            MIN_PUBLISH_INTERVAL,
+            max_publish_interval,
+        )
+
+    periods = dict(periods)
+    if "periods" in config:
+        if not isinstance(config["periods"], dict):
+            raise ValueError("periods must be an object")
+        for name, period in config["periods"].items():
+            if name not in COLLECTORS:
+                raise ValueError(f"unknown collector {name}")
+            periods[name] = _number(period, f"period of {name}", 0, MAX_PERIOD)
+
+    if "disabled" in config:
+        if not isinstance(config["disabled"], list):
+            raise ValueError("disabled must be a list")
+        for name in config["disabled"]:
+            if name not in COLLECTORS:
+                raise ValueError(f"unknown collector {name}")
+        disabled = tuple(config["disabled"])
+    return interval, periods, disabled
+
+
+class CollectorSchedule:
+    def __init__(
+        self,
+        publish_interval: int,
+        periods: dict = None,
+        disabled: tuple = (),
+        max_publish_interval: int = 3600,
+    ):
+        self.max_publish_interval = max_publish_interval
+        self.defaults = validate_schedule({}, (publish_interval, periods or {}, disabled), 0)
+        self.publish_interval_ms = 0
+        self.period_ms = array("i", bytes(4 * len(COLLECTORS)))
+        self.disabled = 0
+        # Момент последнего чтения и маска сборщиков, которые уже читались
+        self.last_run = array("i", bytes(4 * len(COLLECTORS)))
+        self.ran = 0
+        # Номер источника каждого слота реестра по последней записи
+        self.owner = bytearray()
+        self.reloads_total = 0
+        self.rejected_total = 0
+        self.apply(*self.defaults)
+
+    def apply(self, publish_interval, periods: dict, disabled: tuple):
+        self.publish_interval_ms = int(publish_interval * 1000)
+        self.disabled = 0
+        for i, name in enumerate(COLLECTORS):
+            self.period_ms[i] = int(periods.get(name, 0) * 1000)
+            if name in disabled:
+                self.disabled |= 1 << i
+        # Включённые заново и с новым периодом читаются в ближайшем цикле
+        self.ran = 0
+
+    def load(self, config) -> bool:
+        """Заменить расписание; при ошибке остаётся прежнее."""
+        try:
+            schedule = validate_schedule(config, self.defaults, self.max_publish_interval)
+        except ValueError as e:
+            self.rejected_total += 1
+            print(f"Collector schedule rejected: {e}")
+            return False
+        self.apply(*schedule)
+        self.reloads_total += 1
+        print(f"Collector schedule loaded: publish every {schedule[0]}s, periods {schedule[1]}")
+        return True
+
+    def load_json(self, payload) -> bool:
+        """Обработчик сообщения из топика конфигурации; пустое - вернуть config.py."""
+        if not payload:
+            return self.load({})
+        try:
+            config = ujson.loads(payload)
+        except ValueError as e:
+            self.rejected_total += 1
+            print(f"Collector schedule rejected: bad JSON ({e})")
+            return False
+        return self.load(config)
+
+    def due(self) -> int:
+        """Маска сборщиков, которым пора читать в этом цикле.
+
+        Срок засчитывается в ближайшем к нему цикле: с запасом в полинтервала.
+        """
+        now = time.ticks_ms()
+        slack = self.publish_interval_ms // 2
+        mask = 0
+        for i in range(len(COLLECTORS)):
+            bit = 1 << i
+            if self.disabled & bit:
+                continue
+            if (
+                not self.ran & bit
+                or time.ticks_diff(now, self.last_run[i]) + slack >= self.period_ms[i]
+            ):
+                self.last_run[i] = now
+                mask |= bit
+        self.ran |= mask
+        return mask
+
+    def restore(self, registry, fresh: int):
+        """Вернуть в сэмпл слоты включённых сборщиков, не читавших в этом цикле."""
+        present = registry.present
+        owner = self.owner
+        while len(owner) < len(present):
+            owner.append(0)
+        stale = ALL_COLLECTORS & ~fresh & ~self.disabled
+        for slot in range(len(present)):
+            slot_source = present[slot]
+            if slot_source:
+                owner[slot] = slot_source
+            elif stale:
+                slot_source = owner[slot]
+                if slot_source >= SOURCE_FIRST and stale & (1 << (slot_source - SOURCE_FIRST)):
+                    present[slot] = slot_source
+
+    def get_stats(self) -> dict:
+        return {
+            "schedule_publish_interval_seconds": self.publish_interval_ms // 1000,
+            "schedule_reloads_total": self.reloads_total,
+            "schedule_rejected_total": self.rejected_total,
+        }
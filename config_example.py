@@ -1,10 +1,140 @@
 WIFI_SSID = "Keenetic-9999"
 WIFI_PASSWORD = "wjdJld9Ht8"
 
+# Обязательны только WIFI_*, MQTT_SERVER/PORT/TOPIC, CLIENT_ID и PUBLISH_INTERVAL.
+# Остальные параметры можно не указывать: значения по умолчанию (main.py)
+# совпадают с приведёнными здесь, дополнительные функции выключены
+
+# Переподключение WiFi: статус опрашивается каждые WIFI_POLL_MS, повторное
+# подключение идёт к запомненной точке (BSSID и канал, без сканирования).
+# WIFI_STATIC_IP = ("192.168.1.77", "255.255.255.0", "192.168.1.1", "192.168.1.1")
+# пропускает DHCP, None - адрес по DHCP. Паузы между неудачными попытками растут
+# от WIFI_BACKOFF_MIN до WIFI_BACKOFF_MAX секунд со случайным разбросом
+WIFI_FAST_REJOIN = False
+WIFI_STATIC_IP = None
+WIFI_POLL_MS = 50
+WIFI_CONNECT_TIMEOUT = 15
+WIFI_BACKOFF_MIN = 0.5
+WIFI_BACKOFF_MAX = 10
+
 MQTT_SERVER = "192.168.1.51"
 MQTT_PORT = 1883
 MQTT_TOPIC = b"pico_metrics"
 CLIENT_ID = "pico-w-micropython"
 
+# Сессия MQTT: QoS 1 с окном неподтверждённых сообщений (0 - прежний QoS 0),
+# постоянная сессия (clean_session=False) и PINGREQ при тишине брокера дольше
+# MQTT_PING_INTERVAL секунд (0 - keepalive/2, только вместе с QoS 1); нет PINGRESP
+# за MQTT_PING_TIMEOUT секунд - соединение разорвано
+MQTT_QOS = 0
+MQTT_INFLIGHT_WINDOW = 8
+MQTT_PERSISTENT_SESSION = False
+MQTT_PING_INTERVAL = 0
+MQTT_PING_TIMEOUT = 5
+
+# Отдельное дерево топиков на устройство: <MQTT_TOPIC>/<sys_unique_id>/...,
+# client id <CLIENT_ID>-<sys_unique_id>. Для парка из нескольких Pico
+DEVICE_TOPICS = False
+
+# Собственный endpoint /metrics (OpenMetrics) для прямого скрейпа Prometheus:
+# порт (0 - выключен). MQTT_ENABLED = False - только /metrics, без брокера
+# и экспортёра. Пример задания скрейпа - в prometheus/prometheus.yml
+METRICS_HTTP_PORT = 0
+MQTT_ENABLED = True
+
 
 PUBLISH_INTERVAL = 10
+
+# Расписание сборщиков: период в секундах (0 - каждый сэмпл) для "adc", "wifi",
+# "memory" (сборка мусора и проба фрагментации), "cpu" (частота), "stats" (счётчики
+# компонентов). Между чтениями в сэмпл идут прошлые значения, выключенные
+# (COLLECTORS_DISABLED) не публикуются. SCHEDULE_REMOTE - заменять периоды,
+# выключенные сборщики и PUBLISH_INTERVAL JSON-объектом из retained-топика
+# <MQTT_TOPIC>/config/schedule (пустое сообщение - вернуть значения отсюда)
+COLLECTOR_PERIODS = {"adc": 0, "wifi": 0, "memory": 0, "cpu": 0, "stats": 0}
+COLLECTORS_DISABLED = ()
+SCHEDULE_REMOTE = False
+
+# Диагностика памяти: замер фрагментации раз в N циклов
+# или при изменении занятой памяти больше чем на заданное число байт
+MEMORY_PROBE_EVERY = 10
+MEMORY_PROBE_CHANGE_BYTES = 8192
+
+# Скользящая статистика: окно экстремумов и доли успешных публикаций (сэмплов),
+# коэффициент EWMA и окно наклона занятой памяти (не больше 48 сэмплов)
+STATS_WINDOW = 30
+STATS_EWMA_ALPHA = 0.2
+STATS_TREND_WINDOW = 30
+
+# Правила здоровья: (метрика, оператор, порог, уровень "warning"/"critical").
+# Число проблем - число метрик со сработавшим правилом, health_score = 100 - 25 * N.
+# HEALTH_RULES_REMOTE - заменять набор JSON-списком из retained-топика
+# <MQTT_TOPIC>/config/health (неверный набор отклоняется, остаются прежние правила)
+HEALTH_RULES = (
+    ("temperature_celsius", ">", 70, "warning"),
+    ("temperature_celsius", ">", 75, "critical"),
+    ("memory_usage_percent", ">", 90, "warning"),
+    ("memory_usage_percent", ">", 95, "critical"),
+    ("wifi_rssi_dbm", "<", -80, "warning"),
+)
+HEALTH_RULES_REMOTE = False
+
+# Формат payload: "json" или "binary" (компактная схема, топик <MQTT_TOPIC>/bin,
+# на хосте декодируется экспортёром или python -m host.bridge)
+PAYLOAD_FORMAT = "json"
+
+# Публикация только изменившихся метрик (пороги - delta_filter.DEFAULT_DEADBANDS),
+# полный keyframe каждые N циклов и после каждого подключения к брокеру
+DELTA_PUBLISHING = False
+DELTA_KEYFRAME_EVERY = 30
+
+# Offline-буфер: сэмплов в RAM (0 - выключен), сегментов на flash при переполнении
+# (0 - без flash, теряются самые старые), размер пакета и пакетов за цикл при досылке
+OFFLINE_BUFFER_SAMPLES = 0
+OFFLINE_FLASH_SEGMENTS = 0
+OFFLINE_REPLAY_BATCH = 16
+OFFLINE_REPLAY_BATCHES_PER_CYCLE = 2
+
+# Пакетная публикация: BATCH_SIZE сэмплов (каждые PUBLISH_INTERVAL секунд) одним
+# сообщением в <MQTT_TOPIC>/batch, но не позже BATCH_MAX_LATENCY секунд после первого.
+# BATCH_SIZE = 1 - обычная публикация каждого сэмпла
+BATCH_SIZE = 1
+BATCH_MAX_LATENCY = 30
+
+# Режим работы: "async" - независимые задачи uasyncio (сэмплирование не блокируется
+# сетью), "dual" - сэмплирование на ядре 1 (_thread), сеть на ядре 0,
+# "sync" - прежний последовательный цикл. SAMPLE_QUEUE_SIZE - очередь (кольцо) сэмплов
+RUNTIME_MODE = "sync"
+SAMPLE_QUEUE_SIZE = 8
+
+# Сэмплирование АЦП по таймеру (Гц, 0 - одно чтение на публикацию);
+# публикуются mean/min/max/stddev/p95 за интервал
+ADC_SAMPLE_RATE = 0
+
+# Профилирование цикла (время и аллокации по секциям), публикация
+# pico_profile_* в <MQTT_TOPIC>/profile раз в N сэмплов
+PROFILE_ENABLED = False
+PROFILE_PUBLISH_EVERY = 6
+
+# Адаптивный интервал (PUBLISH_INTERVAL - базовый): от USB не длиннее базового,
+# на батарее растёт до POWER_MAX_INTERVAL по мере разряда, при быстрых изменениях
+# сжимается до POWER_MIN_INTERVAL. Между циклами lightsleep (только на батарее
+# и без ADC_SAMPLE_RATE) и проверка здоровья раз в POWER_HEALTH_CHECK_INTERVAL.
+# Работает в RUNTIME_MODE = "sync"
+POWER_SCHEDULER = False
+POWER_MIN_INTERVAL = 5
+POWER_MAX_INTERVAL = 300
+POWER_LIGHTSLEEP = True
+POWER_HEALTH_CHECK_INTERVAL = 5
+
+# Счётчики между перезагрузками: запись на flash раз в STATE_CHECKPOINT_INTERVAL
+# секунд (0 - выключено) по кругу в STATE_CHECKPOINT_SLOTS файлов и перед
+# machine.reset(). Сторожевой таймер: WATCHDOG_TIMEOUT секунд (0 - выключен,
+# на RP2040 не больше 8), кормление прекращается, если сэмпла не было дольше
+# самого длинного интервала (keepalive MQTT) плюс WATCHDOG_STALL секунд.
+# Запущенный таймер не останавливается: после Ctrl+C
+# плата перезагрузится
+STATE_CHECKPOINT_INTERVAL = 0
+STATE_CHECKPOINT_SLOTS = 4
+WATCHDOG_TIMEOUT = 0
+WATCHDOG_STALL = 120
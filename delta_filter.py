@@ -0,0 +1,177 @@
+"""Публикация только изменившихся метрик (deadband) с периодическими keyframe.
+
+Сэмпл из MetricRegistry сравнивается по слотам в целых числах с множителем
+схемы, результат - переиспользуемая маска MetricView. Словари (бенчмарки
+и хостовые генераторы) обрабатываются прежним путём.
+"""
+
+from array import array
+
+from metric_registry import MetricReader, MetricView
+
+# (абсолютный порог, относительный порог). Изменение в пределах
+# max(abs, |last| * rel) от последнего опубликованного значения не отправляется
+DEFAULT_DEADBANDS = {
+    "temperature_celsius": (0.5, 0),
+    "cpu_temp_max_celsius": (0.5, 0),
+    "temperature_min_celsius": (0.5, 0),
+    "temperature_max_celsius": (0.5, 0),
+    "temperature_stddev_celsius": (0.2, 0),
+    "temperature_p95_celsius": (0.5, 0),
+    "vsys_min_voltage": (0.05, 0),
+    "vsys_max_voltage": (0.05, 0),
+    "vsys_stddev_voltage": (0.01, 0),
+    "vsys_p95_voltage": (0.05, 0),
+    "adc_samples": (0, 0.05),
+    "uptime_seconds": (300, 0),
+    "memory_free_bytes": (0, 0.02),
+    "memory_allocated_bytes": (0, 0.02),
+    "memory_usage_percent": (1.0, 0),
+    "memory_fragmentation": (2.0, 0),
+    "memory_largest_free_block_bytes": (0, 0.02),
+    "wifi_rssi_dbm": (3, 0),
+    "wifi_signal_quality_percent": (5, 0),
+    "gc_collections_total": (100, 0),
+    "gc_pause_us": (0, 0.25),
+    "gc_pause_max_us": (0, 0.1),
+    "gc_time_since_last": (5, 0),
+    "vsys_voltage": (0.05, 0),
+    "battery_percent": (1.0, 0),
+    "mqtt_publish_success_total": (100, 0),
+    "mqtt_publish_total": (100, 0),
+    "mqtt_publish_success_rate": (0.5, 0),
+    "mqtt_publish_interval_seconds": (5, 0),
+    "power_duty_cycle_percent": (0.5, 0),
+    "power_energy_per_sample_mj": (0, 0.05),
+    "mqtt_acked_total": (100, 0),
+    "mqtt_ack_rtt_ms": (0, 0.5),
+    "temperature_ewma_celsius": (0.2, 0),
+    "temperature_window_max_celsius": (0.5, 0),
+    "wifi_rssi_ewma_dbm": (2, 0),
+    "wifi_rssi_window_min_dbm": (3, 0),
+    "mqtt_publish_success_rate_window": (1.0, 0),
+    "memory_alloc_slope_bytes_per_hour": (500, 0.25),
+}
+
+
+class DeltaFilter:
+    def __init__(self, keyframe_every: int = 30, deadbands=None):
+        self.keyframe_every = keyframe_every
+        self.deadbands = dict(DEFAULT_DEADBANDS)
+        if deadbands:
+            self.deadbands.update(deadbands)
+
+        self.last_published = {}
+        # Путь реестра: последние опубликованные значения и пороги по слотам
+        self.view = None
+        self.last_values = array("i")
+        self.has_last = bytearray()
+        self.slot_bands = []
+
+        self.cycles_since_keyframe = 0
+        self._force_keyframe = True
+        self.is_keyframe = True
+
+        # Статистика эффективности
+        self.keyframes_total = 0
+        self.suppressed_total = 0
+
+    def force_keyframe(self):
+        """Следующая публикация будет полной (например, после переподключения)."""
+        self._force_keyframe = True
+
+    def _changed(self, key: str, value, last) -> bool:
+        if last is None:
+            return True
+        band = self.deadbands.get(key)
+        if band is None or isinstance(value, str):
+            return value != last
+        absolute, relative = band
+        return abs(value - last) > max(absolute, abs(last) * relative)
+
+    def _prepare_slots(self, registry):
+        """Пороги в единицах слотов: абсолютный - целым с множителем, относительный - в ‰."""
+        names = registry.names
+        while len(self.slot_bands) < len(names):
+            slot = len(self.slot_bands)
+            band = self.deadbands.get(names[slot])
+            if band is not None and registry.enums[slot] is None:
+                absolute, relative = band
+                band = (int(round(absolute * registry.scales[slot])), int(round(relative * 1000)))
+            else:
+                band = None
+            self.slot_bands.append(band)
+            self.last_values.append(0)
+            self.has_last.append(0)
+
+    def _filter_slots(self, metrics: MetricReader) -> MetricView:
+        registry = metrics.registry
+        self._prepare_slots(registry)
+        if self.view is None:
+            self.view = MetricView(registry)
+        view = self.view
+        view.reset(metrics)
+
+        values = metrics.values
+        present = metrics.present
+        mask = view.present
+        last_values = self.last_values
+        has_last = self.has_last
+        slot_bands = self.slot_bands
+        for slot in range(len(present)):
+            if not present[slot]:
+                continue
+            value = values[slot]
+            if has_last[slot]:
+                last = last_values[slot]
+                band = slot_bands[slot]
+                if band is None:
+                    changed = value != last
+                else:
+                    limit = abs(last) * band[1] // 1000
+                    if limit < band[0]:
+                        limit = band[0]
+                    changed = abs(value - last) > limit
+                if not changed:
+                    self.suppressed_total += 1
+                    continue
+            mask[slot] = 1
+        return view
+
+    def filter(self, metrics: dict) -> dict:
+        """Оставить изменившиеся метрики или вернуть полный keyframe."""
+        self.is_keyframe = (
+            self._force_keyframe or self.cycles_since_keyframe >= self.keyframe_every - 1
+        )
+        if self.is_keyframe:
+            return metrics
+        if isinstance(metrics, MetricReader):
+            return self._filter_slots(metrics)
+
+        last_published = self.last_published
+        delta = {}
+        for key, value in metrics.items():
+            if self._changed(key, value, last_published.get(key)):
+                delta[key] = value
+            else:
+                self.suppressed_total += 1
+        return delta
+
+    def commit(self, published: dict):
+        """Запомнить успешно опубликованные значения (пустой delta тоже цикл)."""
+        if isinstance(published, MetricReader):
+            self._prepare_slots(published.registry)
+            values = published.values
+            present = published.present
+            for slot in range(len(present)):
+                if present[slot]:
+                    self.last_values[slot] = values[slot]
+                    self.has_last[slot] = 1
+        else:
+            self.last_published.update(published)
+        if self.is_keyframe:
+            self.keyframes_total += 1
+            self.cycles_since_keyframe = 0
+            self._force_keyframe = False
+        else:
+            self.cycles_since_keyframe += 1
@@ -0,0 +1,198 @@
+"""Состояние устройства между перезагрузками и сторожевой таймер.
+
+Счётчики, которые Prometheus считает монотонными, периодически сохраняются
+на flash компактной двоичной записью и восстанавливаются при загрузке.
+Слотов несколько, запись идёт по кругу: каждый слот перезаписывается в slots
+раз реже, а предыдущая копия остаётся целой, даже если питание пропало
+посреди записи (запись с неверной CRC при загрузке пропускается).
+"""
+
+import struct
+import time
+
+import machine
+import ubinascii
+
+STATE_PREFIX = "state_"
+STATE_SUFFIX = ".bin"
+
+# Заголовок: magic, версия, длина данных, номер записи, CRC32 данных
+STATE_MAGIC = 0xC5
+STATE_VERSION = 1
+HEADER_FORMAT = "<BBHII"
+HEADER_SIZE = 12
+
+# Данные: флаги, перезагрузки, из них по сторожевому таймеру, затем счётчики
+# монитора (STATE_COUNTERS)
+STATE_FORMAT = "<BIIIIIIIih"
+STATE_SIZE = struct.calcsize(STATE_FORMAT)
+STATE_COUNTERS = (
+    "reconnect_count",
+    "error_count",
+    "mqtt_publish_success",
+    "mqtt_publish_failed",
+    "sample_seq",
+    "max_temp_x100",
+    "min_rssi",
+)
+
+# Перезагрузка запрошена прошивкой (machine.reset() после фатальной ошибки):
+# на rp2 она тоже выглядит как WDT_RESET, поэтому отмечается в записи
+FLAG_PLANNED = 0x01
+
+# Этапы загрузки: мс от сброса до первого достижения
+BOOT_STAGES = ("wifi", "mqtt", "first_publish")
+
+
+class StateCheckpoint:
+    def __init__(self, slots: int = 4, interval_ms: int = 300000, directory: str = ""):
+        self.slots = max(2, slots)
+        self.interval_ms = interval_ms
+        self.directory = directory
+        self.record = bytearray(HEADER_SIZE + STATE_SIZE)
+        self.payload = memoryview(self.record)[HEADER_SIZE:]
+
+        # Номер последней записи; следующая идёт в слот (generation + 1) % slots
+        self.generation = 0
+        self.saved = None
+        self.saved_at = time.ticks_ms()
+        self.writes_total = 0
+        self.errors_total = 0
+
+        self.resets_total = 0
+        self.watchdog_resets_total = 0
+        self.boot_ms = {}
+
+    def _path(self, slot: int) -> str:
+        return f"{self.directory}{STATE_PREFIX}{slot}{STATE_SUFFIX}"
+
+    def _read(self, slot: int):
+        """(номер записи, значения STATE_FORMAT) целой записи слота или None."""
+        try:
+            with open(self._path(slot), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) != HEADER_SIZE + STATE_SIZE:
+            return None
+        magic, version, length, generation, crc = struct.unpack_from(HEADER_FORMAT, data)
+        if magic != STATE_MAGIC or version != STATE_VERSION or length != STATE_SIZE:
+            return None
+        payload = memoryview(data)[HEADER_SIZE:]
+        if ubinascii.crc32(payload) != crc:
+            return None
+        return generation, struct.unpack(STATE_FORMAT, payload)
+
+    def restore(self):
+        """Загрузить самую свежую целую запись и учесть перезагрузку.
+
+        Возвращает значения STATE_COUNTERS или None при первом запуске.
+        """
+        latest = None
+        for slot in range(self.slots):
+            entry = self._read(slot)
+            if entry is not None and (latest is None or entry[0] > latest[0]):
+                latest = entry
+        if latest is None:
+            print("No saved state, cold start")
+            return None
+
+        self.generation, values = latest
+        flags, resets, watchdog_resets = values[:3]
+        self.resets_total = resets + 1
+        self.watchdog_resets_total = watchdog_resets
+        if not flags & FLAG_PLANNED and machine.reset_cause() == machine.WDT_RESET:
+            self.watchdog_resets_total += 1
+            print("Watchdog reset detected")
+        print(f"State restored (record {self.generation}, reset #{self.resets_total})")
+        return values[3:]
+
+    def due(self) -> bool:
+        return time.ticks_diff(time.ticks_ms(), self.saved_at) >= self.interval_ms
+
+    def save(self, counters: tuple, planned: bool = False) -> bool:
+        """Записать счётчики в следующий слот; без изменений запись пропускается."""
+        self.saved_at = time.ticks_ms()
+        if counters == self.saved and not planned:
+            return True
+
+        struct.pack_into(
+            STATE_FORMAT,
+            self.payload,
+            0,
+            FLAG_PLANNED if planned else 0,
+            self.resets_total,
+            self.watchdog_resets_total,
+            *counters,
+        )
+        generation = self.generation + 1
+        struct.pack_into(
+            HEADER_FORMAT,
+            self.record,
+            0,
+            STATE_MAGIC,
+            STATE_VERSION,
+            STATE_SIZE,
+            generation,
+            ubinascii.crc32(self.payload),
+        )
+        try:
+            with open(self._path(generation % self.slots), "wb") as f:
+                f.write(self.record)
+        except OSError as e:
+            self.errors_total += 1
+            print(f"State checkpoint failed: {e}")
+            return False
+        self.generation = generation
+        self.saved = counters
+        self.writes_total += 1
+        return True
+
+    def mark(self, stage: str):
+        """Первое достижение этапа загрузки (ticks_ms после сброса начинается с 0)."""
+        if stage not in self.boot_ms:
+            self.boot_ms[stage] = time.ticks_ms()
+            print(f"Boot: {stage} in {self.boot_ms[stage]} ms")
+
+    def get_stats(self) -> dict:
+        stats = {
+            "device_resets_total": self.resets_total,
+            "device_watchdog_resets_total": self.watchdog_resets_total,
+            "state_checkpoint_writes_total": self.writes_total,
+            "state_checkpoint_errors_total": self.errors_total,
+        }
+        for stage in BOOT_STAGES:
+            stats["boot_" + stage + "_ms"] = self.boot_ms.get(stage, 0)
+        return stats
+
+
+class Watchdog:
+    """machine.WDT: кормится, пока сэмплирование живо; длинные паузы нарезаются.
+
+    Кормление прекращается, если сэмпла не было дольше stall_ms (застрявшее
+    ядро 1 или задача сэмплера), и через timeout_ms устройство перезагружается.
+    """
+
+    def __init__(self, timeout_ms: int, stall_ms: int = 0):
+        self.wdt = machine.WDT(timeout=timeout_ms)
+        self.slice_ms = max(1, timeout_ms // 2)
+        self.stall_ms = stall_ms
+        self.beat_at = time.ticks_ms()
+
+    def beat(self):
+        """Отметка сэмпла."""
+        self.beat_at = time.ticks_ms()
+
+    def feed(self):
+        if self.stall_ms and time.ticks_diff(time.ticks_ms(), self.beat_at) > self.stall_ms:
+            return
+        self.wdt.feed()
+
+    def sleep_ms(self, ms: int, wait_ms=None):
+        """Пауза кусками не длиннее половины таймаута; wait_ms - вместо time.sleep_ms."""
+        wait_ms = wait_ms or time.sleep_ms
+        while ms > 0:
+            chunk = min(ms, self.slice_ms)
+            wait_ms(chunk)
+            self.feed()
+            ms -= chunk
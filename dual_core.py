@@ -0,0 +1,329 @@
+"""Двухъядерный режим на _thread: сэмплирование на ядре 1, сеть на ядре 0.
+
+Ядро 1 снимает сэмплы по сетке времени (между ними - отсчёты АЦП вместо
+таймера), считает производные метрики и правила здоровья и кладёт копию
+реестра в кольцо заранее созданных записей. Ядро 0 подключает WiFi и MQTT,
+кодирует и публикует записи из кольца; блокирующее подключение или
+медленный сокет задерживают только публикацию, но не замер.
+
+Драйвер WiFi (cyw43) вызывается только с ядра 0: состояние WLAN для
+сэмпла ядро 0 кэширует в WLANState, ядро 1 читает кэш. Так же и счётчики
+компонентов ядра 0 (MQTT, offline-буфер, WiFi): ядро 0 собирает их после
+публикации, ядро 1 берёт готовый словарь под замком.
+
+Списки слотов реестра и конфигурацию из MQTT (расписание, правила здоровья)
+читает ядро 1, а GIL на RP2040 нет. Поэтому все имена метрик объявляются
+пробным сэмплом до старта ядра 1, после чего реестр заморожен: новые имена
+из счётчиков ядра 0 и обработчики конфигурации работают под sample_lock,
+который ядро 1 держит на время сэмпла.
+"""
+
+import _thread
+import gc
+import time
+from array import array
+
+from metric_registry import MetricSnapshot
+
+
+class SampleRing:
+    """Кольцо записей фиксированного размера: один писатель, один читатель.
+
+    Запись занята писателем от reserve() до commit() и читателем от peek()
+    до release(); под замком меняются только индексы, копирование идёт без
+    него. При заполнении отбрасывается новый сэмпл: запись, которую сейчас
+    читает ядро 0, писатель не трогает.
+    """
+
+    def __init__(self, registry, size: int):
+        self.records = [MetricSnapshot(registry) for _ in range(size)]
+        self.seqs = array("i", bytes(4 * size))
+        self.size = size
+        self.lock = _thread.allocate_lock()
+        self.head = 0
+        self.count = 0
+        self.dropped = 0
+
+    def reserve(self):
+        """Свободная запись для писателя или None, если кольцо заполнено."""
+        with self.lock:
+            if self.count == self.size:
+                self.dropped += 1
+                return None
+            return self.records[(self.head + self.count) % self.size]
+
+    def commit(self, seq: int):
+        """Опубликовать запись, полученную из reserve()."""
+        with self.lock:
+            self.seqs[(self.head + self.count) % self.size] = seq
+            self.count += 1
+
+    def peek(self):
+        """(запись, номер сэмпла) самой старой записи или None."""
+        with self.lock:
+            if not self.count:
+                return None
+            return self.records[self.head], self.seqs[self.head]
+
+    def release(self):
+        """Вернуть прочитанную запись писателю."""
+        with self.lock:
+            self.head = (self.head + 1) % self.size
+            self.count -= 1
+
+    def pending(self) -> int:
+        return self.count
+
+
+class WLANState:
+    """Состояние WLAN, прочитанное ядром 0, с интерфейсом network.WLAN для сборщиков."""
+
+    def __init__(self, wlan):
+        self.wlan = wlan
+        self.connected = False
+        self.link_status = 0
+        self.rssi = -100
+        self.channel = -1
+
+    def refresh(self):
+        """Опросить драйвер (только ядро 0)."""
+        wlan = self.wlan
+        connected = wlan.isconnected()
+        self.link_status = wlan.status()
+        if connected:
+            self.rssi = wlan.status("rssi")
+            try:
+                self.channel = wlan.config("channel")
+            except (OSError, ValueError):
+                self.channel = -1
+        self.connected = connected
+
+    def isconnected(self) -> bool:
+        return self.connected
+
+    def status(self, param=None):
+        return self.rssi if param == "rssi" else self.link_status
+
+    def config(self, param):
+        if param == "channel":
+            return self.channel
+        return self.wlan.config(param)
+
+    def ifconfig(self):
+        return self.wlan.ifconfig()
+
+
+class DualCoreRuntime:
+    def __init__(self, monitor, ring_size: int = 8, poll_ms: int = 20):
+        self.monitor = monitor
+        self.poll_ms = poll_ms
+
+        metrics = monitor.metrics
+        self.ring = SampleRing(metrics.registry, ring_size)
+        # Последний сэмпл для /metrics: запись кольца после release() переписывает ядро 1
+        self.latest = MetricSnapshot(metrics.registry)
+        self.wlan_state = WLANState(metrics.wlan)
+        metrics.wlan = self.wlan_state
+        # Провайдеры счётчиков опрашивает ядро 0; в сэмпл идёт их копия,
+        # затем собственные счётчики кольца и джиттер ядра 1
+        self.network_providers = metrics.stats_providers
+        self.network_stats = {}
+        self.stats_lock = _thread.allocate_lock()
+        metrics.stats_providers = [self.get_stats, monitor.sample_jitter.get_stats]
+        self.sample_lock = _thread.allocate_lock()
+        subscriptions = monitor.mqtt.subscriptions
+        for topic in subscriptions:
+            subscriptions[topic] = self._locked(subscriptions[topic])
+        self.running = False
+        self.sampler_errors = 0
+
+    def _locked(self, handler):
+        """Обработчик конфигурации ядра 0, который не пересекается с сэмплом ядра 1."""
+
+        def locked(payload):
+            with self.sample_lock:
+                return handler(payload)
+
+        return locked
+
+    # --- ядро 1 -------------------------------------------------------------
+
+    def _sample(self, seq: int):
+        monitor = self.monitor
+        monitor.sample_jitter.mark(time.ticks_us())
+        if monitor.watchdog is not None:
+            monitor.watchdog.beat()
+        with self.sample_lock:
+            metrics = monitor.metrics.get_all_metrics(
+                reconnect_count=monitor.reconnect_count, error_count=monitor.error_count
+            )
+            record = self.ring.reserve()
+            if record is not None:
+                record.copy_from(metrics)
+                self.ring.commit(seq)
+
+    def sampler(self):
+        """Сэмплы по сетке времени; до срока - отсчёты АЦП с частотой ADC_SAMPLE_RATE."""
+        adc = self.monitor.metrics.adc_sampler
+        adc_period_us = 1000000 // adc.rate_hz if adc is not None else 0
+        # Интервал меняет топик конфигурации на ядре 0: читается на каждом сэмпле
+        schedule = self.monitor.schedule
+        deadline = time.ticks_us()
+        next_adc = deadline
+        seq = 0
+        while self.running:
+            now = time.ticks_us()
+            wait = time.ticks_diff(deadline, now)
+            if wait > 0:
+                if adc is not None:
+                    until_adc = time.ticks_diff(next_adc, now)
+                    if until_adc <= 0:
+                        adc.sample()
+                        next_adc = time.ticks_add(next_adc, adc_period_us)
+                        continue
+                    wait = min(wait, until_adc)
+                if wait > 2000:
+                    time.sleep_ms(wait // 1000)
+                else:
+                    time.sleep_us(wait)
+                continue
+
+            seq += 1
+            try:
+                self._sample(seq)
+            except Exception as e:
+                self.sampler_errors += 1
+                print(f"\n[!] Sampler error on core 1: {e}")
+            deadline = time.ticks_add(deadline, schedule.publish_interval_ms * 1000)
+            # После долгой паузы пропущенные слоты не догоняются пачкой
+            if time.ticks_diff(deadline, time.ticks_us()) < 0:
+                deadline = time.ticks_us()
+
+    # --- ядро 0 -------------------------------------------------------------
+
+    def _connect(self, online_once: bool) -> bool:
+        """WiFi и MQTT подняты; блокирующие подключения задерживают только ядро 0."""
+        monitor = self.monitor
+        wifi = monitor.wifi
+        if not wifi.is_connected():
+            print("\n[!] WiFi disconnected, reconnecting...")
+            if online_once:
+                wifi.mark_lost()
+            monitor.mqtt.disconnect()
+            if not wifi.connect():
+                return False
+            if online_once:
+                monitor.reconnect_count += 1
+            monitor.wifi_connected()
+
+        if monitor.mqtt_enabled and not monitor.mqtt.is_connected():
+            print("\n[!] MQTT disconnected, reconnecting...")
+            if online_once:
+                wifi.mark_lost(wifi=False)
+            if not monitor.connect_mqtt(max_attempts=1):
+                return False
+        return True
+
+    def refresh_stats(self):
+        """Собрать счётчики компонентов ядра 0 для следующего сэмпла ядра 1."""
+        stats = {}
+        for provider in self.network_providers:
+            stats.update(provider())
+        # Новые имена (например, гистограммы после первого переподключения)
+        # объявляет ядро 0, пока ядро 1 не читает реестр
+        registry = self.monitor.metrics.registry
+        for key in stats:
+            if key not in registry.index:
+                with self.sample_lock:
+                    for name, value in stats.items():
+                        registry.declare_value(name, value)
+                break
+        # Словарь после публикации не меняется: ядро 1 читает его без копии
+        with self.stats_lock:
+            self.network_stats = stats
+
+    def _drain(self, online: bool) -> bool:
+        """Опубликовать накопленные сэмплы, без сети - в offline-буфер.
+
+        True, если из кольца забран хотя бы один сэмпл.
+        """
+        monitor = self.monitor
+        drained = False
+        while True:
+            entry = self.ring.peek()
+            if entry is None:
+                return drained
+            drained = True
+            metrics, seq = entry
+            monitor.sample_seq = seq
+            if monitor.http is not None:
+                monitor.http.update(self.latest.copy_from(metrics))
+            if monitor.mqtt_enabled and online:
+                monitor.print_summary(metrics)
+                online = monitor.process_sample(metrics)
+            elif monitor.mqtt_enabled:
+                monitor.store_offline(metrics)
+            self.ring.release()
+
+    def network(self):
+        monitor = self.monitor
+        online_once = False
+        while True:
+            # Кормление прекращается, если ядро 1 перестало снимать сэмплы
+            if monitor.watchdog is not None:
+                monitor.watchdog.feed()
+            try:
+                online = self._connect(online_once)
+                online_once = online_once or online
+                self.wlan_state.refresh()
+                if self._drain(online):
+                    self.refresh_stats()
+                # Сканирование эфира блокирует только ядро 0
+                if online:
+                    monitor.wifi.refresh_ap()
+                # Запись на flash - с ядра 0, между публикациями
+                monitor.save_state()
+                if not online:
+                    backoff_ms = monitor.wifi.next_backoff()
+                    print(f"Network unavailable, retry in {backoff_ms} ms")
+                    monitor.pause(backoff_ms)
+                    continue
+                if monitor.mqtt_enabled:
+                    monitor.mqtt.poll_messages()
+                # До следующего опроса кольца (с /metrics - обслуживание скрейпов)
+                monitor.pause(self.poll_ms)
+
+            except MemoryError as e:
+                print(f"\n[!] Memory Error: {e}")
+                gc.collect()
+                time.sleep_ms(1000)
+
+            except Exception as e:
+                print(f"\n[!] Unexpected Error: {e}")
+                monitor.error_count += 1
+                monitor.metrics.record_mqtt_publish(success=False)
+                monitor.mqtt.disconnect()
+                time.sleep_ms(1000)
+
+    def get_stats(self) -> dict:
+        """Провайдер ядра 1: копия счётчиков ядра 0 и состояние кольца."""
+        with self.stats_lock:
+            stats = dict(self.network_stats)
+        stats["dual_ring_pending"] = self.ring.pending()
+        stats["dual_ring_dropped_total"] = self.ring.dropped
+        stats["dual_sampler_errors_total"] = self.sampler_errors
+        return stats
+
+    def run(self):
+        """Запустить сэмплирование на ядре 1 и сеть на ядре 0 (блокирует навсегда)."""
+        print("Starting dual-core runtime...")
+        self.refresh_stats()
+        # Пробный сэмпл на ядре 0 объявляет все имена метрик, дальше реестр не растёт
+        monitor = self.monitor
+        monitor.metrics.get_all_metrics(
+            reconnect_count=monitor.reconnect_count, error_count=monitor.error_count
+        )
+        monitor.metrics.registry.frozen = True
+        self.running = True
+        _thread.start_new_thread(self.sampler, ())
+        self.network()
@@ -0,0 +1,141 @@
+"""Табличные правила здоровья поверх сэмпла реестра метрик.
+
+Правило - (метрика, оператор, порог, уровень): например
+("temperature_celsius", ">", 70, "warning"). Пороги переводятся в единицы
+слотов реестра один раз, проверка сэмпла идёт целыми числами без выделения
+памяти. Число проблем - число метрик, у которых сработало хотя бы одно
+правило; статус - самый тяжёлый сработавший уровень.
+
+Набор правил задаётся в config.py (HEALTH_RULES) и заменяется на лету
+JSON-списком из retained-топика <MQTT_TOPIC>/config/health.
+"""
+
+import ujson
+
+from payload_schema import ENUMS
+
+LEVELS = ENUMS["health_status"]
+OPERATORS = (">", ">=", "<", "<=", "==", "!=")
+GT, GE, LT, LE, EQ, NE = range(6)
+
+DEFAULT_HEALTH_RULES = (
+    ("temperature_celsius", ">", 70, "warning"),
+    ("temperature_celsius", ">", 75, "critical"),
+    ("memory_usage_percent", ">", 90, "warning"),
+    ("memory_usage_percent", ">", 95, "critical"),
+    # Без WiFi RSSI равен -100, отдельное правило на обрыв не нужно
+    ("wifi_rssi_dbm", "<", -80, "warning"),
+)
+
+
+def validate_rules(rules) -> tuple:
+    """Проверить набор правил; ValueError с описанием первой ошибки."""
+    if not isinstance(rules, (list, tuple)):
+        raise ValueError("rules must be a list")
+    checked = []
+    for rule in rules:
+        if not isinstance(rule, (list, tuple)) or len(rule) != 4:
+            raise ValueError(f"rule {rule} must be [metric, op, threshold, level]")
+        metric, op, threshold, level = rule
+        if not isinstance(metric, str) or not metric:
+            raise ValueError(f"bad metric in {rule}")
+        if op not in OPERATORS:
+            raise ValueError(f"unknown operator in {rule}")
+        if level not in LEVELS or level == LEVELS[0]:
+            raise ValueError(f"level must be one of {LEVELS[1:]} in {rule}")
+        enum = ENUMS.get(metric)
+        if enum is not None:
+            if threshold not in enum:
+                raise ValueError(f"threshold must be one of {enum} in {rule}")
+        elif isinstance(threshold, bool) or not isinstance(threshold, (int, float)):
+            raise ValueError(f"threshold must be a number in {rule}")
+        checked.append((metric, op, threshold, level))
+    return tuple(checked)
+
+
+class HealthRules:
+    def __init__(self, rules=DEFAULT_HEALTH_RULES):
+        self.rules = validate_rules(rules)
+        # Правила в единицах слотов, пересобираются при смене набора или росте реестра
+        self.compiled = ()
+        self.compiled_for = None
+        self.compiled_slots = -1
+        self.reloads_total = 0
+        self.rejected_total = 0
+
+    def load(self, rules) -> bool:
+        """Заменить набор правил; при ошибке остаётся прежний."""
+        try:
+            self.rules = validate_rules(rules)
+        except ValueError as e:
+            self.rejected_total += 1
+            print(f"Health rules rejected: {e}")
+            return False
+        self.compiled_slots = -1
+        self.reloads_total += 1
+        print(f"Health rules loaded: {len(self.rules)} rules")
+        return True
+
+    def load_json(self, payload) -> bool:
+        """Обработчик сообщения из топика конфигурации."""
+        try:
+            rules = ujson.loads(payload)
+        except ValueError as e:
+            self.rejected_total += 1
+            print(f"Health rules rejected: bad JSON ({e})")
+            return False
+        return self.load(rules)
+
+    def _compile(self, registry):
+        compiled = []
+        for metric, op, threshold, level in self.rules:
+            slot = registry.index.get(metric)
+            if slot is None:
+                # Метрика ещё не появлялась в сэмплах: правило подключится позже
+                continue
+            enum = registry.enums[slot]
+            if enum is not None:
+                raw = enum.index(threshold)
+            else:
+                raw = int(round(threshold * registry.scales[slot]))
+            compiled.append((slot, OPERATORS.index(op), raw, LEVELS.index(level)))
+        # Правила одной метрики подряд: проблема считается один раз на метрику
+        compiled.sort()
+        self.compiled = tuple(compiled)
+        self.compiled_for = registry
+        self.compiled_slots = len(registry.names)
+
+    def evaluate(self, metrics) -> int:
+        """(статус, число проблем) одним целым: status * 16 + issues."""
+        registry = metrics.registry
+        if self.compiled_for is not registry or self.compiled_slots != len(registry.names):
+            self._compile(registry)
+        values = metrics.values
+        present = metrics.present
+        status = 0
+        issues = 0
+        counted_slot = -1
+        for slot, op, threshold, level in self.compiled:
+            if not present[slot]:
+                continue
+            value = values[slot]
+            if op == GT:
+                fired = value > threshold
+            elif op == GE:
+                fired = value >= threshold
+            elif op == LT:
+                fired = value < threshold
+            elif op == LE:
+                fired = value <= threshold
+            elif op == EQ:
+                fired = value == threshold
+            else:
+                fired = value != threshold
+            if not fired:
+                continue
+            if level > status:
+                status = level
+            if slot != counted_slot and issues < 15:
+                issues += 1
+                counted_slot = slot
+        return status * 16 + issues
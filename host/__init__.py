@@ -0,0 +1 @@
+"""Хостовые (CPython) инструменты для потока pico_metrics."""
@@ -0,0 +1,817 @@
+"""Архив потока pico_metrics: колоночные сегменты по устройствам и дням.
+
+Prometheus хранит 30 дней и видит только снимки экспортёра раз в scrape_interval.
+Архив пишет каждый опубликованный сэмпл, включая строковые поля
+(health_status, power_source и т.д.), и досланные /replay.
+
+Раскладка на диске:
+
+    <root>/<устройство>/device.json        топик и последнее birth-сообщение /info
+    <root>/<устройство>/journal.jsonl      сэмплы ещё не запечатанного сегмента
+    <root>/<устройство>/<ГГГГ-ММ-ДД>/<t0>-<t1>.seg
+
+Сэмплы копятся в памяти по колонкам (и строкой в журнале, чтобы пережить
+перезапуск) и запечатываются в неизменяемый сегмент при segment_rows строках
+или смене суток. Сегмент: заголовок, сжатые zlib блоки - время и по блоку
+на метрику, в конце индекс блоков со статистикой (count/min/max/sum, для
+строк - число сэмплов на значение). Числа с фиксированной точкой хранятся
+целыми разностями соседних значений, строки - словарём и кодами.
+
+Сегменты читаются через mmap. Диапазон времени отсекает дни по каталогам
+и сегменты по имени файла, запрос распаковывает только блоки нужной метрики,
+а агрегаты по сегментам, целиком попавшим в окно, берутся из индекса без
+распаковки.
+
+Запуск:
+    python -m host.archive --host localhost --port 1884 --topic pico_metrics --root archive
+
+HTTP API (JSON, время - unix-секунды):
+    /api/v1/devices
+    /api/v1/metrics?device=...
+    /api/v1/range?device=...&metric=...&start=...&end=...
+    /api/v1/aggregate?device=...&metric=...&start=...&end=...&step=...
+"""
+
+import argparse
+import asyncio
+import calendar
+import json
+import math
+import mmap
+import os
+import struct
+import time
+import urllib.parse
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
+
+from host.codec import DecodeError, decode, decode_batch
+from host.exporter import split_topic
+from host.mqtt_client import MQTTClient
+
+SEGMENT_MAGIC = b"PCAS"
+SEGMENT_VERSION = 1
+SEGMENT_SUFFIX = ".seg"
+# magic, версия, резерв, колонок, строк, первое и последнее время (мс),
+# смещение и длина сжатого JSON-индекса
+HEADER = struct.Struct("<4sBBHIqqII")
+
+# Множители фиксированной точки: прошивка публикует не больше двух знаков
+SCALES = (1, 100, 10000)
+# Целые до 2**53 переживают float без потерь
+INTEGER_LIMIT = 2**53
+MISSING_CODE = 0xFFFF
+COMPRESS_LEVEL = 6
+NAN = float("nan")
+
+
+class ArchiveError(ValueError):
+    """Файл сегмента повреждён или другой версии."""
+
+
+def day_of(timestamp_ms: int) -> str:
+    """Каталог суток (UTC) для времени в мс."""
+    return time.strftime("%Y-%m-%d", time.gmtime(timestamp_ms // 1000))
+
+
+def _day_start_ms(day: str) -> int:
+    return calendar.timegm(time.strptime(day, "%Y-%m-%d")) * 1000
+
+
+def _bounds(start: Optional[float], end: Optional[float]) -> Tuple[int, int]:
+    """Полуинтервал [start, end) в мс; None - без ограничения."""
+    start_ms = -(2**62) if start is None else int(start * 1000)
+    end_ms = 2**62 if end is None else int(end * 1000)
+    return start_ms, end_ms
+
+
+def scalar_metrics(metrics) -> Tuple[dict, int]:
+    """Сэмпл без вложенных значений: (метрики, число отброшенных); не объект - DecodeError."""
+    if not isinstance(metrics, dict):
+        raise DecodeError("payload is not a JSON object")
+    clean = {
+        key: value
+        for key, value in metrics.items()
+        if value is None or isinstance(value, (str, int, float))
+    }
+    return clean, len(metrics) - len(clean)
+
+
+def _integer_scale(numbers: List[float]) -> Optional[int]:
+    """Наименьший множитель из SCALES, с которым все значения - точные целые."""
+    for scale in SCALES:
+        if all(abs(x) * scale < INTEGER_LIMIT and round(x * scale) / scale == x for x in numbers):
+            return scale
+    return None
+
+
+def encode_column(values: list) -> Tuple[dict, bytes]:
+    """Блок колонки (до сжатия) и запись индекса со статистикой."""
+    present = [v for v in values if v is not None]
+    entry = {"count": len(present)}
+
+    if any(isinstance(v, str) for v in present):
+        counts: Dict[str, int] = {}
+        for value in present:
+            value = str(value)
+            counts[value] = counts.get(value, 0) + 1
+        dictionary = sorted(counts)
+        codes = {value: i for i, value in enumerate(dictionary)}
+        data = array("H", (MISSING_CODE if v is None else codes[str(v)] for v in values))
+        entry.update(kind="s", dict=dictionary, counts=counts)
+        return entry, data.tobytes()
+
+    numbers = [float(v) for v in present]
+    if numbers:
+        entry.update(min=min(numbers), max=max(numbers), sum=math.fsum(numbers))
+    scale = _integer_scale(numbers)
+    if scale is None:
+        data = array("d", (NAN if v is None else float(v) for v in values))
+        entry["kind"] = "f"
+        return entry, data.tobytes()
+
+    # Разности соседних значений: счётчики и медленные величины сжимаются почти в ноль
+    deltas = array("q")
+    previous = 0
+    for value in values:
+        current = previous if value is None else int(round(value * scale))
+        deltas.append(current - previous)
+        previous = current
+    entry.update(kind="i", scale=scale)
+    if len(present) < len(values):
+        entry["sparse"] = True
+        return entry, bytes(0 if v is None else 1 for v in values) + deltas.tobytes()
+    return entry, deltas.tobytes()
+
+
+def decode_column(entry: dict, data: bytes, rows: int) -> list:
+    """Значения колонки по строкам сегмента; отсутствующие - None."""
+    kind = entry["kind"]
+    if kind == "s":
+        codes = array("H")
+        codes.frombytes(data)
+        dictionary = entry["dict"]
+        return [None if code == MISSING_CODE else dictionary[code] for code in codes]
+    if kind == "f":
+        numbers = array("d")
+        numbers.frombytes(data)
+        return [None if v != v else v for v in numbers]
+
+    present = None
+    if entry.get("sparse"):
+        present, data = data[:rows], data[rows:]
+    deltas = array("q")
+    deltas.frombytes(data)
+    values = list(accumulate(deltas))
+    scale = entry["scale"]
+    if scale != 1:
+        values = [v / scale for v in values]
+    if present is not None:
+        values = [v if flag else None for v, flag in zip(values, present)]
+    return values
+
+
+def write_segment(path: str, timestamps: List[int], columns: Dict[str, list]) -> int:
+    """Записать сегмент атомарно (через временный файл); возвращает размер в байтах."""
+    deltas = array("q", (b - a for a, b in zip([0] + timestamps[:-1], timestamps)))
+    blocks = [zlib.compress(deltas.tobytes(), COMPRESS_LEVEL)]
+    offset = HEADER.size
+    index = {"time": [offset, len(blocks[0])], "columns": {}}
+    offset += len(blocks[0])
+    for key, values in columns.items():
+        entry, data = encode_column(values)
+        if not entry["count"]:
+            continue
+        block = zlib.compress(data, COMPRESS_LEVEL)
+        entry["block"] = [offset, len(block)]
+        index["columns"][key] = entry
+        blocks.append(block)
+        offset += len(block)
+
+    index_block = zlib.compress(json.dumps(index, separators=(",", ":")).encode(), COMPRESS_LEVEL)
+    header = HEADER.pack(
+        SEGMENT_MAGIC,
+        SEGMENT_VERSION,
+        0,
+        len(index["columns"]),
+        len(timestamps),
+        timestamps[0],
+        timestamps[-1],
+        offset,
+        len(index_block),
+    )
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        f.write(header)
+        for block in blocks:
+            f.write(block)
+        f.write(index_block)
+    os.replace(temporary, path)
+    return offset + len(index_block)
+
+
+class Segment:
+    """Запечатанный сегмент через mmap: распаковываются только запрошенные блоки."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER.size:
+            raise ArchiveError(f"{path}: truncated segment")
+        magic, version, _, _, rows, start_ms, end_ms, index_offset, index_length = (
+            HEADER.unpack_from(self.map, 0)
+        )
+        if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+            raise ArchiveError(f"{path}: not a segment of version {SEGMENT_VERSION}")
+        self.rows = rows
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        index = json.loads(self._block([index_offset, index_length]))
+        self.time_block = index["time"]
+        self.columns: Dict[str, dict] = index["columns"]
+        self._timestamps: Optional[List[int]] = None
+
+    def _block(self, location) -> bytes:
+        offset, length = location
+        return zlib.decompress(self.map[offset : offset + length])
+
+    def timestamps(self) -> List[int]:
+        """Время строк в мс по возрастанию (кэшируется: нужно почти каждому запросу)."""
+        if self._timestamps is None:
+            deltas = array("q")
+            deltas.frombytes(self._block(self.time_block))
+            self._timestamps = list(accumulate(deltas))
+        return self._timestamps
+
+    def column(self, key: str) -> Optional[list]:
+        entry = self.columns.get(key)
+        if entry is None:
+            return None
+        return decode_column(entry, self._block(entry["block"]), self.rows)
+
+    def close(self):
+        self.map.close()
+
+
+class DeviceBuffer:
+    """Незапечатанные сэмплы устройства по колонкам и их журнал."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.timestamps: List[int] = []
+        self.columns: Dict[str, list] = {}
+        # Последние значения: дельты JSON дополняются до полного сэмпла
+        self.state: dict = {}
+        # Сутки последнего живого сэмпла: их смена запечатывает сегмент
+        self.day: Optional[str] = None
+        self.journal = None
+
+    @property
+    def journal_path(self) -> str:
+        return os.path.join(self.directory, "journal.jsonl")
+
+    def add(self, timestamp_ms: int, metrics: dict, merge: bool):
+        """Строка: при merge - текущее состояние после дельты, иначе сэмпл как есть."""
+        if merge:
+            self.state.update(metrics)
+            metrics = self.state
+            self.day = day_of(timestamp_ms)
+        columns = self.columns
+        rows = len(self.timestamps)
+        for key in metrics:
+            if key not in columns:
+                columns[key] = [None] * rows
+        get = metrics.get
+        for key, column in columns.items():
+            column.append(get(key))
+        self.timestamps.append(timestamp_ms)
+
+    def log(self, line: dict):
+        if self.journal is None:
+            # Построчная буферизация: каждая строка сразу уходит в файл
+            self.journal = open(self.journal_path, "a", buffering=1)
+        self.journal.write(json.dumps(line, separators=(",", ":")) + "\n")
+
+    def recover(self):
+        """Перечитать журнал после перезапуска."""
+        try:
+            with open(self.journal_path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Строка, оборванная при аварийной остановке
+                        continue
+                    # Журнал прежних версий мог сохранить вложенные значения
+                    try:
+                        if "s" in record:
+                            self.state = scalar_metrics(record["s"])[0]
+                        else:
+                            metrics = scalar_metrics(record["m"])[0]
+                            self.add(record["t"], metrics, not record.get("r"))
+                    except (DecodeError, KeyError, TypeError):
+                        continue
+        except OSError:
+            pass
+
+    def reset(self):
+        """После запечатывания: пустые колонки, журнал начинается с состояния."""
+        self.timestamps = []
+        self.columns = {}
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = open(self.journal_path, "w", buffering=1)
+        self.log({"s": self.state})
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+
+class Accumulator:
+    """Агрегат одного окна: числа или число сэмплов на строковое значение."""
+
+    __slots__ = ("count", "min", "max", "sum", "counts")
+
+    def __init__(self):
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sum = 0.0
+        self.counts: Optional[Dict[str, int]] = None
+
+    def add(self, value):
+        self.count += 1
+        if isinstance(value, str):
+            if self.counts is None:
+                self.counts = {}
+            self.counts[value] = self.counts.get(value, 0) + 1
+            return
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.sum += value
+
+    def merge(self, entry: dict):
+        """Статистика блока из индекса сегмента."""
+        self.count += entry["count"]
+        if entry["kind"] == "s":
+            if self.counts is None:
+                self.counts = {}
+            for value, count in entry["counts"].items():
+                self.counts[value] = self.counts.get(value, 0) + count
+            return
+        self.min = min(self.min, entry["min"])
+        self.max = max(self.max, entry["max"])
+        self.sum += entry["sum"]
+
+    def result(self, start_ms: Optional[int]) -> dict:
+        result = {"start": None if start_ms is None else start_ms / 1000, "count": self.count}
+        if self.counts is not None:
+            result["counts"] = self.counts
+        else:
+            result.update(min=self.min, max=self.max, sum=self.sum, avg=self.sum / self.count)
+        return result
+
+
+class Archive:
+    """Запись сэмплов в сегменты и запросы к ним."""
+
+    def __init__(self, root: str, segment_rows: int = 4096, cache_segments: int = 512):
+        self.root = root
+        self.segment_rows = segment_rows
+        self.cache_segments = cache_segments
+        self.buffers: Dict[str, DeviceBuffer] = {}
+        self._segments: "OrderedDict[str, Segment]" = OrderedDict()
+        self.rows_total = 0
+        self.segments_total = 0
+        self.segment_bytes_total = 0
+        os.makedirs(root, exist_ok=True)
+        for device in self.devices():
+            if os.path.exists(os.path.join(root, device, "journal.jsonl")):
+                self._buffer(device).recover()
+
+    # --- запись ---------------------------------------------------------------
+
+    def _buffer(self, device: str) -> DeviceBuffer:
+        buffer = self.buffers.get(device)
+        if buffer is None:
+            directory = os.path.join(self.root, device)
+            os.makedirs(directory, exist_ok=True)
+            buffer = self.buffers[device] = DeviceBuffer(directory)
+        return buffer
+
+    def append(self, device: str, timestamp: float, metrics: dict, merge: bool = True):
+        """Сэмпл устройства на момент timestamp (unix-секунды).
+
+        merge=False - полный сэмпл не по порядку (досланный /replay): текущее
+        состояние дельт он не меняет.
+        """
+        timestamp_ms = int(round(timestamp * 1000))
+        buffer = self._buffer(device)
+        if merge and buffer.day is not None and day_of(timestamp_ms) != buffer.day:
+            self.seal(device)
+        buffer.add(timestamp_ms, metrics, merge)
+        line = {"t": timestamp_ms, "m": metrics}
+        if not merge:
+            line["r"] = 1
+        buffer.log(line)
+        self.rows_total += 1
+        if len(buffer.timestamps) >= self.segment_rows:
+            self.seal(device)
+
+    def seal(self, device: Optional[str] = None):
+        """Запечатать буферы (все или одного устройства) в сегменты по суткам."""
+        devices = [device] if device is not None else list(self.buffers)
+        for name in devices:
+            buffer = self.buffers.get(name)
+            if buffer is None or not buffer.timestamps:
+                continue
+            days: Dict[str, List[int]] = {}
+            for row, timestamp_ms in enumerate(buffer.timestamps):
+                days.setdefault(day_of(timestamp_ms), []).append(row)
+            for day, rows in days.items():
+                rows.sort(key=buffer.timestamps.__getitem__)
+                timestamps = [buffer.timestamps[row] for row in rows]
+                columns = {
+                    key: [values[row] for row in rows] for key, values in buffer.columns.items()
+                }
+                directory = os.path.join(buffer.directory, day)
+                os.makedirs(directory, exist_ok=True)
+                path = self._segment_path(directory, timestamps[0], timestamps[-1])
+                self.segment_bytes_total += write_segment(path, timestamps, columns)
+                self.segments_total += 1
+            buffer.reset()
+
+    @staticmethod
+    def _segment_path(directory: str, start_ms: int, end_ms: int) -> str:
+        """<t0>-<t1>.seg; досланные сэмплы того же диапазона получают суффикс."""
+        base = os.path.join(directory, f"{start_ms}-{end_ms}")
+        path, n = base + SEGMENT_SUFFIX, 0
+        while os.path.exists(path):
+            n += 1
+            path = f"{base}-{n}{SEGMENT_SUFFIX}"
+        return path
+
+    def set_info(self, device: str, topic: str, info: Optional[dict] = None):
+        """Топик устройства и birth-сообщение для меток при выгрузке в Prometheus."""
+        path = os.path.join(self._buffer(device).directory, "device.json")
+        described = self.describe(device)
+        described["topic"] = topic
+        if info is not None:
+            described["info"] = info
+        with open(path + ".tmp", "w") as f:
+            json.dump(described, f)
+        os.replace(path + ".tmp", path)
+
+    def describe(self, device: str) -> dict:
+        try:
+            with open(os.path.join(self.root, device, "device.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def close(self):
+        """Журналы закрываются, буферы остаются в них до следующего запуска."""
+        for buffer in self.buffers.values():
+            buffer.close()
+        for segment in self._segments.values():
+            segment.close()
+        self._segments.clear()
+
+    # --- чтение ---------------------------------------------------------------
+
+    def devices(self) -> List[str]:
+        return sorted(
+            name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name))
+        )
+
+    def _segment(self, path: str) -> Segment:
+        """Открытый сегмент из LRU-кэша: mmap и индекс читаются один раз."""
+        segment = self._segments.pop(path, None)
+        if segment is None:
+            segment = Segment(path)
+            # Вытесненный сегмент не закрывается: его может держать текущий запрос,
+            # mmap освободится вместе с последней ссылкой
+            if len(self._segments) >= self.cache_segments:
+                self._segments.popitem(last=False)
+        self._segments[path] = segment
+        return segment
+
+    def segments(self, device: str, start_ms: int, end_ms: int) -> List[Segment]:
+        """Сегменты, пересекающие [start_ms, end_ms), по началу диапазона."""
+        directory = os.path.join(self.root, device)
+        found = []
+        try:
+            days = os.listdir(directory)
+        except OSError:
+            return []
+        for day in days:
+            if len(day) != 10 or not os.path.isdir(os.path.join(directory, day)):
+                continue
+            day_start = _day_start_ms(day)
+            if day_start >= end_ms or day_start + 86400000 <= start_ms:
+                continue
+            for name in os.listdir(os.path.join(directory, day)):
+                if not name.endswith(SEGMENT_SUFFIX):
+                    continue
+                first, last = name[: -len(SEGMENT_SUFFIX)].split("-")[:2]
+                if int(first) < end_ms and int(last) >= start_ms:
+                    found.append((int(first), os.path.join(directory, day, name)))
+        found.sort()
+        return [self._segment(path) for _, path in found]
+
+    def metrics(self, device: str) -> List[str]:
+        """Метрики устройства: из индексов сегментов и буфера."""
+        keys = set()
+        for segment in self.segments(device, *_bounds(None, None)):
+            keys.update(segment.columns)
+        buffer = self.buffers.get(device)
+        if buffer is not None:
+            keys.update(buffer.columns)
+        return sorted(keys)
+
+    def _buffered(self, device: str, key: str, start_ms: int, end_ms: int):
+        buffer = self.buffers.get(device)
+        if buffer is None or key not in buffer.columns:
+            return []
+        return [
+            (timestamp_ms, value)
+            for timestamp_ms, value in zip(buffer.timestamps, buffer.columns[key])
+            if value is not None and start_ms <= timestamp_ms < end_ms
+        ]
+
+    def range(
+        self, device: str, key: str, start: Optional[float] = None, end: Optional[float] = None
+    ) -> Tuple[List[float], list]:
+        """Сэмплы метрики в [start, end): время (unix-секунды) и значения."""
+        start_ms, end_ms = _bounds(start, end)
+        points = []
+        for segment in self.segments(device, start_ms, end_ms):
+            column = segment.column(key)
+            if column is None:
+                continue
+            timestamps = segment.timestamps()
+            low = bisect_left(timestamps, start_ms)
+            high = bisect_left(timestamps, end_ms)
+            points.extend(
+                point
+                for point in zip(timestamps[low:high], column[low:high])
+                if point[1] is not None
+            )
+        points.extend(self._buffered(device, key, start_ms, end_ms))
+        # Сегменты с досланными сэмплами перекрываются с соседними
+        points.sort(key=lambda point: point[0])
+        return [t / 1000 for t, _ in points], [value for _, value in points]
+
+    def aggregate(
+        self,
+        device: str,
+        key: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        step: Optional[float] = None,
+    ) -> List[dict]:
+        """count/min/max/sum/avg (для строк - counts по значениям) за диапазон.
+
+        step - окна по step секунд, выровненные по unix-времени. Сегмент,
+        целиком лежащий в одном окне, учитывается по индексу без распаковки.
+        """
+        start_ms, end_ms = _bounds(start, end)
+        step_ms = int(step * 1000) if step else 0
+        buckets: Dict[Optional[int], Accumulator] = {}
+
+        def bucket(timestamp_ms: int) -> Accumulator:
+            window = timestamp_ms - timestamp_ms % step_ms if step_ms else None
+            accumulator = buckets.get(window)
+            if accumulator is None:
+                accumulator = buckets[window] = Accumulator()
+            return accumulator
+
+        for segment in self.segments(device, start_ms, end_ms):
+            entry = segment.columns.get(key)
+            if entry is None:
+                continue
+            inside = start_ms <= segment.start_ms and segment.end_ms < end_ms
+            if inside and (not step_ms or segment.start_ms // step_ms == segment.end_ms // step_ms):
+                bucket(segment.start_ms).merge(entry)
+                continue
+            timestamps = segment.timestamps()
+            column = segment.column(key)
+            low = bisect_left(timestamps, start_ms)
+            high = bisect_left(timestamps, end_ms)
+            for timestamp_ms, value in zip(timestamps[low:high], column[low:high]):
+                if value is not None:
+                    bucket(timestamp_ms).add(value)
+        for timestamp_ms, value in self._buffered(device, key, start_ms, end_ms):
+            bucket(timestamp_ms).add(value)
+
+        if not step_ms:
+            return [buckets[None].result(None)] if None in buckets else []
+        return [buckets[window].result(window) for window in sorted(buckets)]
+
+
+class Archiver:
+    """Разбор сообщений pico_metrics в архив и HTTP API запросов."""
+
+    def __init__(self, archive: Archive, root: Optional[str] = None):
+        self.archive = archive
+        # Корневой топик: устройство <root>/<id> хранится в каталоге <id>
+        self.root = root
+        self.described = set()
+        self.messages_total = 0
+        self.decode_errors_total = 0
+        self.replayed_samples_total = 0
+        self.queries_total = 0
+
+    def device_name(self, base: str) -> str:
+        if self.root and base.startswith(self.root + "/"):
+            base = base[len(self.root) + 1 :]
+        return base.replace("/", "_")
+
+    def handle(self, topic: str, payload: bytes, received_at: Optional[float] = None):
+        """Обработать одно MQTT-сообщение."""
+        if received_at is None:
+            received_at = time.time()
+        self.messages_total += 1
+        base, suffix = split_topic(topic)
+        if suffix not in ("", "bin", "batch", "replay", "info"):
+            return
+        device = self.device_name(base)
+        archive = self.archive
+        try:
+            # Разбор целиком до записи: в журнал попадают только плоские сэмплы
+            if suffix in ("", "bin"):
+                samples = [(received_at, decode(payload))]
+            elif suffix in ("batch", "replay"):
+                samples = [
+                    (sample.timestamp, sample.metrics)
+                    for sample in decode_batch(payload, received_at)
+                ]
+            else:
+                info = json.loads(payload)
+                if not isinstance(info, dict):
+                    raise DecodeError("info is not a JSON object")
+                archive.set_info(device, base, info)
+                self.described.add(device)
+                return
+            dropped = 0
+            for i, (timestamp, metrics) in enumerate(samples):
+                metrics, count = scalar_metrics(metrics)
+                samples[i] = (timestamp, metrics)
+                dropped += count
+        except (DecodeError, ValueError) as e:
+            self.decode_errors_total += 1
+            print(f"Skipping payload from {topic}: {e}")
+            return
+        if dropped:
+            self.decode_errors_total += 1
+            print(f"Dropped {dropped} non-scalar values from {topic}")
+
+        # Сэмплы из offline-буфера (/replay): полные и старше текущего состояния
+        merge = suffix != "replay"
+        for timestamp, metrics in samples:
+            archive.append(device, timestamp, metrics, merge=merge)
+        if not merge:
+            self.replayed_samples_total += len(samples)
+        if device not in self.described:
+            archive.set_info(device, base)
+            self.described.add(device)
+
+    def query(self, path: str, params: Dict[str, str]):
+        """Ответ API; ValueError - неверный запрос."""
+        self.queries_total += 1
+        archive = self.archive
+
+        def number(name: str) -> Optional[float]:
+            return float(params[name]) if params.get(name) else None
+
+        if path == "/api/v1/devices":
+            return {device: archive.describe(device) for device in archive.devices()}
+        if path not in ("/api/v1/metrics", "/api/v1/range", "/api/v1/aggregate"):
+            raise LookupError(path)
+        if "device" not in params:
+            raise ValueError("device is required")
+        device = params["device"]
+        if path == "/api/v1/metrics":
+            return archive.metrics(device)
+        if "metric" not in params:
+            raise ValueError("metric is required")
+        if path == "/api/v1/range":
+            timestamps, values = archive.range(
+                device, params["metric"], number("start"), number("end")
+            )
+            return {"timestamps": timestamps, "values": values}
+        return archive.aggregate(
+            device, params["metric"], number("start"), number("end"), number("step")
+        )
+
+    def metrics_body(self) -> bytes:
+        archive = self.archive
+        counters = (
+            ("pico_archive_messages_total", self.messages_total),
+            ("pico_archive_decode_errors_total", self.decode_errors_total),
+            ("pico_archive_replayed_samples_total", self.replayed_samples_total),
+            ("pico_archive_rows_total", archive.rows_total),
+            ("pico_archive_segments_total", archive.segments_total),
+            ("pico_archive_segment_bytes_total", archive.segment_bytes_total),
+            ("pico_archive_queries_total", self.queries_total),
+        )
+        return "".join(
+            f"# TYPE {name} counter\n{name} {value}\n" for name, value in counters
+        ).encode()
+
+    async def _http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request.split()
+            content_type = b"application/json"
+            status = b"200 OK"
+            if len(parts) < 2 or parts[0] != b"GET":
+                body, status = b'{"error":"bad request"}', b"400 Bad Request"
+            else:
+                url = urllib.parse.urlsplit(parts[1].decode())
+                params = dict(urllib.parse.parse_qsl(url.query))
+                if url.path == "/metrics":
+                    body = self.metrics_body()
+                    content_type = b"text/plain; version=0.0.4; charset=utf-8"
+                else:
+                    try:
+                        body = json.dumps(self.query(url.path, params)).encode()
+                    except LookupError:
+                        body, status = b'{"error":"not found"}', b"404 Not Found"
+                    except ValueError as e:
+                        body = json.dumps({"error": str(e)}).encode()
+                        status = b"400 Bad Request"
+            header = b"HTTP/1.1 %s\r\nContent-Type: %s\r\nContent-Length: %d\r\n" % (
+                status,
+                content_type,
+                len(body),
+            )
+            writer.write(header + b"Connection: close\r\n\r\n" + body)
+            await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_http(self, host: str, port: int) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self._http, host, port)
+
+    async def consume(self, host: str, port: int, topic: str, client_id: str = "pico-archiver"):
+        """Подписка на <topic> и <topic>/# с переподключением при обрыве."""
+        while True:
+            client = MQTTClient(host, port, client_id=client_id)
+            try:
+                await client.connect()
+                await client.subscribe(topic)
+                await client.subscribe(topic + "/#")
+                print(f"Archiving {topic} and {topic}/#")
+                async for message_topic, payload, _ in client.messages():
+                    self.handle(message_topic, payload)
+                print("MQTT connection lost")
+            except (ConnectionError, OSError) as e:
+                print(f"MQTT error: {e}")
+            await client.disconnect()
+            await asyncio.sleep(5)
+
+
+async def run_archiver(args):
+    archive = Archive(args.root, segment_rows=args.segment_rows)
+    archiver = Archiver(archive, root=args.topic)
+    server = await archiver.serve_http(args.listen_host, args.listen)
+    print(f"Archive in {args.root}, query API on {args.listen_host}:{args.listen}")
+    try:
+        async with server:
+            await archiver.consume(args.host, args.port, args.topic)
+    finally:
+        archive.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1884)
+    parser.add_argument("--topic", default="pico_metrics")
+    parser.add_argument("--root", default="archive")
+    parser.add_argument("--segment-rows", type=int, default=4096)
+    parser.add_argument("--listen-host", default="0.0.0.0")
+    parser.add_argument("--listen", type=int, default=9101)
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_archiver(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
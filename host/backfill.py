@@ -0,0 +1,137 @@
+"""Выгрузка диапазона архива в Prometheus (backfill).
+
+Сэмплы из host.archive пишутся в OpenMetrics с именами и метками экспортёра
+(mqtt_<метрика>{topic="...",device="..."}, перечисления - state-gauge), затем
+promtool tsdb create-blocks-from openmetrics превращает файл в блоки TSDB.
+Все семейства объявляются gauge: тип в TSDB не хранится, rate() по счётчикам
+работает как обычно.
+
+Блоки старше --storage.tsdb.retention.time Prometheus удалит при ближайшей
+компактизации: архив за прошлые месяцы стоит выгружать в отдельный Prometheus
+с нужным retention.
+
+Запуск из корня репозитория:
+    python -m host.backfill --root archive --start 2025-01-01 --end 2025-02-01 -o backfill.om
+    python -m host.backfill --root archive --start 2025-01-01 --blocks data/ --promtool promtool
+"""
+
+import argparse
+import calendar
+import subprocess
+import time
+from typing import Iterable, List, Optional
+
+from host.archive import Archive
+from host.exporter import escape_label, format_value, metric_name
+from payload_schema import ENUMS
+
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """unix-секунды или дата ГГГГ-ММ-ДД (UTC)."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return float(calendar.timegm(time.strptime(value, "%Y-%m-%d")))
+
+
+def device_labels(archive: Archive, device: str, root: str) -> str:
+    """Метки как у экспортёра: topic - корневой топик, device - id из топика или /info."""
+    described = archive.describe(device)
+    topic = described.get("topic", device)
+    unique_id = described.get("info", {}).get("sys_unique_id")
+    label = unique_id
+    if root and topic.startswith(root + "/"):
+        topic, label = root, topic[len(root) + 1 :]
+    labels = f'topic="{escape_label(topic)}"'
+    if label:
+        labels += f',device="{escape_label(str(label))}"'
+    return labels
+
+
+def render(
+    archive: Archive,
+    devices: List[str],
+    root: str,
+    start: Optional[float],
+    end: Optional[float],
+    keys: Optional[List[str]] = None,
+) -> Iterable[str]:
+    """Строки OpenMetrics: семейство за семейством, серия за серией по времени."""
+    labels = {device: device_labels(archive, device, root) for device in devices}
+    if keys is None:
+        keys = sorted({key for device in devices for key in archive.metrics(device)})
+    for key in keys:
+        name = metric_name(key)
+        states = ENUMS.get(key)
+        declared = False
+        for device in devices:
+            timestamps, values = archive.range(device, key, start, end)
+            if not timestamps:
+                continue
+            if states is None and isinstance(values[0], str):
+                # Строки вне перечислений - метки /info, а не ряды
+                break
+            if not declared:
+                yield f"# TYPE {name} gauge\n"
+                declared = True
+            # promtool отклоняет повторы времени в серии (сэмпл и его досылка)
+            points = [
+                (timestamp, value)
+                for i, (timestamp, value) in enumerate(zip(timestamps, values))
+                if i == 0 or timestamp != timestamps[i - 1]
+            ]
+            if states is None:
+                series = labels[device]
+                for timestamp, value in points:
+                    yield f"{name}{{{series}}} {format_value(float(value))} {timestamp:.3f}\n"
+                continue
+            for state in states:
+                series = f'{labels[device]},{key}="{state}"'
+                for timestamp, value in points:
+                    yield f"{name}{{{series}}} {int(value == state)} {timestamp:.3f}\n"
+    yield "# EOF\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--root", default="archive")
+    parser.add_argument("--topic", default="pico_metrics", help="корневой топик для меток")
+    parser.add_argument("--start", help="unix-секунды или ГГГГ-ММ-ДД")
+    parser.add_argument("--end", help="unix-секунды или ГГГГ-ММ-ДД, не включая")
+    parser.add_argument("--devices", help="через запятую, по умолчанию все")
+    parser.add_argument("--metrics", help="через запятую, по умолчанию все")
+    parser.add_argument("-o", "--output", default="backfill.om")
+    parser.add_argument("--blocks", help="каталог блоков TSDB: запустить promtool")
+    parser.add_argument("--promtool", default="promtool")
+    args = parser.parse_args()
+
+    archive = Archive(args.root)
+    devices = args.devices.split(",") if args.devices else archive.devices()
+    keys = args.metrics.split(",") if args.metrics else None
+    start, end = parse_time(args.start), parse_time(args.end)
+
+    lines = 0
+    with open(args.output, "w") as f:
+        for line in render(archive, devices, args.topic, start, end, keys):
+            f.write(line)
+            lines += 1
+    archive.close()
+    print(f"Wrote {lines} lines for {len(devices)} devices to {args.output}")
+
+    if args.blocks:
+        command = [
+            args.promtool,
+            "tsdb",
+            "create-blocks-from",
+            "openmetrics",
+            args.output,
+            args.blocks,
+        ]
+        print(" ".join(command))
+        subprocess.run(command, check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Мост бинарного потока и пакетов в JSON для существующего mqtt-exporter.
+
+Одиночные сэмплы из <topic>/bin и пакеты из <topic>/batch переопубликовываются
+в <topic> по одному JSON-сообщению на сэмпл. Досланные <topic>/replay сюда не идут:
+в JSON нет времени сэмпла, и старые значения перезаписали бы текущие. Их с исходным
+временем сохраняет host.archive, а в Prometheus они попадают через host.backfill.
+
+Запуск:
+    python -m host.bridge --host localhost --port 1884 --topic pico_metrics
+"""
+
+import argparse
+import asyncio
+import json
+
+from host.codec import DecodeError, decode_batch, to_json
+from host.mqtt_client import MQTTClient
+
+
+async def run_bridge(host: str, port: int, topic: str):
+    """Подписаться на бинарные топики и переопубликовать JSON в <topic>."""
+    client = MQTTClient(host, port, client_id="pico-binary-bridge")
+    await client.connect()
+    for suffix in ("bin", "batch"):
+        await client.subscribe(f"{topic}/{suffix}")
+    print(f"Bridge {topic}/{{bin,batch}} -> {topic} started")
+
+    async for message_topic, payload, _ in client.messages():
+        try:
+            if message_topic.endswith("/bin"):
+                await client.publish(topic, to_json(payload))
+                continue
+            for sample in decode_batch(payload):
+                await client.publish(topic, json.dumps(sample.metrics).encode())
+        except DecodeError as e:
+            print(f"Skipping payload from {message_topic}: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1884)
+    parser.add_argument("--topic", default="pico_metrics")
+    args = parser.parse_args()
+    asyncio.run(run_bridge(args.host, args.port, args.topic))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Минимальный asyncio-брокер MQTT 3.1.1 для нагрузочных тестов без Mosquitto.
+
+Поддерживает CONNECT (с Last Will), SUBSCRIBE с масками + и #, PUBLISH с
+QoS 0/1 в обе стороны, retained-сообщения, PINGREQ и DISCONNECT. Сессии
+не сохраняются: каждое подключение начинается с чистого состояния.
+
+Запуск:
+    python -m host.broker --port 1884
+"""
+
+import argparse
+import asyncio
+import struct
+from typing import Dict, List, Optional, Tuple
+
+from host.mqtt_client import (
+    CONNACK,
+    CONNECT,
+    DISCONNECT,
+    PINGREQ,
+    PINGRESP,
+    PUBACK,
+    PUBLISH,
+    SUBACK,
+    SUBSCRIBE,
+    _encode_string,
+    _packet,
+)
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """Соответствие топика фильтру подписки с масками + и #."""
+    filter_parts, topic_parts = topic_filter.split("/"), topic.split("/")
+    for i, part in enumerate(filter_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts) or (part != "+" and part != topic_parts[i]):
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+class Session:
+    """Одно клиентское подключение."""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.client_id = ""
+        self.subscriptions: List[str] = []
+        self.will: Optional[Tuple[str, bytes, bool]] = None
+        self.packet_id = 0
+
+    def send_publish(self, topic: str, payload: bytes, retain: bool, qos: int):
+        header = PUBLISH | (qos << 1) | (1 if retain else 0)
+        body = _encode_string(topic.encode())
+        if qos:
+            self.packet_id = self.packet_id % 65535 + 1
+            body += struct.pack("!H", self.packet_id)
+        self.writer.write(_packet(header, body + payload))
+
+
+class Broker:
+    def __init__(self):
+        self.sessions: Dict[str, Session] = {}
+        self.retained: Dict[str, bytes] = {}
+        self.messages_in = 0
+        self.messages_out = 0
+        self.bytes_in = 0
+        self.connects = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.AbstractServer:
+        """Запустить сервер; port=0 - любой свободный (см. server.sockets)."""
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def close(self, server: asyncio.AbstractServer):
+        """Остановить сервер и закрыть все клиентские подключения."""
+        server.close()
+        for session in list(self.sessions.values()):
+            session.writer.close()
+        await server.wait_closed()
+        await asyncio.sleep(0)
+
+    def route(self, topic: str, payload: bytes, retain: bool):
+        """Разослать сообщение подписчикам и запомнить retained."""
+        self.messages_in += 1
+        self.bytes_in += len(payload)
+        if retain:
+            if payload:
+                self.retained[topic] = payload
+            else:
+                self.retained.pop(topic, None)
+        for session in list(self.sessions.values()):
+            for topic_filter in session.subscriptions:
+                if topic_matches(topic_filter, topic):
+                    session.send_publish(topic, payload, False, 0)
+                    self.messages_out += 1
+                    break
+
+    async def _read_packet(self, reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+        header = (await reader.readexactly(1))[0]
+        length, multiplier = 0, 1
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        return header, (await reader.readexactly(length) if length else b"")
+
+    def _connect(self, session: Session, body: bytes):
+        (name_length,) = struct.unpack_from("!H", body, 0)
+        offset = 2 + name_length + 1
+        flags = body[offset]
+        offset += 3
+        (length,) = struct.unpack_from("!H", body, offset)
+        session.client_id = body[offset + 2 : offset + 2 + length].decode()
+        offset += 2 + length
+        if flags & 0x04:
+            (length,) = struct.unpack_from("!H", body, offset)
+            will_topic = body[offset + 2 : offset + 2 + length].decode()
+            offset += 2 + length
+            (length,) = struct.unpack_from("!H", body, offset)
+            will_payload = body[offset + 2 : offset + 2 + length]
+            session.will = (will_topic, will_payload, bool(flags & 0x20))
+
+        # Клиент с тем же id вытесняет старое подключение
+        previous = self.sessions.get(session.client_id)
+        if previous is not None:
+            previous.writer.close()
+        self.sessions[session.client_id] = session
+        self.connects += 1
+        session.writer.write(_packet(CONNACK, b"\x00\x00"))
+
+    def _subscribe(self, session: Session, body: bytes):
+        packet_id = body[:2]
+        offset, granted = 2, bytearray()
+        while offset < len(body):
+            (length,) = struct.unpack_from("!H", body, offset)
+            topic_filter = body[offset + 2 : offset + 2 + length].decode()
+            offset += 2 + length + 1
+            session.subscriptions.append(topic_filter)
+            granted.append(0)
+            for topic, payload in self.retained.items():
+                if topic_matches(topic_filter, topic):
+                    session.send_publish(topic, payload, True, 0)
+        session.writer.write(_packet(SUBACK, packet_id + bytes(granted)))
+
+    def _publish(self, session: Session, header: int, body: bytes):
+        qos = (header >> 1) & 0x03
+        (length,) = struct.unpack_from("!H", body, 0)
+        topic = body[2 : 2 + length].decode()
+        offset = 2 + length
+        if qos:
+            session.writer.write(_packet(PUBACK, body[offset : offset + 2]))
+            offset += 2
+        self.route(topic, body[offset:], bool(header & 0x01))
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = Session(writer)
+        graceful = False
+        try:
+            header, body = await self._read_packet(reader)
+            if header != CONNECT:
+                return
+            self._connect(session, body)
+            while True:
+                header, body = await self._read_packet(reader)
+                kind = header & 0xF0
+                if kind == PUBLISH:
+                    self._publish(session, header, body)
+                elif header == SUBSCRIBE:
+                    self._subscribe(session, body)
+                elif header == PINGREQ:
+                    writer.write(_packet(PINGRESP, b""))
+                elif header == DISCONNECT:
+                    graceful = True
+                    return
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+        finally:
+            if self.sessions.get(session.client_id) is session:
+                del self.sessions[session.client_id]
+                if not graceful and session.will is not None:
+                    self.route(*session.will)
+            writer.close()
+
+
+async def run_broker(host: str, port: int):
+    server = await Broker().start(host, port)
+    print(f"Broker listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1884)
+    args = parser.parse_args()
+    asyncio.run(run_broker(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
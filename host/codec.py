@@ -0,0 +1,155 @@
+"""Декодирование payload pico_metrics на хосте."""
+
+import json
+import struct
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+from payload_schema import (
+    BATCH_HEADER_FORMAT,
+    BATCH_HEADER_SIZE,
+    BATCH_MAGIC,
+    ENUM_UNKNOWN,
+    ENUMS,
+    HEADER_FORMAT,
+    HEADER_SIZE,
+    MAGIC,
+    RECORD_HEADERS,
+    SCHEMAS,
+    bitmap_size,
+)
+
+Metrics = Dict[str, Union[int, float, str]]
+
+
+class Sample(NamedTuple):
+    """Сэмпл из пакета: восстановленное unix-время, номер и метрики."""
+
+    timestamp: float
+    sequence: Optional[int]
+    metrics: Metrics
+
+
+class DecodeError(ValueError):
+    """Payload не соответствует известной схеме."""
+
+
+def is_binary(payload: bytes) -> bool:
+    """Бинарный payload начинается с magic-байта, JSON - с '{'."""
+    return len(payload) >= HEADER_SIZE and payload[0] == MAGIC
+
+
+_COMPILED: Dict[int, list] = {}
+
+
+def _compiled_fields(version: int, fields) -> list:
+    """Поля схемы с готовыми struct.Struct, собираются один раз на версию."""
+    compiled = _COMPILED.get(version)
+    if compiled is None:
+        compiled = _COMPILED[version] = [
+            (key, struct.Struct("<" + fmt), scale, ENUMS.get(key)) for key, fmt, scale in fields
+        ]
+    return compiled
+
+
+def decode_binary(payload: bytes) -> Metrics:
+    """Развернуть бинарный payload в словарь той же формы, что и JSON."""
+    if not is_binary(payload):
+        raise DecodeError("not a binary pico_metrics payload")
+
+    _, version, field_count = struct.unpack_from(HEADER_FORMAT, payload, 0)
+    known = version if version in SCHEMAS else max(SCHEMAS)
+    fields = SCHEMAS[known]
+    # Более новая схема: читаем известный нам префикс полей
+    if known != version and field_count < len(fields):
+        raise DecodeError(f"unsupported schema version {version}")
+
+    bitmap = payload[HEADER_SIZE : HEADER_SIZE + bitmap_size(field_count)]
+    offset = HEADER_SIZE + len(bitmap)
+    metrics: Metrics = {}
+
+    compiled = _compiled_fields(known, fields)
+    for index in range(min(field_count, len(compiled))):
+        if not bitmap[index >> 3] & (1 << (index & 7)):
+            continue
+        key, packer, scale, enum = compiled[index]
+        try:
+            (value,) = packer.unpack_from(payload, offset)
+        except struct.error as e:
+            raise DecodeError(f"truncated payload at field {key}") from e
+        offset += packer.size
+
+        if enum is not None:
+            metrics[key] = enum[value] if value != ENUM_UNKNOWN and value < len(enum) else "unknown"
+        elif scale != 1:
+            metrics[key] = round(value / scale, 2)
+        else:
+            metrics[key] = value
+
+    return metrics
+
+
+def decode(payload: bytes) -> Metrics:
+    """Декодировать JSON или бинарный payload."""
+    if is_binary(payload):
+        return decode_binary(payload)
+    try:
+        return json.loads(payload)
+    except ValueError as e:
+        raise DecodeError(f"invalid JSON payload: {e}") from e
+
+
+def to_json(payload: bytes) -> bytes:
+    """Перекодировать payload в JSON, который понимает mqtt-exporter."""
+    return json.dumps(decode(payload), separators=(",", ":")).encode()
+
+
+def decode_batch(payload: bytes, received_at: Optional[float] = None) -> List[Sample]:
+    """Развернуть пакет сэмплов (/batch, /replay) в список Sample.
+
+    Часы Pico без NTP не совпадают с хостовыми, поэтому время сэмпла
+    восстанавливается по его возрасту относительно времени отправки пакета.
+    """
+    if len(payload) < BATCH_HEADER_SIZE or payload[0] != BATCH_MAGIC:
+        raise DecodeError("not a pico_metrics batch")
+    if received_at is None:
+        received_at = time.time()
+
+    _, version, count, device_now = struct.unpack_from(BATCH_HEADER_FORMAT, payload, 0)
+    if version not in RECORD_HEADERS:
+        raise DecodeError(f"unsupported batch version {version}")
+    record_format, record_header_size = RECORD_HEADERS[version]
+
+    offset = BATCH_HEADER_SIZE
+    samples = []
+    for _ in range(count):
+        if offset + record_header_size > len(payload):
+            raise DecodeError("truncated batch header")
+        header = struct.unpack_from(record_format, payload, offset)
+        timestamp, length = header[0], header[-1]
+        sequence = header[1] if len(header) == 3 else None
+        offset += record_header_size
+        record = payload[offset : offset + length]
+        if len(record) != length:
+            raise DecodeError("truncated batch record")
+        offset += length
+        samples.append(
+            Sample(received_at - (device_now - timestamp), sequence, decode_binary(record))
+        )
+    return samples
+
+
+def batch_to_points(
+    payload: bytes, received_at: Optional[float] = None
+) -> List[Tuple[str, float, int]]:
+    """Пакет в точки (метрика, значение, время в мс) для экспортёра.
+
+    Строковые поля-перечисления пропускаются: у них нет числового значения.
+    """
+    points = []
+    for sample in decode_batch(payload, received_at):
+        timestamp_ms = int(sample.timestamp * 1000)
+        for key, value in sample.metrics.items():
+            if not isinstance(value, str):
+                points.append((key, float(value), timestamp_ms))
+    return points
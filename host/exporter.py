@@ -0,0 +1,366 @@
+"""Экспортёр pico_metrics из MQTT в Prometheus.
+
+Понимает все форматы прошивки: JSON (в том числе дельты), бинарный /bin,
+пакеты /batch, birth-сообщения /info и статус /status. Перечисления
+становятся state-gauge с меткой состояния, строковые поля - метками
+mqtt_device_info. Значения хранятся по устройствам в array('d') с общим
+индексом имён метрик, а текст для /metrics перестраивается только после
+изменения значений.
+
+Имена совместимы с kpetrem/mqtt-exporter (mqtt_<метрика>{topic="..."}),
+поэтому дашборд работает без правок. Устройства с собственным деревом
+топиков <topic>/<id> получают ту же метку topic и метку device=<id>.
+
+Запуск:
+    python -m host.exporter --host localhost --port 1884 --topic pico_metrics --listen 9000
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from host.codec import DecodeError, decode, decode_batch
+from host.mqtt_client import MQTTClient
+from payload_schema import ENUMS
+
+# Служебные подтопики устройства: <база>/<суффикс>
+SUFFIXES = ("bin", "batch", "replay", "info", "status", "profile")
+
+PREFIX = "mqtt_"
+NAN = float("nan")
+
+
+def split_topic(topic: str) -> Tuple[str, str]:
+    """(базовый топик устройства, суффикс или '')."""
+    # Конфигурация устройства (<база>/config/<имя>) - не метрики
+    head, separator, _ = topic.partition("/config/")
+    if separator:
+        return head, "config"
+    base, _, suffix = topic.rpartition("/")
+    if base and suffix in SUFFIXES:
+        return base, suffix
+    return topic, ""
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_value(value: float) -> str:
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def flat_object(value) -> Tuple[dict, int]:
+    """Только скалярные поля JSON-объекта и число отброшенных; не объект - DecodeError."""
+    if not isinstance(value, dict):
+        raise DecodeError("payload is not a JSON object")
+    flat = {
+        key: item
+        for key, item in value.items()
+        if item is None or isinstance(item, (str, int, float))
+    }
+    return flat, len(value) - len(flat)
+
+
+def metric_name(key: str) -> str:
+    """Имя в Prometheus: метрики профайлера уже с префиксом pico_."""
+    return key if key.startswith("pico_") else PREFIX + key
+
+
+class DeviceSeries:
+    """Последние значения одного устройства."""
+
+    __slots__ = ("base", "labels", "values", "states", "info", "online", "last_seen")
+
+    def __init__(self, base: str, labels: str, size: int):
+        self.base = base
+        self.labels = labels
+        self.values = array("d", [NAN]) * size
+        self.states: Dict[str, str] = {}
+        self.info: Dict[str, str] = {}
+        self.online: Optional[bool] = None
+        self.last_seen = 0.0
+
+
+class MetricStore:
+    """Значения всех устройств и кэш текста экспозиции."""
+
+    def __init__(self, root: Optional[str] = None):
+        # Корневой топик: у <root>/<id> метка topic=<root>, а device=<id>
+        self.root = root
+        self.index: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.devices: Dict[str, DeviceSeries] = {}
+        self.version = 0
+        self.renders = 0
+        self._rendered = b""
+        self._rendered_version = -1
+
+    def device(self, base: str) -> DeviceSeries:
+        series = self.devices.get(base)
+        if series is None:
+            series = DeviceSeries(base, self._labels(base), len(self.names))
+            self.devices[base] = series
+            self.version += 1
+        return series
+
+    def _labels(self, base: str, unique_id: Optional[str] = None) -> str:
+        """Метки устройства: id из дерева топиков или sys_unique_id из /info."""
+        topic, device = base, unique_id
+        if self.root and base.startswith(self.root + "/"):
+            topic, device = self.root, base[len(self.root) + 1 :]
+        labels = f'topic="{escape_label(topic)}"'
+        if device:
+            labels += f',device="{escape_label(device)}"'
+        return labels
+
+    def _slot(self, key: str) -> int:
+        slot = self.index.get(key)
+        if slot is None:
+            slot = self.index[key] = len(self.names)
+            self.names.append(metric_name(key))
+            for series in self.devices.values():
+                series.values.append(NAN)
+        return slot
+
+    def update(self, base: str, metrics: dict, received_at: float) -> bool:
+        """Применить сэмпл (полный или дельту); True, если что-то изменилось."""
+        series = self.device(base)
+        series.last_seen = received_at
+        changed = False
+        for key, value in metrics.items():
+            if isinstance(value, str):
+                target = series.states if key in ENUMS else series.info
+                if target.get(key) != value:
+                    target[key] = value
+                    changed = True
+                continue
+            if not isinstance(value, (int, float)):
+                continue
+            value = float(value)
+            slot = self._slot(key)
+            current = series.values[slot]
+            if current != value:
+                series.values[slot] = value
+                changed = True
+        if changed:
+            self.version += 1
+        return changed
+
+    def set_info(self, base: str, info: dict):
+        """Birth-сообщение: идентичность устройства становится меткой device."""
+        series = self.device(base)
+        series.info.update({k: str(v) for k, v in info.items()})
+        unique_id = info.get("sys_unique_id")
+        series.labels = self._labels(base, str(unique_id) if unique_id else None)
+        self.version += 1
+
+    def set_online(self, base: str, online: bool):
+        series = self.device(base)
+        if series.online != online:
+            series.online = online
+            self.version += 1
+
+    def render(self) -> bytes:
+        """Текст экспозиции; пересобирается, только если значения менялись."""
+        if self._rendered_version == self.version:
+            return self._rendered
+
+        lines = []
+        devices = list(self.devices.values())
+        for slot, name in enumerate(self.names):
+            samples = [
+                f"{name}{{{series.labels}}} {format_value(series.values[slot])}"
+                for series in devices
+                if not math.isnan(series.values[slot])
+            ]
+            if samples:
+                kind = "counter" if name.endswith("_total") else "gauge"
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(samples)
+
+        for key, states in ENUMS.items():
+            name = PREFIX + key
+            samples = []
+            for series in devices:
+                current = series.states.get(key)
+                if current is None:
+                    continue
+                for state in states:
+                    samples.append(
+                        f'{name}{{{series.labels},{key}="{state}"}} {int(state == current)}'
+                    )
+            if samples:
+                lines.append(f"# TYPE {name} gauge")
+                lines.extend(samples)
+
+        info = []
+        for series in devices:
+            if series.info:
+                extra = "".join(
+                    f',{key}="{escape_label(value)}"' for key, value in sorted(series.info.items())
+                )
+                info.append(f"{PREFIX}device_info{{{series.labels}{extra}}} 1")
+        if info:
+            lines.append(f"# TYPE {PREFIX}device_info gauge")
+            lines.extend(info)
+
+        online = [
+            f"{PREFIX}device_online{{{series.labels}}} {int(series.online)}"
+            for series in devices
+            if series.online is not None
+        ]
+        if online:
+            lines.append(f"# TYPE {PREFIX}device_online gauge")
+            lines.extend(online)
+
+        self._rendered = ("\n".join(lines) + "\n").encode()
+        self._rendered_version = self.version
+        self.renders += 1
+        return self._rendered
+
+    def render_last_seen(self) -> str:
+        """Время последнего сообщения меняется каждый раз, поэтому не кэшируется."""
+        name = PREFIX + "last_seen_timestamp_seconds"
+        lines = [f"# TYPE {name} gauge"]
+        for series in self.devices.values():
+            lines.append(f"{name}{{{series.labels}}} {series.last_seen:.3f}")
+        return "\n".join(lines) + "\n"
+
+
+class Exporter:
+    """Разбор входящих сообщений и отдача /metrics."""
+
+    def __init__(self, store: Optional[MetricStore] = None, root: Optional[str] = None):
+        self.store = store or MetricStore(root)
+        self.messages_total = 0
+        self.decode_errors_total = 0
+        self.replayed_samples_total = 0
+
+    def handle(self, topic: str, payload: bytes, received_at: Optional[float] = None):
+        """Обработать одно MQTT-сообщение."""
+        if received_at is None:
+            received_at = time.time()
+        self.messages_total += 1
+        base, suffix = split_topic(topic)
+        store = self.store
+        dropped = 0
+        try:
+            if suffix in ("", "bin"):
+                metrics, dropped = flat_object(decode(payload))
+                store.update(base, metrics, received_at)
+            elif suffix == "batch":
+                for sample in decode_batch(payload, received_at):
+                    metrics, count = flat_object(sample.metrics)
+                    store.update(base, metrics, received_at)
+                    dropped += count
+            elif suffix == "replay":
+                # Досланные сэмплы старше текущих значений: gauge не трогаем,
+                # пропуски на графиках заполняют host.archive и host.backfill
+                self.replayed_samples_total += len(decode_batch(payload, received_at))
+            elif suffix == "info":
+                info, dropped = flat_object(json.loads(payload))
+                store.set_info(base, info)
+            elif suffix == "status":
+                store.set_online(base, payload == b"online")
+            elif suffix == "profile":
+                metrics, dropped = flat_object(json.loads(payload))
+                store.update(base, metrics, received_at)
+        except (DecodeError, ValueError) as e:
+            self.decode_errors_total += 1
+            print(f"Skipping payload from {topic}: {e}")
+            return
+        if dropped:
+            # Вложенные объекты и списки не ложатся в gauge и метки
+            self.decode_errors_total += 1
+            print(f"Dropped {dropped} non-scalar values from {topic}")
+
+    def metrics_body(self) -> bytes:
+        """Кэшированный текст устройств плюс собственные счётчики экспортёра."""
+        body = self.store.render()
+        tail = self.store.render_last_seen() + (
+            "# TYPE pico_exporter_messages_total counter\n"
+            f"pico_exporter_messages_total {self.messages_total}\n"
+            "# TYPE pico_exporter_decode_errors_total counter\n"
+            f"pico_exporter_decode_errors_total {self.decode_errors_total}\n"
+            "# TYPE pico_exporter_replayed_samples_total counter\n"
+            f"pico_exporter_replayed_samples_total {self.replayed_samples_total}\n"
+            "# TYPE pico_exporter_renders_total counter\n"
+            f"pico_exporter_renders_total {self.store.renders}\n"
+            "# TYPE pico_exporter_devices gauge\n"
+            f"pico_exporter_devices {len(self.store.devices)}\n"
+        )
+        return body + tail.encode()
+
+    async def _http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request.split()
+            if len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?")[0] == b"/metrics":
+                body = self.metrics_body()
+                status = b"200 OK"
+                content_type = b"text/plain; version=0.0.4; charset=utf-8"
+            else:
+                body, status, content_type = b"Not Found\n", b"404 Not Found", b"text/plain"
+            header = b"HTTP/1.1 %s\r\nContent-Type: %s\r\nContent-Length: %d\r\n" % (
+                status,
+                content_type,
+                len(body),
+            )
+            writer.write(header + b"Connection: close\r\n\r\n" + body)
+            await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_http(self, host: str, port: int) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self._http, host, port)
+
+    async def consume(self, host: str, port: int, topic: str, client_id: str = "pico-exporter"):
+        """Подписка на <topic> и <topic>/# с переподключением при обрыве."""
+        while True:
+            client = MQTTClient(host, port, client_id=client_id)
+            try:
+                await client.connect()
+                await client.subscribe(topic)
+                await client.subscribe(topic + "/#")
+                print(f"Subscribed to {topic} and {topic}/#")
+                async for message_topic, payload, _ in client.messages():
+                    self.handle(message_topic, payload)
+                print("MQTT connection lost")
+            except (ConnectionError, OSError) as e:
+                print(f"MQTT error: {e}")
+            await client.disconnect()
+            await asyncio.sleep(5)
+
+
+async def run_exporter(host: str, port: int, topic: str, listen_host: str, listen_port: int):
+    exporter = Exporter(root=topic)
+    server = await exporter.serve_http(listen_host, listen_port)
+    print(f"Serving /metrics on {listen_host}:{listen_port}")
+    async with server:
+        await exporter.consume(host, port, topic)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1884)
+    parser.add_argument("--topic", default="pico_metrics")
+    parser.add_argument("--listen-host", default="0.0.0.0")
+    parser.add_argument("--listen", type=int, default=9000)
+    args = parser.parse_args()
+    asyncio.run(run_exporter(args.host, args.port, args.topic, args.listen_host, args.listen))
+
+
+if __name__ == "__main__":
+    main()
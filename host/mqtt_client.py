@@ -0,0 +1,183 @@
+"""Минимальный asyncio-клиент MQTT 3.1.1 для хостовых сервисов.
+
+Поддерживает ровно то, что нужно сервисам проекта: CONNECT, SUBSCRIBE,
+PUBLISH с QoS 0/1 в обе стороны и keepalive. Внешних зависимостей нет.
+"""
+
+import asyncio
+import struct
+from typing import AsyncIterator, Optional, Tuple
+
+CONNECT = 0x10
+CONNACK = 0x20
+PUBLISH = 0x30
+PUBACK = 0x40
+SUBSCRIBE = 0x82
+SUBACK = 0x90
+PINGREQ = 0xC0
+PINGRESP = 0xD0
+DISCONNECT = 0xE0
+
+Message = Tuple[str, bytes, bool]
+
+
+class MQTTError(ConnectionError):
+    """Ошибка протокола или отказ брокера."""
+
+
+def _encode_length(length: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        out.append(byte)
+        if not length:
+            return bytes(out)
+
+
+def _encode_string(value: bytes) -> bytes:
+    return struct.pack("!H", len(value)) + value
+
+
+def _packet(header: int, body: bytes) -> bytes:
+    return bytes([header]) + _encode_length(len(body)) + body
+
+
+class MQTTClient:
+    def __init__(self, host: str, port: int = 1883, client_id: str = "", keepalive: int = 60):
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.keepalive = keepalive
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._packet_id = 0
+        self._messages: "asyncio.Queue[Message]" = asyncio.Queue()
+        self._tasks = []
+        self._will: Optional[Tuple[str, bytes, bool]] = None
+
+    def set_last_will(self, topic: str, payload: bytes, retain: bool = False):
+        """Last Will, как в umqtt: брокер опубликует его при обрыве соединения."""
+        self._will = (topic, payload, retain)
+
+    async def connect(self, clean_session: bool = True):
+        """Установить соединение и дождаться CONNACK."""
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+        flags = 0x02 if clean_session else 0x00
+        will = b""
+        if self._will is not None:
+            topic, payload, retain = self._will
+            flags |= 0x04 | (0x20 if retain else 0)
+            will = _encode_string(topic.encode()) + _encode_string(payload)
+        body = (
+            _encode_string(b"MQTT")
+            + bytes([4, flags])
+            + struct.pack("!H", self.keepalive)
+            + _encode_string(self.client_id.encode())
+            + will
+        )
+        self._writer.write(_packet(CONNECT, body))
+        await self._writer.drain()
+
+        header, payload = await self._read_packet()
+        if header != CONNACK or len(payload) < 2 or payload[1] != 0:
+            raise MQTTError(f"connection refused: {payload!r}")
+
+        self._tasks.append(asyncio.ensure_future(self._read_loop()))
+        if self.keepalive:
+            self._tasks.append(asyncio.ensure_future(self._ping_loop()))
+
+    async def subscribe(self, topic: str, qos: int = 0):
+        """Подписаться на фильтр топиков (SUBACK не ожидается явно)."""
+        body = struct.pack("!H", self._next_packet_id()) + _encode_string(topic.encode())
+        self._writer.write(_packet(SUBSCRIBE, body + bytes([qos])))
+        await self._writer.drain()
+
+    async def publish(self, topic: str, payload: bytes, retain: bool = False, qos: int = 0):
+        """Опубликовать сообщение (для QoS 1 PUBACK обрабатывается в фоне)."""
+        header = PUBLISH | (qos << 1) | (1 if retain else 0)
+        body = _encode_string(topic.encode())
+        if qos:
+            body += struct.pack("!H", self._next_packet_id())
+        self._writer.write(_packet(header, body + payload))
+        await self._writer.drain()
+
+    async def messages(self) -> AsyncIterator[Message]:
+        """Поток входящих сообщений (topic, payload, retain)."""
+        while True:
+            message = await self._messages.get()
+            if message is None:
+                return
+            yield message
+
+    async def disconnect(self):
+        """Штатно закрыть соединение."""
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        if self._writer is not None:
+            try:
+                self._writer.write(_packet(DISCONNECT, b""))
+                await self._writer.drain()
+                self._writer.close()
+            except (ConnectionError, OSError):
+                pass
+            self._writer = None
+        self._messages.put_nowait(None)
+
+    def abort(self):
+        """Оборвать соединение без DISCONNECT, как при потере сети."""
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        if self._writer is not None:
+            self._writer.transport.abort()
+            self._writer = None
+        self._messages.put_nowait(None)
+
+    def _next_packet_id(self) -> int:
+        self._packet_id = self._packet_id % 65535 + 1
+        return self._packet_id
+
+    async def _read_packet(self) -> Tuple[int, bytes]:
+        header = (await self._reader.readexactly(1))[0]
+        length, multiplier = 0, 1
+        while True:
+            byte = (await self._reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        payload = await self._reader.readexactly(length) if length else b""
+        return header, payload
+
+    async def _read_loop(self):
+        try:
+            while True:
+                header, payload = await self._read_packet()
+                if header & 0xF0 == PUBLISH:
+                    self._handle_publish(header, payload)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+        finally:
+            self._messages.put_nowait(None)
+
+    def _handle_publish(self, header: int, payload: bytes):
+        qos = (header >> 1) & 0x03
+        (topic_length,) = struct.unpack_from("!H", payload, 0)
+        topic = payload[2 : 2 + topic_length].decode()
+        offset = 2 + topic_length
+        if qos:
+            packet_id = payload[offset : offset + 2]
+            offset += 2
+            self._writer.write(_packet(PUBACK, packet_id))
+        self._messages.put_nowait((topic, payload[offset:], bool(header & 0x01)))
+
+    async def _ping_loop(self):
+        while True:
+            await asyncio.sleep(self.keepalive / 2)
+            self._writer.write(_packet(PINGREQ, b""))
+            await self._writer.drain()
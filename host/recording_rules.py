@@ -0,0 +1,211 @@
+"""Правила записи Prometheus для дашборда в нескольких разрешениях.
+
+Каждая агрегация дашборда (среднее, максимум и p95 температуры, доля успешных
+публикаций, переподключения WiFi, частота GC...) записывается на трёх уровнях:
+окно и интервал вычисления 1m, 10m и 1h. Дашборд выбирает уровень по ширине
+диапазона времени (переменная $tier), поэтому 30 дней - это 720 точек на серию
+вместо 170 тысяч сырых сэмплов.
+
+Файл правил генерируется из таблиц ниже; проверка сверяет его и дашборд
+со схемой payload:
+    python -m host.recording_rules            # записать prometheus/rules/pico.yml
+    python -m host.recording_rules --check    # проверить правила и дашборд
+"""
+
+import argparse
+import json
+import re
+import sys
+from typing import List, Optional, Tuple
+
+from payload_schema import ENUMS, FIELDS, SCHEMA_VERSION
+
+RULES_PATH = "prometheus/rules/pico.yml"
+DASHBOARD_PATH = "dashboard/PICO W COMPLETE MONITOR.json"
+
+PREFIX = "mqtt_"
+
+# (уровень, наибольший диапазон дашборда для него в секундах)
+TIERS = (
+    ("1m", 6 * 3600),
+    ("10m", 2 * 86400),
+    ("1h", None),
+)
+
+OPERATIONS = {
+    "avg": "avg_over_time({series}[{window}])",
+    "min": "min_over_time({series}[{window}])",
+    "max": "max_over_time({series}[{window}])",
+    "p95": "quantile_over_time(0.95, {series}[{window}])",
+    "increase": "increase({series}[{window}])",
+    "rate": "rate({series}[{window}])",
+}
+COUNTER_OPERATIONS = ("increase", "rate")
+
+# (поле схемы, операции)
+AGGREGATIONS = (
+    ("temperature_celsius", ("avg", "max", "p95")),
+    ("memory_free_bytes", ("min",)),
+    ("memory_allocated_bytes", ("avg", "max")),
+    ("memory_fragmentation", ("avg",)),
+    ("wifi_rssi_dbm", ("avg", "min")),
+    ("mqtt_publish_success_total", ("increase",)),
+    ("mqtt_publish_failed_total", ("increase",)),
+    ("wifi_reconnect_count", ("increase",)),
+    ("gc_collections_total", ("rate",)),
+)
+
+# Отношения приращений счётчиков: (имя, числитель, знаменатель)
+RATIOS = (("mqtt_publish_success", "mqtt_publish_success_total", "mqtt_publish_total"),)
+
+# Счётчики схемы без суффикса _total
+COUNTERS = ("wifi_reconnect_count",)
+
+# Серии, которые экспортёр добавляет сам
+EXPORTER_SERIES = ("device_info", "device_online")
+
+HEADER = "# Сгенерировано: python -m host.recording_rules. Не редактировать вручную.\n"
+
+
+def is_counter(field: str) -> bool:
+    return field.endswith("_total") or field in COUNTERS
+
+
+def duration_seconds(duration: str) -> int:
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    return int(duration[:-1]) * units[duration[-1]]
+
+
+def select_tier(range_seconds: float) -> str:
+    """Уровень, который дашборд выбирает для диапазона такой ширины."""
+    for tier, limit in TIERS:
+        if limit is None or range_seconds <= limit:
+            return tier
+    return TIERS[-1][0]
+
+
+def record_name(name: str, operation: str, tier: str) -> str:
+    return f"device:{PREFIX}{name}:{operation}_{tier}"
+
+
+def tier_rules(tier: str) -> List[Tuple[str, str]]:
+    """(record, expr) одного уровня."""
+    rules = []
+    for field, operations in AGGREGATIONS:
+        for operation in operations:
+            expr = OPERATIONS[operation].format(series=PREFIX + field, window=tier)
+            rules.append((record_name(field, operation, tier), expr))
+    for name, numerator, denominator in RATIOS:
+        expr = (
+            f"{OPERATIONS['increase'].format(series=PREFIX + numerator, window=tier)}"
+            f" / {OPERATIONS['increase'].format(series=PREFIX + denominator, window=tier)}"
+        )
+        rules.append((record_name(name, "ratio", tier), expr))
+    return rules
+
+
+def render() -> str:
+    lines = [HEADER.rstrip("\n"), "groups:"]
+    for tier, _ in TIERS:
+        lines.append(f"  - name: pico_{tier}")
+        lines.append(f"    interval: {tier}")
+        lines.append("    rules:")
+        for record, expr in tier_rules(tier):
+            lines.append(f"      - record: {record}")
+            lines.append(f"        expr: {expr}")
+    return "\n".join(lines) + "\n"
+
+
+def tier_query() -> str:
+    """Запрос переменной $tier: ровно одна ветка совпадает с шириной диапазона."""
+    branches = []
+    low = None
+    for tier, limit in TIERS:
+        condition = "vector($__range_s)"
+        if low is not None:
+            condition += f" > {low}"
+        if limit is not None:
+            condition += f" <= {limit}"
+        branches.append(f'label_replace({condition}, "tier", "{tier}", "", "")')
+        low = limit
+    return f"query_result({' or '.join(branches)})"
+
+
+def check_series(expr: str, where: str) -> List[str]:
+    """Сырые серии выражения должны быть полями схемы, счётчики - только под rate/increase."""
+    known = {field for field, _, _ in FIELDS} | set(ENUMS) | set(EXPORTER_SERIES)
+    errors = []
+    for match in re.finditer(r"(\w+)\(\s*(?:[\d.]+,\s*)?(mqtt_\w+)|(?<![\w:])(mqtt_\w+)", expr):
+        function, series = match.group(1), match.group(2) or match.group(3)
+        field = series[len(PREFIX) :]
+        if field not in known:
+            errors.append(f"{where}: {series} is not in payload schema")
+            continue
+        if function is None or not function.endswith(("_over_time", "rate", "increase")):
+            continue
+        if (function in COUNTER_OPERATIONS) != is_counter(field):
+            kind = "counter" if is_counter(field) else "gauge"
+            errors.append(f"{where}: {function}() over {kind} {series}")
+    return errors
+
+
+def check_rules(text: str) -> Tuple[List[str], set]:
+    errors = []
+    records = set(re.findall(r"record:\s*(\S+)", text))
+    for number, expr in enumerate(re.findall(r"expr:\s*(.+)", text), 1):
+        errors.extend(check_series(expr, f"rule {number}"))
+    if text != render():
+        errors.append(f"{RULES_PATH} is stale, regenerate with python -m host.recording_rules")
+    return errors, records
+
+
+def check_dashboard(dashboard: dict, records: set) -> List[str]:
+    errors = []
+    variables = {item["name"]: item for item in dashboard.get("templating", {}).get("list", [])}
+    tier = variables.get("tier")
+    if tier is None or tier.get("definition") != tier_query():
+        errors.append("dashboard: $tier variable does not match host.recording_rules.tier_query()")
+    for panel in dashboard.get("panels", []):
+        for target in panel.get("targets", []):
+            expr = target.get("expr", "")
+            where = f"panel {panel.get('title')!r}"
+            errors.extend(check_series(expr, where))
+            for template in re.findall(r"device:\w+:\w+\$tier", expr):
+                for name, _ in TIERS:
+                    record = template.replace("$tier", name)
+                    if record not in records:
+                        errors.append(f"{where}: {record} is not recorded")
+    return errors
+
+
+def check(rules_path: str, dashboard_path: str) -> List[str]:
+    with open(rules_path, encoding="utf-8") as f:
+        errors, records = check_rules(f.read())
+    with open(dashboard_path, encoding="utf-8") as f:
+        errors.extend(check_dashboard(json.load(f), records))
+    return errors
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--check", action="store_true", help="проверить вместо генерации")
+    parser.add_argument("--rules", default=RULES_PATH)
+    parser.add_argument("--dashboard", default=DASHBOARD_PATH)
+    args = parser.parse_args(argv)
+
+    if not args.check:
+        with open(args.rules, "w", encoding="utf-8") as f:
+            f.write(render())
+        print(f"Wrote {args.rules}")
+        return
+
+    errors = check(args.rules, args.dashboard)
+    for error in errors:
+        print(error)
+    if errors:
+        sys.exit(1)
+    print(f"OK: {args.rules} and dashboard match payload schema v{SCHEMA_VERSION}")
+
+
+if __name__ == "__main__":
+    main()
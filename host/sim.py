@@ -0,0 +1,1206 @@
+"""Симуляция Pico W под CPython: подставные модули прошивки и виртуальное время.
+
+Подменяются machine, network, ubinascii, uos, ujson, umqtt.simple, uasyncio,
+а на время прогона ещё time и gc. Время виртуальное: time.sleep() только двигает часы,
+поэтому час работы устройства прогоняется за секунды. Брокер MQTT - объект
+в том же процессе. PicoMonitor из main.py запускается без изменений.
+
+    from host.sim import Simulation
+    result = Simulation(duration=3600, wifi_outages=[(600, 660)]).run()
+"""
+
+import binascii
+import contextlib
+import gc as real_gc
+import importlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time as real_time
+import tracemalloc
+import types
+from collections import namedtuple
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TICKS_PERIOD = 1 << 30
+TICKS_MAX = TICKS_PERIOD - 1
+
+Interval = Tuple[float, float]
+
+
+class SimulationEnd(BaseException):
+    """Виртуальное время сценария истекло (не перехватывается `except Exception`)."""
+
+
+# machine.reset_cause(); на rp2 machine.reset() тоже даёт WDT_RESET
+PWRON_RESET = 1
+WDT_RESET = 3
+
+# Предел machine.WDT на RP2040, мс
+WDT_MAX_TIMEOUT = 8388
+
+
+class MachineReset(BaseException):
+    """Перезагрузка устройства: machine.reset(), сторожевой таймер или сброс питания."""
+
+    def __init__(self, cause: int = WDT_RESET):
+        super().__init__(cause)
+        self.cause = cause
+
+
+def _in_intervals(now: float, intervals: Sequence[Interval]) -> bool:
+    return any(start <= now < end for start, end in intervals)
+
+
+class VirtualClock:
+    """Виртуальные часы; таймеры и слушатели срабатывают при продвижении времени."""
+
+    def __init__(self, duration: float):
+        self.now = 0.0
+        self.duration = duration
+        self.timers: List["Timer"] = []
+        self.listeners: List[Callable[[float], None]] = []
+        self.busy_seconds = 0.0
+        self.sleep_seconds = 0.0
+
+    def advance(self, seconds: float, sleeping: bool = True):
+        target = self.now + max(0.0, seconds)
+        while True:
+            timer = min(self.timers, key=lambda t: t.next_fire, default=None)
+            if timer is None or timer.next_fire > target:
+                break
+            self.now = timer.next_fire
+            timer.fire()
+        self.now = target
+        if sleeping:
+            self.sleep_seconds += seconds
+        for listener in self.listeners:
+            listener(self.now)
+        if self.now >= self.duration:
+            raise SimulationEnd()
+
+
+class HeapModel:
+    """Куча Pico: фиксированный объём, занятость - база плюс живые объекты прошивки.
+
+    Временные объекты CPython освобождает сразу, поэтому прирост трассируемой
+    памяти с начала прогона - это удерживаемые данные; gc.collect() их не
+    освобождает, и утечка видна в mem_alloc() так же, как на устройстве.
+
+    Память, выделенная "вне устройства" (брокер, провод, разбор пакетов подставным
+    сокетом), в кучу и пики аллокаций прошивки не засчитывается.
+    """
+
+    def __init__(self, total: int = 192_000, base: int = 40_000):
+        self.total = total
+        self.base = base
+        self.collections = 0
+        self._traced_at_start = None
+        self.off_device_bytes = 0
+        self.device_peak = 0
+        self._off_device_depth = 0
+
+    def _traced(self) -> int:
+        if not tracemalloc.is_tracing():
+            return 0
+        return tracemalloc.get_traced_memory()[0] - self.off_device_bytes
+
+    @contextlib.contextmanager
+    def off_device(self):
+        """Аллокации внутри блока не относятся к куче устройства."""
+        self._off_device_depth += 1
+        if self._off_device_depth > 1 or not tracemalloc.is_tracing():
+            try:
+                yield
+            finally:
+                self._off_device_depth -= 1
+            return
+
+        current, peak = tracemalloc.get_traced_memory()
+        self.device_peak = max(self.device_peak, peak - self.off_device_bytes)
+        try:
+            yield
+        finally:
+            self._off_device_depth -= 1
+            self.off_device_bytes += tracemalloc.get_traced_memory()[0] - current
+            tracemalloc.reset_peak()
+
+    def reset_peak(self):
+        tracemalloc.reset_peak()
+        self.device_peak = 0
+
+    def peak(self) -> int:
+        """Пик занятости кучи устройства с последнего reset_peak()."""
+        traced_peak = tracemalloc.get_traced_memory()[1] - self.off_device_bytes
+        return max(self.device_peak, traced_peak)
+
+    def mem_alloc(self) -> int:
+        traced = self._traced()
+        if self._traced_at_start is None:
+            self._traced_at_start = traced
+        grown = max(0, traced - self._traced_at_start)
+        return min(self.total, self.base + grown)
+
+    def mem_free(self) -> int:
+        return self.total - self.mem_alloc()
+
+    def collect(self):
+        self.collections += 1
+
+
+class NetworkModel:
+    """Точка доступа: сценарий обрывов, время подключения и RSSI.
+
+    Подключение складывается из сканирования (пропускается, если задан bssid),
+    ассоциации и DHCP (пропускается при статическом адресе).
+    """
+
+    BSSID = b"\x50\xff\x20\x3a\x10\x01"
+    CHANNEL = 6
+
+    def __init__(
+        self,
+        outages: Sequence[Interval] = (),
+        scan_delay: float = 1.5,
+        join_delay: float = 0.8,
+        dhcp_delay: float = 0.7,
+        rssi: Optional[Callable[[float], int]] = None,
+        seed: int = 0,
+    ):
+        self.outages = list(outages)
+        self.scan_delay = scan_delay
+        self.join_delay = join_delay
+        self.dhcp_delay = dhcp_delay
+        self.connect_delay = 0.0
+        self.ssid = ""
+        self.static_ip = None
+        self.scans = 0
+        self.rng = random.Random(seed)
+        self.rssi_fn = rssi or (lambda now: -60 + self.rng.randint(-3, 3))
+        self.active = False
+        self.connected = False
+        self.connecting_since: Optional[float] = None
+        self.target: Optional[bytes] = None
+        self.joins = 0
+
+    def available(self, now: float) -> bool:
+        return not _in_intervals(now, self.outages)
+
+    def on_advance(self, now: float):
+        if self.connected and not self.available(now):
+            self.connected = False
+
+
+class Broker:
+    """MQTT-брокер в процессе: retained, LWT, подписки и учёт трафика."""
+
+    Message = namedtuple("Message", "time topic payload retain")
+
+    def __init__(self, env: "SimEnvironment", outages: Sequence[Interval] = ()):
+        self.env = env
+        self.outages = list(outages)
+        self.messages: List[Broker.Message] = []
+        self.retained: Dict[str, bytes] = {}
+        self.subscribers: List[Tuple[str, Callable[["Broker.Message"], None]]] = []
+        self.clients: List["MQTTClient"] = []
+        self.connects = 0
+        self.sessions = set()
+        # PUBLISH, пропавшие в полуоткрытых соединениях
+        self.dropped = 0
+
+    def reachable(self, now: float) -> bool:
+        return self.env.network.connected and not _in_intervals(now, self.outages)
+
+    def subscribe(self, topic_filter: str, callback: Callable[["Broker.Message"], None]):
+        self.subscribers.append((topic_filter, callback))
+
+    def connect(self, client: "MQTTClient", clean_session: bool = True) -> bool:
+        """Подключение клиента; True - для него сохранена сессия (clean_session=False)."""
+        if not self.reachable(self.env.clock.now):
+            raise OSError(113, "EHOSTUNREACH")
+        self.connects += 1
+        session_present = not clean_session and client.client_id in self.sessions
+        if clean_session:
+            self.sessions.discard(client.client_id)
+        else:
+            self.sessions.add(client.client_id)
+        self.clients = [c for c in self.clients if c.client_id != client.client_id]
+        self.clients.append(client)
+        return session_present
+
+    def drop(self, client: "MQTTClient", graceful: bool):
+        if client in self.clients:
+            self.clients.remove(client)
+            if not graceful and client.will is not None:
+                self.deliver(*client.will)
+
+    def deliver(self, topic: bytes, payload, retain: bool = False):
+        # umqtt принимает и str, и bytes
+        if isinstance(topic, bytes):
+            topic = topic.decode()
+        if isinstance(payload, str):
+            payload = payload.encode()
+        message = Broker.Message(self.env.clock.now, topic, bytes(payload), retain)
+        self.messages.append(message)
+        if retain:
+            self.retained[message.topic] = message.payload
+        for topic_filter, callback in self.subscribers:
+            if _topic_matches(topic_filter, message.topic):
+                callback(message)
+        if self.reachable(self.env.clock.now):
+            for client in self.clients:
+                if client.sock_alive and any(_topic_matches(f, topic) for f in client.topics):
+                    client.receive(message.topic, message.payload)
+
+    def on_advance(self, now: float):
+        if not self.reachable(now):
+            for client in list(self.clients):
+                client.sock_alive = False
+                self.drop(client, graceful=False)
+
+
+def _topic_matches(topic_filter: str, topic: str) -> bool:
+    filter_parts, topic_parts = topic_filter.split("/"), topic.split("/")
+    for i, part in enumerate(filter_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts) or (part != "+" and part != topic_parts[i]):
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+class SimEnvironment:
+    """Общее состояние подставных модулей одного прогона."""
+
+    def __init__(
+        self,
+        duration: float,
+        wifi_outages: Sequence[Interval] = (),
+        broker_outages: Sequence[Interval] = (),
+        adc: Optional[Dict[int, Callable[[float], int]]] = None,
+        seed: int = 0,
+        resets: Sequence[float] = (),
+    ):
+        self.clock = VirtualClock(duration)
+        self.heap = HeapModel()
+        self.network = NetworkModel(wifi_outages, seed=seed)
+        self.broker = Broker(self, broker_outages)
+        self.rng = random.Random(seed)
+        self.adc = {4: self._temperature_raw, 29: lambda now: int(5.0 / 3 / 3.3 * 65535)}
+        if adc:
+            self.adc.update(adc)
+        self.clock.listeners.append(self.network.on_advance)
+        self.clock.listeners.append(self.broker.on_advance)
+
+        # Сбросы питания по сценарию и сторожевой таймер прошивки
+        self.resets = sorted(resets)
+        self.watchdog: Optional["WDT"] = None
+        self.boots = 1
+        self.boot_at = 0.0
+        self.reset_cause = PWRON_RESET
+        self.clock.listeners.append(self.on_advance)
+
+    def on_advance(self, now: float):
+        if self.resets and now >= self.resets[0]:
+            self.resets.pop(0)
+            raise MachineReset(PWRON_RESET)
+        if self.watchdog is not None and now > self.watchdog.deadline:
+            raise MachineReset(WDT_RESET)
+
+    def reboot(self, cause: int):
+        """Новая загрузка: RAM, таймеры, WLAN и соединение с брокером пропадают, flash цел."""
+        self.boots += 1
+        self.boot_at = self.clock.now
+        self.reset_cause = cause
+        self.watchdog = None
+        self.clock.timers.clear()
+        # Занятость кучи отсчитывается заново от загруженных модулей
+        self.heap._traced_at_start = None
+        self.network.active = False
+        self.network.connected = False
+        self.network.connecting_since = None
+        for client in list(self.broker.clients):
+            client.sock_alive = False
+            self.broker.drop(client, graceful=False)
+
+    def _temperature_raw(self, now: float) -> int:
+        celsius = 27.0 + 2.0 * ((now / 600.0) % 1.0) + self.rng.gauss(0, 0.5)
+        volts = 0.706 - (celsius - 27) * 0.001721
+        return max(0, min(65535, int(volts / 3.3 * 65535)))
+
+
+# --- подставные модули -----------------------------------------------------
+
+
+def _make_time(env: SimEnvironment) -> types.ModuleType:
+    module = types.ModuleType("time")
+    clock = env.clock
+
+    # Счётчики тиков, как на устройстве, идут с последней загрузки
+    def ticks_ms():
+        return int((clock.now - env.boot_at) * 1000) & TICKS_MAX
+
+    def ticks_us():
+        return int((clock.now - env.boot_at) * 1_000_000) & TICKS_MAX
+
+    def ticks_diff(end, start):
+        return ((end - start + TICKS_PERIOD // 2) & TICKS_MAX) - TICKS_PERIOD // 2
+
+    module.time = lambda: int(clock.now)
+    module.sleep = lambda seconds: clock.advance(seconds)
+    module.sleep_ms = lambda ms: clock.advance(ms / 1000)
+    module.sleep_us = lambda us: clock.advance(us / 1_000_000)
+    module.ticks_ms = ticks_ms
+    module.ticks_us = ticks_us
+    module.ticks_diff = ticks_diff
+    module.ticks_add = lambda ticks, delta: (ticks + delta) & TICKS_MAX
+    module.localtime = real_time.gmtime
+    return module
+
+
+def _make_gc(env: SimEnvironment) -> types.ModuleType:
+    module = types.ModuleType("gc")
+    module.mem_alloc = env.heap.mem_alloc
+    module.mem_free = env.heap.mem_free
+    module.collect = env.heap.collect
+    module.enable = module.disable = lambda: None
+    module.threshold = lambda *args: -1
+    return module
+
+
+class Timer:
+    PERIODIC = 1
+    ONE_SHOT = 0
+
+    def __init__(self, id=-1, mode=PERIODIC, freq=None, period=None, callback=None):
+        self.env = _active_env()
+        self.period = 1.0 / freq if freq else (period or 1000) / 1000
+        self.mode = mode
+        self.callback = callback
+        self.next_fire = self.env.clock.now + self.period
+        self.env.clock.timers.append(self)
+
+    def fire(self):
+        if self.mode == Timer.PERIODIC:
+            self.next_fire += self.period
+        else:
+            self.deinit()
+        if self.callback is not None:
+            self.callback(self)
+
+    def deinit(self):
+        if self in self.env.clock.timers:
+            self.env.clock.timers.remove(self)
+
+
+class WDT:
+    """Сторожевой таймер: без feed() дольше timeout мс - MachineReset(WDT_RESET)."""
+
+    def __init__(self, id=0, timeout=5000):
+        if timeout > WDT_MAX_TIMEOUT:
+            raise ValueError("timeout too long")
+        self.env = _active_env()
+        self.timeout = timeout / 1000
+        self.feed()
+        self.env.watchdog = self
+
+    def feed(self):
+        self.deadline = self.env.clock.now + self.timeout
+
+
+def _make_machine(env: SimEnvironment) -> types.ModuleType:
+    module = types.ModuleType("machine")
+
+    class ADC:
+        def __init__(self, channel):
+            self.channel = channel
+
+        def read_u16(self):
+            return env.adc[self.channel](env.clock.now)
+
+    def reset():
+        raise MachineReset(WDT_RESET)
+
+    module.ADC = ADC
+    module.Timer = Timer
+    module.WDT = WDT
+    module.PWRON_RESET = PWRON_RESET
+    module.WDT_RESET = WDT_RESET
+    module.reset = reset
+    module.reset_cause = lambda: env.reset_cause
+    module.freq = lambda *args: 125_000_000
+    module.unique_id = lambda: b"\xe6\x61\x41\x04\x03\x2a\x5b\x2c"
+    module.disable_irq = lambda: 0
+    module.enable_irq = lambda state: None
+    module.lightsleep = lambda ms=0: env.clock.advance(ms / 1000)
+    module.idle = lambda: None
+    return module
+
+
+def _make_network(env: SimEnvironment) -> types.ModuleType:
+    module = types.ModuleType("network")
+    model = env.network
+    module.STA_IF = 0
+    module.STAT_IDLE = 0
+    module.STAT_CONNECTING = 1
+    module.STAT_CONNECT_FAIL = -1
+    module.STAT_NO_AP_FOUND = -2
+    module.STAT_WRONG_PASSWORD = -3
+    module.STAT_GOT_IP = 3
+
+    class WLAN:
+        PM_NONE = 0x10
+        PM_PERFORMANCE = 0xA11142
+        PM_POWERSAVE = 0x111022
+
+        def __init__(self, interface=0):
+            self.interface = interface
+
+        def active(self, flag=None):
+            if flag is None:
+                return model.active
+            model.active = bool(flag)
+            return None
+
+        def connect(self, ssid=None, password=None, bssid=None, channel=0):
+            model.connected = False
+            model.connecting_since = env.clock.now
+            model.ssid = ssid
+            model.target = bssid
+            model.connect_delay = model.join_delay
+            if bssid is None:
+                model.connect_delay += model.scan_delay
+            if model.static_ip is None:
+                model.connect_delay += model.dhcp_delay
+
+        def disconnect(self):
+            model.connected = False
+            model.connecting_since = None
+
+        def status(self, param=None):
+            now = env.clock.now
+            if param == "rssi":
+                return model.rssi_fn(now)
+            if model.connected:
+                return 3
+            if model.connecting_since is None:
+                return 0
+            if now - model.connecting_since < model.connect_delay:
+                return 1
+            if not model.available(now) or model.target not in (None, model.BSSID):
+                model.connecting_since = None
+                return -2
+            model.connected = True
+            model.connecting_since = None
+            model.joins += 1
+            return 3
+
+        def isconnected(self):
+            return self.status() == 3
+
+        def ifconfig(self, config=None):
+            if config is not None:
+                model.static_ip = tuple(config)
+                return None
+            if model.connected:
+                return model.static_ip or (
+                    "192.168.1.77",
+                    "255.255.255.0",
+                    "192.168.1.1",
+                    "192.168.1.1",
+                )
+            return ("0.0.0.0", "0.0.0.0", "0.0.0.0", "0.0.0.0")
+
+        def scan(self):
+            """Сканирование занимает время эфира, как на железе."""
+            model.scans += 1
+            env.clock.advance(model.scan_delay)
+            if not model.available(env.clock.now):
+                return []
+            ssid = (model.ssid or "sim").encode()
+            return [(ssid, model.BSSID, model.CHANNEL, model.rssi_fn(env.clock.now), 3, False)]
+
+        def config(self, *args, **kwargs):
+            if kwargs:
+                return None
+            key = args[0]
+            return {
+                "mac": b"\x28\xcd\xc1\x0a\x1b\x2c",
+                "channel": 6,
+                "ssid": "sim",
+                "pm": 0xA11142,
+            }[key]
+
+    module.WLAN = WLAN
+    return module
+
+
+class MQTTException(Exception):
+    pass
+
+
+class SimSocket:
+    """Сокет umqtt: разбор исходящих пакетов MQTT и очередь ответов брокера.
+
+    Во время обрыва брокера при живом WiFi запись "уходит" без ошибки, а ответы
+    не приходят - полуоткрытое TCP-соединение, которое видно только по пингам.
+    """
+
+    def __init__(self, client: "MQTTClient"):
+        self.client = client
+        self.tx = bytearray()
+        self.rx = bytearray()
+        self.blocking = True
+        self.closed = False
+
+    def setblocking(self, flag):
+        self.blocking = flag
+
+    def close(self):
+        self.closed = True
+
+    def write(self, data, length=None):
+        if self.closed:
+            raise OSError(9, "EBADF")
+        # Байты уходят в стек lwIP и к брокеру, в куче устройства их нет
+        with self.client.env.heap.off_device():
+            return self._write(data, length)
+
+    def _write(self, data, length=None):
+        data = bytes(data) if length is None else bytes(data)[:length]
+        self.tx += data
+        while len(self.tx) >= 2:
+            length, multiplier, i = 0, 1, 1
+            while True:
+                if i >= len(self.tx):
+                    return len(data)
+                byte = self.tx[i]
+                length += (byte & 0x7F) * multiplier
+                i += 1
+                if not byte & 0x80:
+                    break
+                multiplier *= 128
+            if len(self.tx) < i + length:
+                return len(data)
+            header, body = self.tx[0], bytes(self.tx[i : i + length])
+            del self.tx[: i + length]
+            self._packet(header, body)
+        return len(data)
+
+    def _packet(self, header: int, body: bytes):
+        client = self.client
+        delivered = client._transport()
+        if header & 0xF0 == 0x30:
+            qos = (header >> 1) & 0x03
+            topic_length = body[0] << 8 | body[1]
+            offset = 2 + topic_length + (2 if qos else 0)
+            if not delivered:
+                client.env.broker.dropped += 1
+                return
+            client.env.broker.deliver(body[2 : 2 + topic_length], body[offset:], bool(header & 1))
+            if qos:
+                self.rx += b"\x40\x02" + body[2 + topic_length : 4 + topic_length]
+        elif header == 0xC0 and delivered:
+            self.rx += b"\xd0\x00"
+
+    def read(self, n):
+        if self.closed:
+            raise OSError(9, "EBADF")
+        if not self.rx:
+            self.client._transport()
+            if not self.blocking:
+                return None
+            raise OSError(110, "ETIMEDOUT")
+        data = bytes(self.rx[:n])
+        del self.rx[:n]
+        return data
+
+
+class MQTTClient:
+    """Замена umqtt.simple.MQTTClient поверх Broker."""
+
+    def __init__(self, client_id, server, port=0, user=None, password=None, keepalive=0, **kwargs):
+        self.env = _active_env()
+        self.client_id = client_id if isinstance(client_id, str) else client_id.decode()
+        self.server = server
+        self.port = port
+        self.keepalive = keepalive
+        self.will = None
+        self.sock_alive = False
+        self.sock = None
+        self.cb = None
+        self.topics: List[str] = []
+
+    def _transport(self) -> bool:
+        """True - пакет дойдёт, False - пропадёт в полуоткрытом соединении."""
+        env = self.env
+        if not env.network.connected:
+            self.sock_alive = False
+            raise OSError(113, "EHOSTUNREACH")
+        if not env.broker.reachable(env.clock.now):
+            return False
+        if not self.sock_alive:
+            # Брокер уже закрыл соединение на своей стороне: RST
+            raise OSError(104, "ECONNRESET")
+        return True
+
+    def set_last_will(self, topic, msg, retain=False, qos=0):
+        self.will = (topic, msg, retain)
+
+    def set_callback(self, callback):
+        self.cb = callback
+
+    def connect(self, clean_session=True, timeout=None):
+        session_present = self.env.broker.connect(self, clean_session)
+        self.sock_alive = True
+        self.sock = SimSocket(self)
+        return int(session_present)
+
+    def disconnect(self):
+        if self._transport():
+            self.env.broker.drop(self, graceful=True)
+        self.sock_alive = False
+        self.sock.close()
+
+    def ping(self):
+        self.sock.write(b"\xc0\x00")
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        # umqtt.simple пишет заголовок, топик и payload в сокет по частям без копий
+        with self.env.heap.off_device():
+            self._publish(topic, msg, retain, qos)
+
+    def _publish(self, topic, msg, retain=False, qos=0):
+        if isinstance(topic, str):
+            topic = topic.encode()
+        if isinstance(msg, str):
+            msg = msg.encode()
+        header = 0x30 | (qos << 1) | (1 if retain else 0)
+        body = len(topic).to_bytes(2, "big") + topic + (b"\x00\x01" if qos else b"") + bytes(msg)
+        self.sock.write(bytes([header]) + _encode_length(len(body)) + body)
+        if qos:
+            # umqtt.simple ждёт PUBACK на каждое сообщение
+            self.sock.read(4)
+
+    def subscribe(self, topic, qos=0):
+        self._transport()
+        topic = topic.decode() if isinstance(topic, bytes) else topic
+        if topic not in self.topics:
+            self.topics.append(topic)
+        # umqtt.simple ждёт SUBACK в wait_msg(), retained приходят в cb раньше него
+        for retained_topic, payload in list(self.env.broker.retained.items()):
+            if _topic_matches(topic, retained_topic) and self.cb is not None:
+                self.cb(retained_topic.encode(), payload)
+
+    def receive(self, topic: str, payload: bytes):
+        """Брокер пересылает PUBLISH подписчику: пакет ждёт чтения в сокете."""
+        body = len(topic).to_bytes(2, "big") + topic.encode() + payload
+        self.sock.rx += bytes([0x30]) + _encode_length(len(body)) + body
+
+    def wait_msg(self):
+        op = self.sock.read(1)
+        if op is None:
+            return None
+        if op == b"\xd0":
+            self.sock.read(1)
+            return None
+        if op[0] & 0xF0 == 0x30:
+            length, shift = 0, 0
+            while True:
+                byte = self.sock.read(1)[0]
+                length |= (byte & 0x7F) << shift
+                shift += 7
+                if not byte & 0x80:
+                    break
+            body = self.sock.read(length)
+            topic_length = body[0] << 8 | body[1]
+            if self.cb is not None:
+                self.cb(body[2 : 2 + topic_length], body[2 + topic_length :])
+        return op[0]
+
+    def check_msg(self):
+        self.sock.setblocking(False)
+        try:
+            return self.wait_msg()
+        finally:
+            self.sock.setblocking(True)
+
+
+def _encode_length(length: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        out.append(byte | (0x80 if length else 0))
+        if not length:
+            return bytes(out)
+
+
+def _make_umqtt() -> Tuple[types.ModuleType, types.ModuleType]:
+    package = types.ModuleType("umqtt")
+    package.__path__ = []
+    simple = types.ModuleType("umqtt.simple")
+    simple.MQTTClient = MQTTClient
+    simple.MQTTException = MQTTException
+    package.simple = simple
+    return package, simple
+
+
+def _make_uos() -> types.ModuleType:
+    module = types.ModuleType("uos")
+    uname = namedtuple("uname_result", "sysname nodename release version machine")
+    module.uname = lambda: uname(
+        "rp2", "rp2", "1.24.0", "v1.24.0 on 2024-10-25 (sim)", "Raspberry Pi Pico W with RP2040"
+    )
+    for name in ("listdir", "remove", "rename", "stat", "mkdir"):
+        setattr(module, name, getattr(os, name))
+    module.listdir = lambda path=".": os.listdir(path if path not in ("", "/") else ".")
+    return module
+
+
+def _make_urandom(env: SimEnvironment) -> types.ModuleType:
+    """Случайные числа прошивки от seed прогона, чтобы прогоны повторялись."""
+    module = types.ModuleType("urandom")
+    module.getrandbits = env.rng.getrandbits
+    module.randint = env.rng.randint
+    module.random = env.rng.random
+    return module
+
+
+def _make_ubinascii() -> types.ModuleType:
+    module = types.ModuleType("ubinascii")
+
+    def hexlify(data, sep=None):
+        if sep is None:
+            return binascii.hexlify(data)
+        return binascii.hexlify(data, sep if isinstance(sep, bytes) else sep.encode())
+
+    module.hexlify = hexlify
+    module.unhexlify = binascii.unhexlify
+    module.crc32 = binascii.crc32
+    return module
+
+
+def _make_ujson() -> types.ModuleType:
+    module = types.ModuleType("ujson")
+    module.dumps = lambda obj: json.dumps(obj, separators=(",", ":"))
+    module.loads = json.loads
+    return module
+
+
+# --- uasyncio на виртуальных часах -------------------------------------------
+
+
+class AsyncTimeoutError(Exception):
+    pass
+
+
+class _Suspend:
+    """Точка ожидания задачи: запрос к циклу событий, результат - значение await."""
+
+    def __init__(self, *request):
+        self.request = request
+
+    def __await__(self):
+        return (yield self.request)
+
+
+class AsyncTask:
+    def __init__(self, coro):
+        self.coro = coro
+        self.done = False
+        self.result = None
+        self.error: Optional[BaseException] = None
+        # Задачи, ждущие завершения этой (gather, wait_for_ms)
+        self.joiners: List["AsyncTask"] = []
+        # Чего ждёт сама задача: срок, событие, дочерняя задача с таймаутом
+        self.deadline: Optional[float] = None
+        self.event: Optional["AsyncEvent"] = None
+        self.child: Optional["AsyncTask"] = None
+
+
+class AsyncLoop:
+    """Цикл событий uasyncio: задачи ходят по очереди, ожидание двигает виртуальные часы.
+
+    Синхронные вызовы внутри задач (connect(), запись в сокет, time.sleep_ms)
+    двигают часы сами и задерживают все задачи, как на устройстве.
+    """
+
+    def __init__(self, clock: VirtualClock):
+        self.clock = clock
+        self.ready: List[Tuple[AsyncTask, object, Optional[BaseException]]] = []
+        self.sleeping: List[AsyncTask] = []
+
+    def spawn(self, coro) -> AsyncTask:
+        task = AsyncTask(coro)
+        self.ready.append((task, None, None))
+        return task
+
+    def wake(self, task: AsyncTask, value=None, error: Optional[BaseException] = None):
+        if task in self.sleeping:
+            self.sleeping.remove(task)
+        if task.event is not None:
+            task.event.waiting.remove(task)
+        task.deadline = task.event = task.child = None
+        self.ready.append((task, value, error))
+
+    def cancel(self, task: AsyncTask):
+        """Снять задачу, не дождавшуюся своего часа (таймаут wait_for_ms)."""
+        if task.child is not None:
+            task.child.joiners.remove(task)
+            self.cancel(task.child)
+        if task in self.sleeping:
+            self.sleeping.remove(task)
+        if task.event is not None:
+            task.event.waiting.remove(task)
+        self.ready = [entry for entry in self.ready if entry[0] is not task]
+        task.done = True
+        task.coro.close()
+
+    def _finish(self, task: AsyncTask, result, error: Optional[BaseException]):
+        task.done = True
+        task.result = result
+        task.error = error
+        for joiner in task.joiners:
+            self.wake(joiner, result, error)
+        task.joiners = []
+
+    def _step(self, task: AsyncTask, value, error: Optional[BaseException]):
+        try:
+            if error is not None:
+                request = task.coro.throw(error)
+            else:
+                request = task.coro.send(value)
+        except StopIteration as stop:
+            self._finish(task, stop.value, None)
+            return
+        except Exception as e:
+            self._finish(task, None, e)
+            return
+
+        kind = request[0]
+        if kind == "sleep":
+            if request[1] <= 0:
+                self.ready.append((task, None, None))
+                return
+            task.deadline = self.clock.now + request[1]
+            self.sleeping.append(task)
+        elif kind == "event":
+            if request[1].flag:
+                self.ready.append((task, None, None))
+                return
+            task.event = request[1]
+            task.event.waiting.append(task)
+        else:
+            child, timeout = request[1], request[2]
+            if child.done:
+                self.ready.append((task, child.result, child.error))
+                return
+            child.joiners.append(task)
+            if timeout is not None:
+                task.child = child
+                task.deadline = self.clock.now + timeout
+                self.sleeping.append(task)
+
+    def run(self, coro):
+        main = self.spawn(coro)
+        while not main.done:
+            if self.ready:
+                self._step(*self.ready.pop(0))
+                continue
+            if not self.sleeping:
+                raise RuntimeError("all uasyncio tasks are waiting forever")
+            deadline = min(task.deadline for task in self.sleeping)
+            self.clock.advance(deadline - self.clock.now)
+            for task in [t for t in self.sleeping if t.deadline <= self.clock.now]:
+                if task.child is not None:
+                    child = task.child
+                    child.joiners.remove(task)
+                    self.cancel(child)
+                    self.wake(task, error=AsyncTimeoutError())
+                else:
+                    self.wake(task)
+        if main.error is not None:
+            raise main.error
+        return main.result
+
+
+class AsyncEvent:
+    def __init__(self):
+        self.flag = False
+        self.waiting: List[AsyncTask] = []
+
+    def set(self):
+        self.flag = True
+        for task in list(self.waiting):
+            _ACTIVE_LOOP[-1].wake(task)
+
+    def clear(self):
+        self.flag = False
+
+    def is_set(self) -> bool:
+        return self.flag
+
+    async def wait(self):
+        if not self.flag:
+            await _Suspend("event", self)
+        return True
+
+
+_ACTIVE_LOOP: List[AsyncLoop] = []
+
+
+def _make_uasyncio(env: SimEnvironment) -> types.ModuleType:
+    module = types.ModuleType("uasyncio")
+
+    async def sleep(seconds):
+        await _Suspend("sleep", seconds)
+
+    async def sleep_ms(ms):
+        await _Suspend("sleep", ms / 1000)
+
+    async def wait_for(awaitable, timeout):
+        task = _ACTIVE_LOOP[-1].spawn(awaitable)
+        return await _Suspend("join", task, timeout)
+
+    async def wait_for_ms(awaitable, timeout_ms):
+        return await wait_for(awaitable, timeout_ms / 1000)
+
+    async def gather(*awaitables):
+        loop = _ACTIVE_LOOP[-1]
+        tasks = [loop.spawn(awaitable) for awaitable in awaitables]
+        return [await _Suspend("join", task, None) for task in tasks]
+
+    def run(coro):
+        _ACTIVE_LOOP.append(AsyncLoop(env.clock))
+        try:
+            return _ACTIVE_LOOP[-1].run(coro)
+        finally:
+            _ACTIVE_LOOP.pop()
+
+    module.sleep = sleep
+    module.sleep_ms = sleep_ms
+    module.wait_for = wait_for
+    module.wait_for_ms = wait_for_ms
+    module.gather = gather
+    module.create_task = lambda coro: _ACTIVE_LOOP[-1].spawn(coro)
+    module.run = run
+    module.Event = AsyncEvent
+    module.TimeoutError = AsyncTimeoutError
+    return module
+
+
+_ACTIVE: List[SimEnvironment] = []
+
+
+def _active_env() -> SimEnvironment:
+    return _ACTIVE[-1]
+
+
+def firmware_modules() -> List[str]:
+    """Имена модулей прошивки (файлы .py в корне репозитория)."""
+    return [
+        name[:-3]
+        for name in os.listdir(REPO_ROOT)
+        if name.endswith(".py") and name not in ("pico_test.py", "wi_fi.py")
+    ]
+
+
+def load_config(overrides: Optional[dict] = None) -> types.ModuleType:
+    """Модуль config из config_example.py с переопределениями."""
+    module = types.ModuleType("config")
+    with open(os.path.join(REPO_ROOT, "config_example.py"), encoding="utf-8") as f:
+        exec(compile(f.read(), "config_example.py", "exec"), module.__dict__)
+    for key, value in (overrides or {}).items():
+        setattr(module, key, value)
+    return module
+
+
+@contextlib.contextmanager
+def installed(env: SimEnvironment, config: types.ModuleType):
+    """Подставить модули прошивки на время прогона и вернуть всё обратно."""
+    umqtt, umqtt_simple = _make_umqtt()
+    fakes = {
+        "time": _make_time(env),
+        "gc": _make_gc(env),
+        "machine": _make_machine(env),
+        "network": _make_network(env),
+        "ubinascii": _make_ubinascii(),
+        "urandom": _make_urandom(env),
+        "uos": _make_uos(),
+        "ujson": _make_ujson(),
+        "uasyncio": _make_uasyncio(env),
+        "umqtt": umqtt,
+        "umqtt.simple": umqtt_simple,
+        "config": config,
+    }
+    names = set(fakes) | set(firmware_modules())
+    saved = {name: sys.modules.get(name) for name in names}
+    for name in firmware_modules():
+        sys.modules.pop(name, None)
+    sys.modules.update(fakes)
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+    workdir = tempfile.TemporaryDirectory(prefix="pico-sim-")
+    cwd = os.getcwd()
+    os.chdir(workdir.name)
+    _ACTIVE.append(env)
+    try:
+        yield
+    finally:
+        _ACTIVE.pop()
+        os.chdir(cwd)
+        workdir.cleanup()
+        for name, module in saved.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+
+
+# --- прогон PicoMonitor ------------------------------------------------------
+
+
+class SimResult:
+    """Итоги прогона: трафик, время цикла, аллокации и восстановление после обрывов."""
+
+    def __init__(
+        self, env: SimEnvironment, monitor, cycle_seconds: List[float], cycle_alloc: List[int]
+    ):
+        self.env = env
+        self.monitor = monitor
+        self.duration = env.clock.now
+        self.messages = env.broker.messages
+        self.cycle_seconds = cycle_seconds
+        self.cycle_alloc = cycle_alloc
+
+    def data_messages(self) -> List[Broker.Message]:
+        """Сообщения с метриками (без birth, status, конфигурации и служебных топиков)."""
+        suffixes = ("/info", "/status", "/profile")
+        return [
+            m for m in self.messages if not m.topic.endswith(suffixes) and "/config/" not in m.topic
+        ]
+
+    def bytes_per_hour(self) -> float:
+        total = sum(len(m.payload) for m in self.data_messages())
+        return total * 3600 / self.duration if self.duration else 0.0
+
+    def recovery_times(self, outages: Sequence[Interval]) -> List[Optional[float]]:
+        """Время от конца обрыва до первой публикации метрик после него."""
+        times = []
+        for _, end in outages:
+            after = [m.time for m in self.data_messages() if m.time >= end]
+            times.append(after[0] - end if after else None)
+        return times
+
+    def summary(self) -> dict:
+        cycles = len(self.cycle_seconds)
+        ordered = sorted(self.cycle_seconds)
+        return {
+            "cycles": cycles,
+            "cycle_us_avg": sum(ordered) / cycles * 1e6 if cycles else 0.0,
+            "cycle_us_p95": ordered[int(cycles * 0.95)] * 1e6 if cycles else 0.0,
+            "alloc_bytes_per_cycle": sum(self.cycle_alloc) / cycles if cycles else 0.0,
+            "messages": len(self.data_messages()),
+            "bytes_per_hour": self.bytes_per_hour(),
+        }
+
+
+class Simulation:
+    """Прогон PicoMonitor в режиме "sync" или "async" на виртуальном времени.
+
+    Прошивка стартует через main.main(), как на устройстве: после machine.reset(),
+    срабатывания сторожевого таймера или сброса питания из resets модули
+    загружаются заново, а файлы на flash остаются.
+    """
+
+    def __init__(
+        self,
+        duration: float = 3600,
+        config: Optional[dict] = None,
+        wifi_outages: Sequence[Interval] = (),
+        broker_outages: Sequence[Interval] = (),
+        adc: Optional[Dict[int, Callable[[float], int]]] = None,
+        seed: int = 0,
+        quiet: bool = True,
+        resets: Sequence[float] = (),
+    ):
+        self.env = SimEnvironment(duration, wifi_outages, broker_outages, adc, seed, resets)
+        self.config = load_config(config)
+        # Второго ядра в симуляции нет: _thread под CPython не делит время с часами
+        if self.config.RUNTIME_MODE == "dual":
+            raise ValueError('RUNTIME_MODE "dual" is not simulated')
+        self.quiet = quiet
+
+    def _instrument(self, monitor, cycle_seconds: List[float], cycle_alloc: List[int]):
+        """Замер реального времени и аллокаций одного цикла сбор + публикация."""
+        collect, process = monitor.collect_metrics, monitor.process_sample
+        heap = self.env.heap
+        state = {}
+
+        def collect_metrics():
+            heap.reset_peak()
+            state["alloc"] = heap._traced()
+            state["start"] = real_time.perf_counter()
+            return collect()
+
+        def process_sample(metrics):
+            try:
+                return process(metrics)
+            finally:
+                if "start" in state:
+                    elapsed = real_time.perf_counter() - state.pop("start")
+                    allocated = heap.peak() - state.pop("alloc")
+                    # Результаты замеров копятся на хосте, а не в куче устройства
+                    with heap.off_device():
+                        cycle_seconds.append(elapsed)
+                        cycle_alloc.append(allocated)
+
+        monitor.collect_metrics = collect_metrics
+        monitor.process_sample = process_sample
+
+    def _boot(self, setup: Optional[Callable], cycle_seconds: List[float], cycle_alloc: List[int]):
+        """Одна загрузка: свежие модули прошивки и main.main() до перезагрузки."""
+        for name in firmware_modules():
+            sys.modules.pop(name, None)
+        main = importlib.import_module("main")
+        simulation = self
+
+        class SimMonitor(main.PicoMonitor):
+            def __init__(self):
+                super().__init__()
+                simulation._instrument(self, cycle_seconds, cycle_alloc)
+                if setup is not None:
+                    setup(self)
+                simulation.monitor = self
+
+        main.PicoMonitor = SimMonitor
+        main.main()
+
+    def run(self, setup: Optional[Callable] = None) -> SimResult:
+        """Запустить прошивку до конца виртуального времени; setup(monitor) - на каждой загрузке."""
+        cycle_seconds: List[float] = []
+        cycle_alloc: List[int] = []
+        self.monitor = None
+        output = open(os.devnull, "w") if self.quiet else contextlib.nullcontext(sys.stdout)
+        tracemalloc.start()
+        try:
+            with installed(self.env, self.config), output as stream:
+                with contextlib.redirect_stdout(stream):
+                    while True:
+                        try:
+                            self._boot(setup, cycle_seconds, cycle_alloc)
+                            break
+                        except SimulationEnd:
+                            break
+                        except MachineReset as reset:
+                            self.env.reboot(reset.cause)
+        finally:
+            tracemalloc.stop()
+            real_gc.collect()
+        return SimResult(self.env, self.monitor, cycle_seconds, cycle_alloc)
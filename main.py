@@ -1,6 +1,7 @@
 """Главный файл"""
 
 import time
+import config
 from config import (
     CLIENT_ID,
     MQTT_PORT,
@@ -14,17 +15,476 @@ import machine
 
 from wifi_manager import WiFiManager
 from system_metrics import SystemMetrics
+from health_rules import HealthRules
+from memory_diagnostics import MemoryDiagnostics
 from mqtt_publisher import MQTTPublisher
+from payload_codec import BinaryEncoder
+from delta_filter import DeltaFilter
+from offline_buffer import OfflineBuffer
+from adc_sampler import ADCSampler
+from profiler import Profiler
+from power_scheduler import PowerScheduler
+from streaming_stats import IntervalJitter
+from device_state import StateCheckpoint, Watchdog
+from collector_schedule import CollectorSchedule
+from health_rules import DEFAULT_HEALTH_RULES
+
+# Остальные параметры необязательны: config.py прежних версий загружается без правок,
+# а всё, что добавлено позже, без явной настройки выключено (описание - config_example.py)
+WIFI_FAST_REJOIN = getattr(config, "WIFI_FAST_REJOIN", False)
+WIFI_STATIC_IP = getattr(config, "WIFI_STATIC_IP", None)
+WIFI_POLL_MS = getattr(config, "WIFI_POLL_MS", 50)
+WIFI_CONNECT_TIMEOUT = getattr(config, "WIFI_CONNECT_TIMEOUT", 15)
+WIFI_BACKOFF_MIN = getattr(config, "WIFI_BACKOFF_MIN", 0.5)
+WIFI_BACKOFF_MAX = getattr(config, "WIFI_BACKOFF_MAX", 10)
+
+MQTT_QOS = getattr(config, "MQTT_QOS", 0)
+MQTT_INFLIGHT_WINDOW = getattr(config, "MQTT_INFLIGHT_WINDOW", 8)
+MQTT_PERSISTENT_SESSION = getattr(config, "MQTT_PERSISTENT_SESSION", False)
+MQTT_PING_INTERVAL = getattr(config, "MQTT_PING_INTERVAL", 0)
+MQTT_PING_TIMEOUT = getattr(config, "MQTT_PING_TIMEOUT", 5)
+DEVICE_TOPICS = getattr(config, "DEVICE_TOPICS", False)
+METRICS_HTTP_PORT = getattr(config, "METRICS_HTTP_PORT", 0)
+MQTT_ENABLED = getattr(config, "MQTT_ENABLED", True)
+
+COLLECTOR_PERIODS = getattr(config, "COLLECTOR_PERIODS", {})
+COLLECTORS_DISABLED = getattr(config, "COLLECTORS_DISABLED", ())
+SCHEDULE_REMOTE = getattr(config, "SCHEDULE_REMOTE", False)
+MEMORY_PROBE_EVERY = getattr(config, "MEMORY_PROBE_EVERY", 10)
+MEMORY_PROBE_CHANGE_BYTES = getattr(config, "MEMORY_PROBE_CHANGE_BYTES", 8192)
+STATS_WINDOW = getattr(config, "STATS_WINDOW", 30)
+STATS_EWMA_ALPHA = getattr(config, "STATS_EWMA_ALPHA", 0.2)
+STATS_TREND_WINDOW = getattr(config, "STATS_TREND_WINDOW", 30)
+HEALTH_RULES = getattr(config, "HEALTH_RULES", DEFAULT_HEALTH_RULES)
+HEALTH_RULES_REMOTE = getattr(config, "HEALTH_RULES_REMOTE", False)
+
+PAYLOAD_FORMAT = getattr(config, "PAYLOAD_FORMAT", "json")
+DELTA_PUBLISHING = getattr(config, "DELTA_PUBLISHING", False)
+DELTA_KEYFRAME_EVERY = getattr(config, "DELTA_KEYFRAME_EVERY", 30)
+OFFLINE_BUFFER_SAMPLES = getattr(config, "OFFLINE_BUFFER_SAMPLES", 0)
+OFFLINE_FLASH_SEGMENTS = getattr(config, "OFFLINE_FLASH_SEGMENTS", 0)
+OFFLINE_REPLAY_BATCH = getattr(config, "OFFLINE_REPLAY_BATCH", 16)
+OFFLINE_REPLAY_BATCHES_PER_CYCLE = getattr(config, "OFFLINE_REPLAY_BATCHES_PER_CYCLE", 2)
+BATCH_SIZE = getattr(config, "BATCH_SIZE", 1)
+BATCH_MAX_LATENCY = getattr(config, "BATCH_MAX_LATENCY", 30)
+
+RUNTIME_MODE = getattr(config, "RUNTIME_MODE", "sync")
+SAMPLE_QUEUE_SIZE = getattr(config, "SAMPLE_QUEUE_SIZE", 8)
+ADC_SAMPLE_RATE = getattr(config, "ADC_SAMPLE_RATE", 0)
+PROFILE_ENABLED = getattr(config, "PROFILE_ENABLED", False)
+PROFILE_PUBLISH_EVERY = getattr(config, "PROFILE_PUBLISH_EVERY", 6)
+POWER_SCHEDULER = getattr(config, "POWER_SCHEDULER", False)
+POWER_MIN_INTERVAL = getattr(config, "POWER_MIN_INTERVAL", 5)
+POWER_MAX_INTERVAL = getattr(config, "POWER_MAX_INTERVAL", 300)
+POWER_LIGHTSLEEP = getattr(config, "POWER_LIGHTSLEEP", True)
+POWER_HEALTH_CHECK_INTERVAL = getattr(config, "POWER_HEALTH_CHECK_INTERVAL", 5)
+STATE_CHECKPOINT_INTERVAL = getattr(config, "STATE_CHECKPOINT_INTERVAL", 0)
+STATE_CHECKPOINT_SLOTS = getattr(config, "STATE_CHECKPOINT_SLOTS", 4)
+WATCHDOG_TIMEOUT = getattr(config, "WATCHDOG_TIMEOUT", 0)
+WATCHDOG_STALL = getattr(config, "WATCHDOG_STALL", 120)
 
 
 class PicoMonitor:
     def __init__(self):
-        self.wifi = WiFiManager(WIFI_SSID, WIFI_PASSWORD)
-        self.metrics = SystemMetrics()
+        # Без пингов во сне брокер не должен рвать соединение между сэмплами
+        keepalive = max(60, 2 * POWER_MAX_INTERVAL) if POWER_SCHEDULER else 60
+
+        # Сторожевой таймер запускается первым: подключения тоже под надзором,
+        # их паузы нарезаются с кормлением. Интервал планировщика питания и
+        # расписания не длиннее keepalive: зависание - пауза дольше него и WATCHDOG_STALL
+        self.watchdog = None
+        wait_ms = None
+        if WATCHDOG_TIMEOUT:
+            self.watchdog = Watchdog(
+                WATCHDOG_TIMEOUT * 1000, stall_ms=(keepalive + WATCHDOG_STALL) * 1000
+            )
+            wait_ms = self.watchdog.sleep_ms
+
+        # Периоды сборщиков и интервал публикации; интервал не длиннее keepalive
+        self.schedule = CollectorSchedule(
+            PUBLISH_INTERVAL,
+            periods=COLLECTOR_PERIODS,
+            disabled=COLLECTORS_DISABLED,
+            max_publish_interval=keepalive,
+        )
+
+        self.wifi = WiFiManager(
+            WIFI_SSID,
+            WIFI_PASSWORD,
+            static_ip=WIFI_STATIC_IP,
+            fast_rejoin=WIFI_FAST_REJOIN,
+            poll_ms=WIFI_POLL_MS,
+            timeout_ms=WIFI_CONNECT_TIMEOUT * 1000,
+            backoff_min_ms=int(WIFI_BACKOFF_MIN * 1000),
+            backoff_max_ms=int(WIFI_BACKOFF_MAX * 1000),
+            wait_ms=wait_ms,
+        )
+        adc_sampler = None
+        if ADC_SAMPLE_RATE:
+            adc_sampler = ADCSampler(rate_hz=ADC_SAMPLE_RATE)
+            # В режиме "dual" отсчёты снимает цикл ядра 1, таймер не нужен
+            if RUNTIME_MODE != "dual":
+                adc_sampler.start()
+        self.metrics = SystemMetrics(
+            memory_diagnostics=MemoryDiagnostics(
+                # Замер выделяет почти всю свободную кучу: с ядра 1 он отнимал бы
+                # память у публикации на ядре 0, поэтому в режиме "dual" выключен
+                probe_every=MEMORY_PROBE_EVERY if RUNTIME_MODE != "dual" else 0,
+                change_threshold=MEMORY_PROBE_CHANGE_BYTES,
+            ),
+            adc_sampler=adc_sampler,
+            health_rules=HealthRules(HEALTH_RULES),
+            stats_window=STATS_WINDOW,
+            ewma_alpha=STATS_EWMA_ALPHA,
+            trend_window=STATS_TREND_WINDOW,
+            schedule=self.schedule,
+        )
         self.metrics.wlan = self.wifi.wlan
-        self.mqtt = MQTTPublisher(MQTT_SERVER, MQTT_PORT, CLIENT_ID, MQTT_TOPIC)
+
+        # В парке устройств у каждого своё дерево топиков и свой client id,
+        # иначе брокер разрывает соединения с одинаковым id друг у друга
+        topic, client_id = MQTT_TOPIC, CLIENT_ID
+        if DEVICE_TOPICS:
+            device_id = self.metrics.get_system_info()["sys_unique_id"]
+            topic = MQTT_TOPIC + b"/" + device_id.encode()
+            client_id = CLIENT_ID + "-" + device_id
+
+        self.mqtt = MQTTPublisher(
+            MQTT_SERVER,
+            MQTT_PORT,
+            client_id,
+            topic,
+            info_provider=self.metrics.get_device_info,
+            encoder=BinaryEncoder() if PAYLOAD_FORMAT == "binary" else None,
+            batch_size=BATCH_SIZE,
+            batch_max_latency_ms=BATCH_MAX_LATENCY * 1000,
+            keepalive=keepalive,
+            qos=MQTT_QOS,
+            inflight_window=MQTT_INFLIGHT_WINDOW,
+            persistent_session=MQTT_PERSISTENT_SESSION,
+            ping_interval_ms=MQTT_PING_INTERVAL * 1000,
+            ping_timeout_ms=MQTT_PING_TIMEOUT * 1000,
+            wait_ms=wait_ms,
+            feed=self.watchdog.feed if self.watchdog is not None else None,
+            # Зависший connect() или ожидание SUBACK не переживут сторожевой таймер
+            socket_timeout_ms=self.watchdog.slice_ms if self.watchdog is not None else 0,
+        )
+        # Пороги здоровья меняются retained-сообщением без перепрошивки
+        if HEALTH_RULES_REMOTE:
+            self.mqtt.subscribe(b"/config/health", self.metrics.health_rules.load_json)
+        if SCHEDULE_REMOTE:
+            self.mqtt.subscribe(b"/config/schedule", self.load_schedule)
+        self.delta = DeltaFilter(keyframe_every=DELTA_KEYFRAME_EVERY) if DELTA_PUBLISHING else None
+        self.offline = None
+        # Без MQTT досылать некуда: Prometheus сам опрашивает устройство
+        if OFFLINE_BUFFER_SAMPLES and MQTT_ENABLED:
+            self.offline = OfflineBuffer(
+                capacity=OFFLINE_BUFFER_SAMPLES,
+                flash_segments=OFFLINE_FLASH_SEGMENTS,
+                batch_size=OFFLINE_REPLAY_BATCH,
+                batches_per_cycle=OFFLINE_REPLAY_BATCHES_PER_CYCLE,
+            )
         self.reconnect_count = 0
         self.error_count = 0
+        self.sample_seq = 0
+        # Отклонение интервала между сэмплами: сравнение режимов работы
+        self.sample_jitter = IntervalJitter(PUBLISH_INTERVAL * 1000000)
+
+        # Счётчики переживают machine.reset(): восстановление из последней записи на flash
+        self.state = StateCheckpoint(
+            slots=STATE_CHECKPOINT_SLOTS, interval_ms=STATE_CHECKPOINT_INTERVAL * 1000
+        )
+        if STATE_CHECKPOINT_INTERVAL:
+            self.restore_state()
+
+        # Скрейп /metrics напрямую Prometheus'ом: рядом с MQTT или вместо него
+        self.mqtt_enabled = MQTT_ENABLED
+        self.http = None
+        if METRICS_HTTP_PORT:
+            from metrics_server import MetricsServer
+
+            self.http = MetricsServer(METRICS_HTTP_PORT)
+
+        # Счётчики компонентов входят в тот же снимок, что и показания железа
+        providers = self.metrics.stats_providers
+        if self.offline is not None:
+            providers.append(self.offline.get_stats)
+        providers.append(self.mqtt.get_link_stats)
+        providers.append(self.wifi.get_stats)
+        providers.append(self.sample_jitter.get_stats)
+        providers.append(self.state.get_stats)
+        providers.append(self.schedule.get_stats)
+        if self.http is not None:
+            providers.append(self.http.get_stats)
+
+        # Адаптивный интервал и сон между циклами; смена статуса здоровья будит досрочно
+        self.scheduler = None
+        self.last_health = None
+        if POWER_SCHEDULER:
+            self.scheduler = PowerScheduler(
+                PUBLISH_INTERVAL,
+                min_interval=POWER_MIN_INTERVAL,
+                max_interval=POWER_MAX_INTERVAL,
+                health_check_interval=POWER_HEALTH_CHECK_INTERVAL,
+                # lightsleep останавливает таймер АЦП, не отвечает на скрейпы
+                # и не кормит сторожевой таймер
+                lightsleep=POWER_LIGHTSLEEP
+                and not ADC_SAMPLE_RATE
+                and not METRICS_HTTP_PORT
+                and not WATCHDOG_TIMEOUT,
+            )
+            providers.append(self.scheduler.get_stats)
+
+        # Профайлер оборачивает методы только если включён
+        self.profiler = None
+        self.profile_published_seq = 0
+        if PROFILE_ENABLED:
+            self.profiler = Profiler()
+            self.instrument(self.profiler)
+
+    def instrument(self, profiler):
+        """Обернуть сборщики, сериализацию и запись в сеть профилирующими обёртками."""
+        for method in (
+            "read_adc",
+            "read_memory",
+            "read_wifi",
+            "read_cpu",
+            "read_stats",
+            "read_counters",
+            "derive_health",
+        ):
+            profiler.instrument(self.metrics, method, method)
+        profiler.instrument(self.metrics, "read_snapshot", "snapshot")
+        profiler.instrument(self.metrics, "derive", "derive")
+        profiler.instrument(self.metrics, "get_all_metrics", "collect_total")
+        profiler.instrument(self.mqtt, "_serialize", "serialize")
+        profiler.instrument(self.mqtt, "_write", "network_write")
+
+    def load_schedule(self, payload) -> bool:
+        """Расписание из топика конфигурации: новый интервал - всем, кто его считает."""
+        if not self.schedule.load_json(payload):
+            return False
+        interval_ms = self.schedule.publish_interval_ms
+        self.sample_jitter.interval_us = interval_ms * 1000
+        scheduler = self.scheduler
+        if scheduler is not None:
+            # Границы адаптивного интервала охватывают новый базовый, как при создании
+            scheduler.base_interval = interval_ms // 1000
+            scheduler.min_interval = min(POWER_MIN_INTERVAL, scheduler.base_interval)
+            scheduler.max_interval = max(POWER_MAX_INTERVAL, scheduler.base_interval)
+        return True
+
+    def state_counters(self) -> tuple:
+        """Счётчики для записи на flash, в порядке device_state.STATE_COUNTERS."""
+        metrics = self.metrics
+        return (
+            self.reconnect_count,
+            self.error_count,
+            metrics.mqtt_publish_success,
+            metrics.mqtt_publish_failed,
+            self.sample_seq,
+            metrics.max_temp_x100,
+            metrics.min_rssi,
+        )
+
+    def restore_state(self):
+        """Продолжить счётчики с последней записи и сразу учесть перезагрузку."""
+        counters = self.state.restore()
+        if counters is not None:
+            metrics = self.metrics
+            (
+                self.reconnect_count,
+                self.error_count,
+                metrics.mqtt_publish_success,
+                metrics.mqtt_publish_failed,
+                self.sample_seq,
+                metrics.max_temp_x100,
+                metrics.min_rssi,
+            ) = counters
+        # Иначе цикл сбоев до первой записи по расписанию не виден в счётчике
+        self.state.save(self.state_counters())
+
+    def save_state(self, planned: bool = False):
+        """Записать счётчики на flash по расписанию; planned - перед machine.reset()."""
+        if self.state.interval_ms and (planned or self.state.due()):
+            self.state.save(self.state_counters(), planned)
+
+    def collect_metrics(self):
+        """Собрать метрики вместе со статистикой offline-буфера, MQTT и WiFi.
+
+        Возвращается общий MetricRegistry: значения действительны до следующего сбора.
+        """
+        self.sample_seq += 1
+        self.sample_jitter.mark(time.ticks_us())
+        metrics = self.metrics.get_all_metrics(
+            reconnect_count=self.reconnect_count, error_count=self.error_count
+        )
+        if self.http is not None:
+            self.http.update(metrics)
+        if self.watchdog is not None:
+            self.watchdog.beat()
+        self.save_state()
+        return metrics
+
+    def store_offline(self, metrics: dict = None):
+        """Сохранить сэмпл, пока сеть недоступна, чтобы не было дыр в графиках."""
+        if self.offline is None:
+            return
+        if metrics is None:
+            metrics = self.collect_metrics()
+        self.offline.store(metrics, self.sample_seq)
+        print(f"Sample buffered offline ({self.offline.pending()} pending)")
+
+    def publish_metrics(self, payload: dict, urgent: bool = False):
+        """Опубликовать сэмпл: True/False - результат отправки, None - сэмпл ждёт в пакете.
+
+        urgent - отправить пакет сразу, не дожидаясь заполнения (смена здоровья).
+        """
+        if self.mqtt.batch is None:
+            return self.mqtt.publish(payload)
+
+        if not self.mqtt.add_to_batch(payload, self.sample_seq) and not urgent:
+            return None
+        if self.mqtt.flush_batch():
+            return True
+
+        # Неотправленный пакет не теряем: записи уходят в offline-буфер
+        if self.offline is not None:
+            for record in self.mqtt.batch.records():
+                self.offline.store_record(record)
+        self.mqtt.batch.reset()
+        if self.delta is not None:
+            self.delta.force_keyframe()
+        return False
+
+    def print_summary(self, metrics: dict):
+        """Вывод основных метрик."""
+        print(f"\n--- Metrics at {time.time()} ---")
+        print(f"Health: {metrics.get('health_status')} (score: {metrics.get('health_score')})")
+        print(
+            f"Temp: {metrics.get('temperature_celsius')}°C (max: {metrics.get('cpu_temp_max_celsius')}°C)"
+        )
+        print(
+            f"Memory: {metrics.get('memory_usage_percent')}% (fragmentation: {metrics.get('memory_fragmentation')}%)"
+        )
+        print(
+            f"WiFi: {metrics.get('wifi_signal_quality_percent')}% ({metrics.get('wifi_rssi_dbm')} dBm)"
+        )
+        print(f"Battery: {metrics.get('battery_percent')}% ({metrics.get('power_source')})")
+        print(f"MQTT Success Rate: {metrics.get('mqtt_publish_success_rate')}%")
+        print(f"Uptime: {metrics.get('uptime_seconds')}s")
+
+    def process_sample(self, metrics: dict) -> bool:
+        """Отфильтровать и опубликовать сэмпл; False - слишком много ошибок, MQTT сброшен."""
+        # Только изменившиеся метрики, периодически - полный keyframe
+        payload = metrics
+        if self.delta is not None:
+            payload = self.delta.filter(metrics)
+
+        # Смена статуса здоровья публикуется без задержки в пакете
+        health = (metrics.get("health_status"), metrics.get("health_issues_count"))
+        urgent = self.last_health is not None and health != self.last_health
+        self.last_health = health
+
+        # Публикация с записью результата
+        published = self.publish_metrics(payload, urgent) if payload else None
+        if published is not False and payload and self.scheduler is not None:
+            self.scheduler.record_publish()
+        if not payload:
+            self.delta.commit(payload)
+            print("✓ No significant changes, publish skipped")
+        elif published is None:
+            if self.delta is not None:
+                self.delta.commit(payload)
+            print(f"✓ Sample batched ({self.mqtt.batch.count}/{self.mqtt.batch.max_records})")
+        elif published:
+            self.error_count = 0
+            self.metrics.record_mqtt_publish(success=True)
+            self.wifi.record_publish()
+            self.state.mark("first_publish")
+            if self.delta is not None:
+                self.delta.commit(payload)
+            print(f"✓ Published successfully ({len(payload)}/{len(metrics)} metrics)")
+
+            # Досылка накопленного за время обрыва, с ограничением на цикл
+            if self.offline is not None and self.offline.has_pending():
+                replayed = self.offline.replay(self.mqtt.publish_replay)
+                print(f"✓ Replayed {replayed} buffered samples")
+
+            if (
+                self.profiler is not None
+                and self.sample_seq - self.profile_published_seq >= PROFILE_PUBLISH_EVERY
+            ):
+                self.mqtt.publish_profile(self.profiler.get_stats())
+                self.profile_published_seq = self.sample_seq
+        else:
+            self.error_count += 1
+            self.metrics.record_mqtt_publish(success=False)
+            self.wifi.mark_lost(wifi=False)
+            print(f"✗ Publish failed (error count: {self.error_count})")
+            if self.mqtt.batch is None:
+                self.store_offline(metrics)
+
+            if self.error_count >= 3:
+                print("Too many errors, forcing reconnection...")
+                self.mqtt.disconnect()
+                return False
+
+        return True
+
+    def health_changed(self) -> bool:
+        """Проверка между циклами: пересечён ли порог здоровья с прошлого сэмпла."""
+        health = self.metrics.get_health_status()
+        return (health["health_status"], health["health_issues_count"]) != self.last_health
+
+    def idle(self, metrics: dict):
+        """Пауза до следующего цикла: фиксированная или от планировщика питания.
+
+        С /metrics пауза - обслуживание скрейпов, а не sleep.
+        """
+        # Сканирование эфира (1-2 с) - за счёт паузы, а не следующего сэмпла
+        started = time.ticks_ms()
+        self.wifi.refresh_ap()
+        spent_ms = time.ticks_diff(time.ticks_ms(), started)
+        if self.scheduler is None:
+            self.pause(max(0, self.schedule.publish_interval_ms - spent_ms))
+            return
+
+        interval = self.scheduler.next_interval(metrics)
+        self.scheduler.apply_power_mode(self.wifi.wlan)
+        print(f"Next sample in {interval}s ({self.scheduler.power_source})")
+        if self.scheduler.sleep(interval, self.health_changed, self.pause):
+            print("Health threshold crossed, fast-path sample")
+
+    def pause(self, ms: int):
+        """Пауза: обслуживание /metrics или sleep; со сторожевым таймером - с кормлением."""
+        wait_ms = self.http.serve if self.http is not None else time.sleep_ms
+        if self.watchdog is None:
+            wait_ms(ms)
+        else:
+            self.watchdog.sleep_ms(ms, wait_ms)
+
+    def wait_retry(self, reason: str):
+        """Сохранить сэмпл и выждать паузу с экспоненциальным ростом и разбросом."""
+        self.store_offline()
+        backoff_ms = self.wifi.next_backoff()
+        print(f"{reason}, retry in {backoff_ms} ms")
+        self.pause(backoff_ms)
+
+    def connect_mqtt(self, max_attempts: int = 3) -> bool:
+        """Подключение к MQTT; после него первая публикация - полный keyframe."""
+        if not self.mqtt.connect(max_attempts):
+            return False
+        self.state.mark("mqtt")
+        if self.delta is not None:
+            self.delta.force_keyframe()
+        return True
+
+    def wifi_connected(self):
+        """WiFi поднят: этап загрузки и /metrics (повторный вызов ничего не делает)."""
+        self.state.mark("wifi")
+        if self.http is not None:
+            self.http.start()
 
     def setup(self) -> bool:
         """Инициализация системы."""
@@ -34,11 +494,9 @@ class PicoMonitor:
         if not self.wifi.connect():
             print("ERROR: WiFi initialization failed")
             return False
+        self.wifi_connected()
 
-        print("Waiting for network stability...")
-        time.sleep(3)
-
-        if not self.mqtt.connect():
+        if self.mqtt_enabled and not self.connect_mqtt():
             print("ERROR: MQTT initialization failed")
             return False
 
@@ -50,89 +508,62 @@ class PicoMonitor:
         print("Starting main loop...")
 
         while True:
+            if self.watchdog is not None:
+                self.watchdog.feed()
             try:
                 # Проверка WiFi
+                # IP уже получен, когда status() == 3: MQTT подключается сразу,
+                # паузы только между неудачными попытками
                 if not self.wifi.is_connected():
                     print("\n[!] WiFi disconnected, reconnecting...")
+                    self.wifi.mark_lost()
+                    self.mqtt.disconnect()
                     if not self.wifi.connect():
-                        print("WiFi reconnection failed, waiting 10s...")
-                        time.sleep(10)
+                        self.wait_retry("WiFi reconnection failed")
                         continue
                     self.reconnect_count += 1
-
-                    time.sleep(2)
-                    if not self.mqtt.connect():
-                        print("MQTT reconnection after WiFi failed")
-                        time.sleep(5)
-                        continue
+                    self.wifi_connected()
 
                 # Проверка MQTT
-                if not self.mqtt.is_connected():
+                if self.mqtt_enabled and not self.mqtt.is_connected():
                     print("\n[!] MQTT disconnected, reconnecting...")
-                    if not self.mqtt.connect():
-                        print("MQTT reconnection failed, waiting 10s...")
-                        time.sleep(10)
+                    self.wifi.mark_lost(wifi=False)
+                    if not self.connect_mqtt(max_attempts=1):
+                        self.wait_retry("MQTT reconnection failed")
                         continue
 
+                # Конфигурация, пришедшая между циклами
+                if self.mqtt_enabled:
+                    self.mqtt.poll_messages()
+
                 # Сбор метрик
-                metrics = self.metrics.get_all_metrics(
-                    reconnect_count=self.reconnect_count, error_count=self.error_count
-                )
-
-                # Вывод основных метрик
-                print(f"\n--- Metrics at {time.time()} ---")
-                print(
-                    f"Health: {metrics.get('health_status')} (score: {metrics.get('health_score')})"
-                )
-                print(
-                    f"Temp: {metrics.get('temperature_celsius')}°C (max: {metrics.get('cpu_temp_max_celsius')}°C)"
-                )
-                print(
-                    f"Memory: {metrics.get('memory_usage_percent')}% (fragmentation: {metrics.get('memory_fragmentation')}%)"
-                )
-                print(
-                    f"WiFi: {metrics.get('wifi_signal_quality_percent')}% ({metrics.get('wifi_rssi_dbm')} dBm)"
-                )
-                print(f"Battery: {metrics.get('battery_percent')}% ({metrics.get('power_source')})")
-                print(f"MQTT Success Rate: {metrics.get('mqtt_publish_success_rate')}%")
-                print(f"Uptime: {metrics.get('uptime_seconds')}s")
-
-                # Публикация с записью результата
-                if self.mqtt.publish(metrics):
-                    self.error_count = 0
-                    self.metrics.record_mqtt_publish(success=True)
-                    print("✓ Published successfully")
-                else:
-                    self.error_count += 1
-                    self.metrics.record_mqtt_publish(success=False)
-                    print(f"✗ Publish failed (error count: {self.error_count})")
-
-                    if self.error_count >= 3:
-                        print("Too many errors, forcing reconnection...")
-                        self.mqtt.disconnect()
-                        time.sleep(5)
-                        continue
+                metrics = self.collect_metrics()
 
-                time.sleep(PUBLISH_INTERVAL)
+                self.print_summary(metrics)
+                if self.mqtt_enabled and not self.process_sample(metrics):
+                    continue
+
+                self.idle(metrics)
 
             except MemoryError as e:
                 print(f"\n[!] Memory Error: {e}")
                 import gc
 
-                gc.collect()
-                print(f"Memory freed: {gc.mem_free()} bytes available")
-                time.sleep(5)
+                pause_us = self.metrics.memory.collect()
+                print(f"Memory freed: {gc.mem_free()} bytes available (GC pause {pause_us} us)")
+                self.pause(5000)
 
             except Exception as e:
                 print(f"\n[!] Unexpected Error: {e}")
                 self.error_count += 1
                 self.metrics.record_mqtt_publish(success=False)
                 self.mqtt.disconnect()
-                time.sleep(5)
+                self.pause(5000)
 
 
 def main():
     """Точка входа."""
+    monitor = None
     try:
         print("\n" + "=" * 50)
         print("Raspberry Pi Pico W Monitoring System")
@@ -141,7 +572,22 @@ def main():
 
         monitor = PicoMonitor()
 
-        if monitor.setup():
+        if RUNTIME_MODE == "dual":
+            # Замер на ядре 1 не ждёт подключений и записи в сокет на ядре 0
+            from dual_core import DualCoreRuntime
+
+            DualCoreRuntime(monitor, ring_size=SAMPLE_QUEUE_SIZE).run()
+        elif RUNTIME_MODE == "async":
+            # Подключения ведут фоновые задачи, сэмплирование не ждёт сеть
+            from async_runtime import AsyncRuntime
+
+            AsyncRuntime(
+                monitor,
+                queue_size=SAMPLE_QUEUE_SIZE,
+                # С MQTTLink опрос частый: он же вычитывает PUBACK и следит за пингами
+                ping_interval_ms=1000 if monitor.mqtt.link is not None else 30000,
+            ).run()
+        elif monitor.setup():
             monitor.run()
         else:
             print("\n[FATAL] Initialization failed!")
@@ -150,15 +596,20 @@ def main():
             print("  2. MQTT broker is running")
             print("  3. Network connectivity")
             print("\nRebooting in 30 seconds...")
+            monitor.save_state(planned=True)
             time.sleep(30)
             machine.reset()
 
     except KeyboardInterrupt:
         print("\n\n[*] Stopped by user")
+        if monitor is not None:
+            monitor.save_state(planned=True)
 
     except Exception as e:
         print(f"\n[CRITICAL ERROR] {e}")
         print("Rebooting in 10 seconds...")
+        if monitor is not None:
+            monitor.save_state(planned=True)
         time.sleep(10)
         machine.reset()
 
@@ -0,0 +1,115 @@
+"""Диагностика памяти: паузы GC и оценка фрагментации кучи."""
+
+import gc
+import time
+
+from metric_registry import percent_x100
+
+
+class MemoryDiagnostics:
+    def __init__(
+        self,
+        probe_every: int = 10,
+        change_threshold: int = 8192,
+        max_probes: int = 8,
+        resolution: int = 256,
+    ):
+        self.probe_every = probe_every
+        self.change_threshold = change_threshold
+        self.max_probes = max_probes
+        self.resolution = resolution
+
+        # Сборщик мусора
+        self.gc_collections = 0
+        self.gc_pause_us = 0
+        self.gc_pause_max_us = 0
+        self.gc_interval = 0
+        self.last_gc_time = time.time()
+
+        # Кэш последнего замера фрагментации
+        self.largest_free_block = 0
+        # Фрагментация в сотых долях процента (-100 - замер не удался)
+        self.fragmentation_x100 = 0
+        self.probe_count = 0
+        self._cycles_since_probe = probe_every
+        self._alloc_at_probe = 0
+
+    def collect(self) -> int:
+        """gc.collect() с замером паузы в микросекундах."""
+        start = time.ticks_us()
+        gc.collect()
+        pause = time.ticks_diff(time.ticks_us(), start)
+
+        self.gc_collections += 1
+        self.gc_pause_us = pause
+        self.gc_pause_max_us = max(self.gc_pause_max_us, pause)
+
+        current_time = time.time()
+        self.gc_interval = current_time - self.last_gc_time
+        self.last_gc_time = current_time
+        return pause
+
+    def _fits(self, size: int) -> bool:
+        """Можно ли выделить непрерывный блок заданного размера."""
+        try:
+            block = bytearray(size)
+        except MemoryError:
+            return False
+        del block
+        return True
+
+    def _probe_largest_block(self, free_mem: int) -> int:
+        """Ограниченный двоичный поиск самого большого свободного блока.
+
+        Поиск стартует от прошлого значения, поэтому при стабильной куче
+        хватает пары проб. При нехватке памяти MicroPython сам запускает
+        сборку и повторяет выделение, так что мусор от предыдущих проб
+        не занижает результат.
+        """
+        low, high = 0, free_mem
+        probes = 0
+
+        cached = self.largest_free_block
+        if 0 < cached < free_mem:
+            if self._fits(cached):
+                low = cached
+            else:
+                high = cached
+            probes += 1
+
+        while high - low > self.resolution and probes < self.max_probes:
+            middle = (low + high) // 2
+            if self._fits(middle):
+                low = middle
+            else:
+                high = middle
+            probes += 1
+
+        return low
+
+    def maybe_probe(self, free_mem: int, allocated_mem: int) -> bool:
+        """Обновить оценку фрагментации раз в N циклов или при сильном изменении кучи.
+
+        probe_every=0 выключает замер.
+        """
+        if not self.probe_every:
+            return False
+        self._cycles_since_probe += 1
+        due = self._cycles_since_probe >= self.probe_every
+        changed = abs(allocated_mem - self._alloc_at_probe) >= self.change_threshold
+        if not (due or changed):
+            return False
+
+        try:
+            largest = self._probe_largest_block(free_mem)
+        except Exception:
+            self.fragmentation_x100 = -100
+            return False
+
+        self.largest_free_block = largest
+        self.fragmentation_x100 = percent_x100(free_mem - largest, free_mem)
+
+        self.probe_count += 1
+        self._cycles_since_probe = 0
+        self._alloc_at_probe = allocated_mem
+        return True
@@ -0,0 +1,431 @@
+"""Реестр метрик с фиксированными слотами и сериализация в переиспользуемый буфер.
+
+Каждое имя метрики получает слот один раз: поля бинарной схемы - при старте,
+остальные - при первой записи. Значения лежат в array('i') целыми числами,
+умноженными на множитель схемы (как в бинарном payload), перечисления -
+индексом. Сборщики пишут в слоты на месте, JSON и текст OpenMetrics для
+/metrics собираются цифрами прямо в bytearray: нет промежуточных словарей
+сборщиков, float-объектов и строки ujson.dumps. Память в цикле по-прежнему
+выделяют словари get_stats() внешних компонентов и отладочный вывод.
+
+Для остального кода реестр выглядит как словарь только для чтения:
+get(), items(), len(), in. Поля бинарной схемы занимают первые слоты
+в порядке FIELDS, поэтому бинарный кодировщик берёт их по индексу поля.
+"""
+
+from array import array
+
+from payload_schema import ENUMS, FIELDS
+
+# Множитель для полей вне схемы с дробными значениями: два знака после точки
+DEFAULT_FLOAT_SCALE = 100
+
+COMMA = 0x2C
+MINUS = 0x2D
+DOT = 0x2E
+ZERO = 0x30
+NEWLINE = 0x0A
+
+
+def percent_x100(part: int, whole: int) -> int:
+    """part / whole в сотых долях процента без выхода за small int."""
+    if whole <= 0:
+        return 0
+    percent = part * 100 // whole
+    return percent * 100 + (part * 100 - percent * whole) * 100 // whole
+
+
+class MetricReader:
+    """Чтение значений реестра по маске присутствия (общее для реестра и дельты)."""
+
+    def _decode(self, slot: int):
+        registry = self.registry
+        raw = self.values[slot]
+        enum = registry.enums[slot]
+        if enum is not None:
+            return enum[raw] if 0 <= raw < len(enum) else None
+        scale = registry.scales[slot]
+        return raw if scale == 1 else raw / scale
+
+    def get(self, key: str, default=None):
+        slot = self.registry.index.get(key)
+        if slot is None or not self.present[slot]:
+            return default
+        return self._decode(slot)
+
+    def __getitem__(self, key: str):
+        slot = self.registry.index.get(key)
+        if slot is None or not self.present[slot]:
+            raise KeyError(key)
+        return self._decode(slot)
+
+    def __contains__(self, key: str) -> bool:
+        slot = self.registry.index.get(key)
+        return slot is not None and bool(self.present[slot])
+
+    def __len__(self) -> int:
+        count = 0
+        present = self.present
+        for slot in range(len(present)):
+            if present[slot]:
+                count += 1
+        return count
+
+    def keys(self):
+        names = self.registry.names
+        present = self.present
+        for slot in range(len(present)):
+            if present[slot]:
+                yield names[slot]
+
+    def items(self):
+        names = self.registry.names
+        present = self.present
+        for slot in range(len(present)):
+            if present[slot]:
+                yield names[slot], self._decode(slot)
+
+    def __iter__(self):
+        return self.keys()
+
+
+class MetricRegistry(MetricReader):
+    def __init__(self, fields=FIELDS):
+        self.registry = self
+        self.index = {}
+        self.names = []
+        self.scales = []
+        self.enums = []
+        # Готовые фрагменты JSON: '"имя":' и '"значение"' для перечислений
+        self.json_keys = []
+        self.json_enums = []
+        self.values = array("i")
+        self.present = bytearray()
+        # Что пишется в present: 1 или номер сборщика (collector_schedule),
+        # слот присутствует при любом ненулевом значении
+        self.source = 1
+        # Замороженный реестр не растёт из set(): списки слотов читает другое
+        # ядро, новые имена объявляет владелец через declare_value()
+        self.frozen = False
+        for key, _, scale in fields:
+            self.declare(key, scale)
+
+    def declare(self, key: str, scale: int = 1) -> int:
+        """Слот метрики; новые имена объявляются один раз."""
+        slot = self.index.get(key)
+        if slot is not None:
+            return slot
+        slot = len(self.names)
+        self.index[key] = slot
+        self.names.append(key)
+        self.scales.append(scale)
+        enum = ENUMS.get(key)
+        self.enums.append(enum)
+        self.json_keys.append(('"' + key + '":').encode())
+        self.json_enums.append(
+            tuple(('"' + value + '"').encode() for value in enum) if enum else None
+        )
+        self.values.append(0)
+        self.present.append(0)
+        return slot
+
+    def clear(self):
+        """Начать новый сэмпл: все слоты отсутствуют."""
+        present = self.present
+        for slot in range(len(present)):
+            present[slot] = 0
+
+    def put(self, slot: int, raw: int):
+        """Записать уже масштабированное целое (горячий путь сборщиков)."""
+        self.values[slot] = raw
+        self.present[slot] = self.source
+
+    def declare_value(self, key: str, value):
+        """Слот метрики с масштабом по типу значения; None - значение не метрика."""
+        slot = self.index.get(key)
+        if slot is not None:
+            return slot
+        # Строки вне перечислений схемы в сэмпл не попадают (для них есть /info)
+        if isinstance(value, str) and key not in ENUMS:
+            return None
+        scale = 1 if isinstance(value, (int, str)) else DEFAULT_FLOAT_SCALE
+        return self.declare(key, scale)
+
+    def set(self, key: str, value):
+        """Записать значение по имени с масштабированием (для редких и внешних метрик)."""
+        if value is None:
+            return
+        slot = self.index.get(key)
+        if slot is None:
+            if self.frozen:
+                return
+            slot = self.declare_value(key, value)
+            if slot is None:
+                return
+        enum = self.enums[slot]
+        if enum is not None:
+            raw = enum.index(value) if value in enum else len(enum)
+        else:
+            scale = self.scales[slot]
+            raw = value if scale == 1 and isinstance(value, int) else int(round(value * scale))
+        self.values[slot] = raw
+        self.present[slot] = self.source
+
+    def update(self, metrics: dict):
+        for key, value in metrics.items():
+            self.set(key, value)
+
+
+class MetricView(MetricReader):
+    """Подмножество слотов реестра (например, изменившиеся метрики для дельты)."""
+
+    def __init__(self, registry: MetricRegistry):
+        self.registry = registry
+        self.values = registry.values
+        self.present = bytearray(len(registry.names))
+
+    def reset(self, source: MetricReader = None):
+        """Пустая маска нужного размера (реестр мог вырасти) над значениями source."""
+        if source is not None:
+            self.values = source.values
+        present = self.present
+        while len(present) < len(self.registry.names):
+            present.append(0)
+        for slot in range(len(present)):
+            present[slot] = 0
+
+
+class MetricSnapshot(MetricReader):
+    """Отдельные значения с раскладкой слотов реестра (очередь между задачами, черновики)."""
+
+    def __init__(self, registry: MetricRegistry):
+        self.registry = registry
+        self.index = registry.index
+        self.values = array("i")
+        self.present = bytearray()
+
+    def _grow(self):
+        values = self.values
+        present = self.present
+        while len(present) < len(self.registry.names):
+            values.append(0)
+            present.append(0)
+
+    def clear(self):
+        self._grow()
+        present = self.present
+        for slot in range(len(present)):
+            present[slot] = 0
+
+    def put(self, slot: int, raw: int):
+        self.values[slot] = raw
+        self.present[slot] = 1
+
+    def copy_from(self, source: MetricReader):
+        """Скопировать значения на место; память выделяется, только пока реестр растёт."""
+        self._grow()
+        values = self.values
+        present = self.present
+        source_values = source.values
+        source_present = source.present
+        for slot in range(len(source_present)):
+            values[slot] = source_values[slot]
+            present[slot] = source_present[slot]
+        return self
+
+
+def _copy(view, position: int, data) -> int:
+    end = position + len(data)
+    view[position:end] = data
+    return end
+
+
+def _write_int(buffer, position: int, value: int) -> int:
+    """Десятичная запись целого без создания строки."""
+    if value < 0:
+        buffer[position] = MINUS
+        position += 1
+        value = -value
+    end = position
+    rest = value
+    while True:
+        end += 1
+        rest //= 10
+        if not rest:
+            break
+    i = end
+    while True:
+        i -= 1
+        buffer[i] = ZERO + value % 10
+        value //= 10
+        if not value:
+            break
+    return end
+
+
+def _write_scaled(buffer, position: int, raw: int, scale: int) -> int:
+    """raw / scale с точкой; хвостовые нули дробной части отбрасываются."""
+    if raw < 0:
+        buffer[position] = MINUS
+        position += 1
+        raw = -raw
+    position = _write_int(buffer, position, raw // scale)
+    fraction = raw % scale
+    if not fraction:
+        return position
+    buffer[position] = DOT
+    position += 1
+    digits = scale // 10
+    while fraction:
+        buffer[position] = ZERO + fraction // digits
+        position += 1
+        fraction %= digits
+        digits //= 10
+    return position
+
+
+class JSONWriter:
+    """Сериализация реестра (или его подмножества) в JSON в переиспользуемый bytearray."""
+
+    # Запас на значение: знак, 10 цифр, точка, дробная часть, запятая
+    VALUE_RESERVE = 24
+
+    def __init__(self, size: int = 0):
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.slots = -1
+
+    def _ensure_capacity(self, registry: MetricRegistry):
+        """Буфер под все слоты реестра; перевыделяется, только пока реестр растёт."""
+        if self.slots == len(registry.names):
+            return
+        size = 2
+        for slot in range(len(registry.names)):
+            size += len(registry.json_keys[slot]) + self.VALUE_RESERVE
+            enum = registry.json_enums[slot]
+            if enum is not None:
+                size += max(len(value) for value in enum)
+        if size > len(self.buffer):
+            self.buffer = bytearray(size)
+            self.view = memoryview(self.buffer)
+        self.slots = len(registry.names)
+
+    def render(self, metrics: MetricReader) -> memoryview:
+        registry = metrics.registry
+        self._ensure_capacity(registry)
+        buffer = self.buffer
+        view = self.view
+        values = metrics.values
+        present = metrics.present
+        scales = registry.scales
+        json_keys = registry.json_keys
+        json_enums = registry.json_enums
+
+        buffer[0] = 0x7B
+        position = 1
+        for slot in range(len(present)):
+            if not present[slot]:
+                continue
+            if position > 1:
+                buffer[position] = COMMA
+                position += 1
+            position = _copy(view, position, json_keys[slot])
+            raw = values[slot]
+            enum = json_enums[slot]
+            if enum is not None:
+                if 0 <= raw < len(enum):
+                    position = _copy(view, position, enum[raw])
+                else:
+                    position = _copy(view, position, b"null")
+            elif scales[slot] == 1:
+                position = _write_int(buffer, position, raw)
+            else:
+                position = _write_scaled(buffer, position, raw, scales[slot])
+        buffer[position] = 0x7D
+        return self.view[: position + 1]
+
+
+class OpenMetricsWriter:
+    """Текст OpenMetrics для скрейпа Prometheus в переиспользуемый bytearray.
+
+    Имена как у экспортёра (mqtt_<метрика>), поэтому дашборд и правила записи
+    работают без правок; перечисления - gauge с меткой состояния, *_total - counter.
+    """
+
+    VALUE_RESERVE = 24
+    EOF_LINE = b"# EOF\n"
+
+    def __init__(self, prefix: str = "mqtt_", labels: str = ""):
+        self.prefix = prefix
+        self.labels = labels
+        self.buffer = bytearray(0)
+        self.view = memoryview(self.buffer)
+        # По слоту: (строка TYPE, префиксы сэмплов "имя{метки} ")
+        self.families = []
+        self.slots = -1
+
+    def _family(self, registry: MetricRegistry, slot: int):
+        key = registry.names[slot]
+        name = self.prefix + key
+        enum = registry.enums[slot]
+        if enum is not None:
+            labels = self.labels + "," if self.labels else ""
+            samples = tuple(
+                (name + "{" + labels + key + '="' + state + '"} ').encode() for state in enum
+            )
+            return ("# TYPE " + name + " gauge\n").encode(), samples
+        labels = "{" + self.labels + "}" if self.labels else ""
+        if key.endswith("_total"):
+            family = name[: -len("_total")]
+            return ("# TYPE " + family + " counter\n").encode(), ((name + labels + " ").encode(),)
+        return ("# TYPE " + name + " gauge\n").encode(), ((name + labels + " ").encode(),)
+
+    def _ensure_capacity(self, registry: MetricRegistry):
+        if self.slots == len(registry.names):
+            return
+        families = self.families
+        for slot in range(len(families), len(registry.names)):
+            families.append(self._family(registry, slot))
+        size = len(self.EOF_LINE)
+        for header, samples in families:
+            size += len(header)
+            for sample in samples:
+                size += len(sample) + self.VALUE_RESERVE
+        if size > len(self.buffer):
+            self.buffer = bytearray(size)
+            self.view = memoryview(self.buffer)
+        self.slots = len(registry.names)
+
+    def render(self, metrics: MetricReader) -> memoryview:
+        registry = metrics.registry
+        self._ensure_capacity(registry)
+        buffer = self.buffer
+        view = self.view
+        values = metrics.values
+        present = metrics.present
+        scales = registry.scales
+        families = self.families
+
+        position = 0
+        for slot in range(len(present)):
+            if not present[slot]:
+                continue
+            header, samples = families[slot]
+            position = _copy(view, position, header)
+            raw = values[slot]
+            if registry.enums[slot] is not None:
+                for state in range(len(samples)):
+                    position = _copy(view, position, samples[state])
+                    buffer[position] = ZERO + (state == raw)
+                    buffer[position + 1] = NEWLINE
+                    position += 2
+                continue
+            position = _copy(view, position, samples[0])
+            if scales[slot] == 1:
+                position = _write_int(buffer, position, raw)
+            else:
+                position = _write_scaled(buffer, position, raw, scales[slot])
+            buffer[position] = NEWLINE
+            position += 1
+        position = _copy(view, position, self.EOF_LINE)
+        return view[:position]
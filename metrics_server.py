@@ -0,0 +1,211 @@
+"""Endpoint /metrics (OpenMetrics) прямо на Pico, без брокера и экспортёра.
+
+Неблокирующий сервер на одном слушающем сокете: accept, чтение запроса и
+отправка ответа никогда не ждут сеть, обслуживание идёт из паузы основного
+цикла (serve) или задачи uasyncio (poll). Текст рендерится из реестра
+в переиспользуемый буфер при первом скрейпе после сэмпла, остальные скрейпы
+до следующего сэмпла отдают его из кэша.
+"""
+
+import select
+import socket
+import time
+
+from metric_registry import OpenMetricsWriter
+
+CONTENT_TYPE = b"application/openmetrics-text; version=1.0.0; charset=utf-8"
+NOT_FOUND = b"HTTP/1.0 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+# До первого сэмпла отдавать нечего: Prometheus отметит up=0, а не пустой ответ
+UNAVAILABLE = b"HTTP/1.0 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+# Запрос длиннее не читается дальше: для GET /metrics хватает первой строки
+REQUEST_LIMIT = 512
+
+
+class _Client:
+    def __init__(self, sock, deadline):
+        self.sock = sock
+        self.deadline = deadline
+        self.request = b""
+        # Очередь частей ответа и смещение в текущей
+        self.parts = None
+        self.offset = 0
+
+
+class MetricsServer:
+    def __init__(
+        self,
+        port: int = 9100,
+        max_clients: int = 2,
+        request_timeout_ms: int = 2000,
+        poll_ms: int = 50,
+        labels: str = "",
+    ):
+        self.port = port
+        self.max_clients = max_clients
+        self.request_timeout_ms = request_timeout_ms
+        self.poll_ms = poll_ms
+        self.writer = OpenMetricsWriter(labels=labels)
+        self.sock = None
+        self.poller = None
+        self.clients = []
+
+        # Сэмпл для рендера и кэш текста
+        self.metrics = None
+        self.dirty = False
+        self.header = b""
+        self.body = b""
+
+        self.scrapes_total = 0
+        self.renders_total = 0
+        self.errors_total = 0
+        self.render_us = 0
+
+    def start(self) -> bool:
+        """Открыть слушающий сокет; повторный вызов ничего не делает."""
+        if self.sock is not None:
+            return True
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(socket.getaddrinfo("0.0.0.0", self.port)[0][-1])
+            sock.listen(self.max_clients)
+            sock.setblocking(False)
+        except OSError as e:
+            print(f"Metrics HTTP server failed to start: {e}")
+            return False
+        self.sock = sock
+        self.poller = select.poll()
+        self.poller.register(sock, select.POLLIN)
+        print(f"Serving /metrics on port {self.port}")
+        return True
+
+    def stop(self):
+        for client in self.clients:
+            client.sock.close()
+        self.clients = []
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def update(self, metrics):
+        """Новый сэмпл: кэш устарел, текст перестроится при следующем скрейпе."""
+        self.metrics = metrics
+        self.dirty = True
+
+    def _render(self):
+        started = time.ticks_us()
+        self.body = self.writer.render(self.metrics)
+        self.header = (
+            b"HTTP/1.0 200 OK\r\nContent-Type: "
+            + CONTENT_TYPE
+            + b"\r\nContent-Length: "
+            + str(len(self.body)).encode()
+            + b"\r\nConnection: close\r\n\r\n"
+        )
+        self.dirty = False
+        self.renders_total += 1
+        self.render_us = time.ticks_diff(time.ticks_us(), started)
+
+    def _respond(self, client):
+        line = client.request.split(b"\r\n", 1)[0].split(b" ")
+        if len(line) < 2 or line[0] not in (b"GET", b"HEAD") or not line[1].startswith(b"/metrics"):
+            client.parts = (NOT_FOUND,)
+            return
+        if self.metrics is None:
+            client.parts = (UNAVAILABLE,)
+            return
+        # Пока другой клиент дочитывает текст, буфер не переписывается
+        if self.dirty:
+            if not any(other.parts is not None for other in self.clients):
+                self._render()
+        self.scrapes_total += 1
+        if line[0] == b"HEAD":
+            client.parts = (self.header,)
+        else:
+            client.parts = (self.header, self.body)
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self.sock.accept()
+            except OSError:
+                return
+            if len(self.clients) >= self.max_clients:
+                sock.close()
+                self.errors_total += 1
+                continue
+            sock.setblocking(False)
+            deadline = time.ticks_add(time.ticks_ms(), self.request_timeout_ms)
+            self.clients.append(_Client(sock, deadline))
+            self.poller.register(sock, select.POLLIN)
+
+    def _service(self, client) -> bool:
+        """Продвинуть одно соединение; True - обслужено и закрывается."""
+        if client.parts is None:
+            try:
+                data = client.sock.recv(REQUEST_LIMIT)
+            except OSError:
+                return False
+            if not data:
+                return True
+            client.request += data
+            if b"\r\n\r\n" not in client.request and len(client.request) < REQUEST_LIMIT:
+                return False
+            self._respond(client)
+            self.poller.modify(client.sock, select.POLLOUT)
+
+        while client.parts:
+            part = client.parts[0]
+            try:
+                sent = client.sock.send(part[client.offset :])
+            except OSError:
+                return False
+            client.offset += sent
+            if client.offset < len(part):
+                return False
+            client.parts = client.parts[1:]
+            client.offset = 0
+        return True
+
+    def poll(self) -> int:
+        """Обслужить готовые соединения без ожидания; число закрытых соединений."""
+        if self.sock is None:
+            return 0
+        self._accept()
+        closed = 0
+        now = time.ticks_ms()
+        for client in list(self.clients):
+            done = self._service(client)
+            if not done and time.ticks_diff(now, client.deadline) > 0:
+                self.errors_total += 1
+                done = True
+            if done:
+                self.poller.unregister(client.sock)
+                client.sock.close()
+                self.clients.remove(client)
+                closed += 1
+        return closed
+
+    def serve(self, timeout_ms: int):
+        """Пауза основного цикла: ждать соединений и обслуживать их timeout_ms."""
+        if self.sock is None:
+            time.sleep_ms(timeout_ms)
+            return
+        deadline = time.ticks_add(time.ticks_ms(), timeout_ms)
+        while True:
+            remaining = time.ticks_diff(deadline, time.ticks_ms())
+            if remaining <= 0:
+                return
+            # Открытые соединения тоже в poller: ждать дольше их таймаута нельзя
+            wait = min(remaining, self.request_timeout_ms) if self.clients else remaining
+            self.poller.poll(wait)
+            self.poll()
+
+    def get_stats(self) -> dict:
+        return {
+            "metrics_http_scrapes_total": self.scrapes_total,
+            "metrics_http_renders_total": self.renders_total,
+            "metrics_http_errors_total": self.errors_total,
+            "metrics_http_render_us": self.render_us,
+        }
@@ -0,0 +1,186 @@
+"""Живость соединения MQTT и конвейерная публикация QoS 1 поверх umqtt.simple.
+
+umqtt.simple в publish(qos=1) ждёт PUBACK на каждое сообщение, а PINGRESP
+молча проглатывает в check_msg(). Здесь PUBLISH пишется в сокет клиента
+напрямую, подтверждения вычитываются без блокировки, в полёте держится не
+больше window сообщений. PINGREQ отправляется при тишине со стороны брокера;
+нет ответа за ping_timeout - соединение считается мёртвым. Неподтверждённые
+сообщения переживают переподключение и отправляются повторно с флагом DUP.
+"""
+
+import time
+
+PUBLISH = 0x30
+PUBACK = 0x40
+PINGREQ = b"\xc0\x00"
+
+# Поля записи в окне неподтверждённых сообщений
+PID = 0
+TOPIC = 1
+PAYLOAD = 2
+RETAIN = 3
+SENT = 4
+
+
+class MQTTLink:
+    def __init__(self, window: int = 8, ping_interval_ms: int = 15000, ping_timeout_ms: int = 5000):
+        self.window = window
+        self.ping_interval_ms = ping_interval_ms
+        self.ping_timeout_ms = ping_timeout_ms
+        self.client = None
+        self.sock = None
+        self.inflight = []
+        self.pid = 0
+        self.last_rx = time.ticks_ms()
+        self.ping_sent = None
+
+        self.acked_total = 0
+        self.redelivered_total = 0
+        self.link_lost_total = 0
+        self.window_full_total = 0
+        self.detect_ms = 0
+        self.ack_rtt_ms = 0
+
+    def attach(self, client):
+        """Новое подключение: повторно отправить всё неподтверждённое с флагом DUP."""
+        self.client = client
+        self.sock = client.sock
+        self.last_rx = time.ticks_ms()
+        self.ping_sent = None
+        for entry in self.inflight:
+            entry[SENT] = time.ticks_ms()
+            self._send(entry, dup=True)
+            self.redelivered_total += 1
+
+    def detach(self):
+        self.client = None
+        self.sock = None
+
+    def _send(self, entry, dup: bool = False):
+        topic, payload = entry[TOPIC], entry[PAYLOAD]
+        header = PUBLISH | 0x02 | (0x08 if dup else 0) | (0x01 if entry[RETAIN] else 0)
+        remaining = 2 + len(topic) + 2 + len(payload)
+        packet = bytearray(9)
+        packet[0] = header
+        i = 1
+        while remaining > 0x7F:
+            packet[i] = (remaining & 0x7F) | 0x80
+            remaining >>= 7
+            i += 1
+        packet[i] = remaining
+        i += 1
+        packet[i] = len(topic) >> 8
+        packet[i + 1] = len(topic) & 0xFF
+        sock = self.sock
+        sock.write(packet, i + 2)
+        sock.write(topic)
+        sock.write(bytes((entry[PID] >> 8, entry[PID] & 0xFF)))
+        sock.write(payload)
+
+    def publish(self, topic: bytes, payload, retain: bool = False):
+        """QoS 1 без ожидания PUBACK; при заполненном окне - ждать освобождения места."""
+        if len(self.inflight) >= self.window:
+            self.window_full_total += 1
+            started = time.ticks_ms()
+            while len(self.inflight) >= self.window:
+                if not self.poll():
+                    raise OSError("MQTT link lost")
+                if time.ticks_diff(time.ticks_ms(), started) > self.ping_timeout_ms:
+                    raise OSError("PUBACK timeout")
+                time.sleep_ms(5)
+
+        self.pid = self.pid % 65535 + 1
+        # Буфер кодировщика переиспользуется, для повторной отправки нужна копия
+        payload = payload.encode() if isinstance(payload, str) else bytes(payload)
+        entry = [self.pid, topic, payload, retain, time.ticks_ms()]
+        self.inflight.append(entry)
+        self._send(entry)
+
+    def _read_length(self) -> int:
+        length = 0
+        shift = 0
+        while True:
+            byte = self.sock.read(1)[0]
+            length |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                return length
+            shift += 7
+
+    def _handle(self, op: int):
+        size = self._read_length()
+        data = self.sock.read(size) if size else b""
+        if op == PUBACK:
+            pid = data[0] << 8 | data[1]
+            for i in range(len(self.inflight)):
+                entry = self.inflight[i]
+                if entry[PID] == pid:
+                    self.ack_rtt_ms = time.ticks_diff(time.ticks_ms(), entry[SENT])
+                    self.acked_total += 1
+                    self.inflight.pop(i)
+                    break
+        elif op & 0xF0 == PUBLISH:
+            # Входящее сообщение подписки: разбор как в umqtt.simple
+            topic_length = data[0] << 8 | data[1]
+            topic = data[2 : 2 + topic_length]
+            offset = 2 + topic_length
+            if op & 0x06:
+                self.sock.write(b"\x40\x02" + data[offset : offset + 2])
+                offset += 2
+            if self.client.cb is not None:
+                self.client.cb(topic, data[offset:])
+
+    def poll(self) -> bool:
+        """Вычитать пришедшие пакеты и при необходимости отправить PINGREQ.
+
+        False - соединение мёртво (нет ответа на пинг или ошибка сокета).
+        """
+        if self.sock is None:
+            return False
+        sock = self.sock
+        try:
+            while True:
+                sock.setblocking(False)
+                op = sock.read(1)
+                sock.setblocking(True)
+                if op is None:
+                    break
+                if op == b"":
+                    raise OSError("connection closed")
+                # Любой пакет от брокера подтверждает, что соединение живо
+                self.last_rx = time.ticks_ms()
+                self.ping_sent = None
+                self._handle(op[0])
+
+            now = time.ticks_ms()
+            if self.ping_sent is not None:
+                if time.ticks_diff(now, self.ping_sent) > self.ping_timeout_ms:
+                    raise OSError("no PINGRESP")
+            elif time.ticks_diff(now, self.last_rx) >= self.ping_interval_ms or (
+                self.inflight
+                and time.ticks_diff(now, self.inflight[0][SENT]) > self.ping_timeout_ms
+            ):
+                sock.write(PINGREQ)
+                self.ping_sent = now
+            return True
+
+        except OSError as e:
+            self.link_lost_total += 1
+            self.detect_ms = time.ticks_diff(time.ticks_ms(), self.last_rx)
+            print(f"MQTT link lost: {e} (silent for {self.detect_ms} ms)")
+            try:
+                sock.close()
+            except OSError:
+                pass
+            self.detach()
+            return False
+
+    def get_stats(self) -> dict:
+        return {
+            "mqtt_inflight": len(self.inflight),
+            "mqtt_acked_total": self.acked_total,
+            "mqtt_redelivered_total": self.redelivered_total,
+            "mqtt_window_full_total": self.window_full_total,
+            "mqtt_link_lost_total": self.link_lost_total,
+            "mqtt_link_detect_ms": self.detect_ms,
+            "mqtt_ack_rtt_ms": self.ack_rtt_ms,
+        }
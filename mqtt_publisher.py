@@ -4,31 +4,120 @@ import ujson
 import time
 from umqtt.simple import MQTTClient
 
+from payload_codec import BatchWriter, BinaryEncoder
+from mqtt_link import MQTTLink
+from metric_registry import JSONWriter, MetricReader
+
+
+STATUS_ONLINE = b"online"
+STATUS_OFFLINE = b"offline"
+
 
 class MQTTPublisher:
-    def __init__(self, server: str, port: int, client_id: str, topic: bytes):
+    def __init__(
+        self,
+        server: str,
+        port: int,
+        client_id: str,
+        topic: bytes,
+        info_provider=None,
+        encoder=None,
+        batch_size: int = 1,
+        batch_max_latency_ms: int = 0,
+        keepalive: int = 60,
+        qos: int = 0,
+        inflight_window: int = 8,
+        persistent_session: bool = False,
+        ping_interval_ms: int = 0,
+        ping_timeout_ms: int = 5000,
+        wait_ms=None,
+        feed=None,
+        socket_timeout_ms: int = 0,
+    ):
         self.server = server
         self.port = port
         self.client_id = client_id
+        self.keepalive = keepalive
+        # Пауза между попытками подключения (со сторожевым таймером - с кормлением)
+        self.wait_ms = wait_ms or time.sleep_ms
+        # Со сторожевым таймером: кормление перед каждым блокирующим шагом подключения
+        # и таймаут сокета короче WDT (connect и ожидание CONNACK/SUBACK)
+        self.feed = feed or (lambda: None)
+        self.socket_timeout_ms = socket_timeout_ms
+
+        # Пинги и/или QoS 1 с окном: живость соединения проверяется по ответам брокера,
+        # неподтверждённые сообщения переживают переподключение
+        self.qos = qos
+        self.clean_session = not persistent_session
+        self.link = None
+        if qos or ping_interval_ms:
+            self.link = MQTTLink(
+                window=inflight_window,
+                ping_interval_ms=ping_interval_ms or keepalive * 500,
+                ping_timeout_ms=ping_timeout_ms,
+            )
         self.topic = topic
         self.client = None
 
-    def connect(self) -> bool:
+        # Birth/LWT: <topic>/info - retained идентичность, <topic>/status - online/offline
+        self.info_topic = topic + b"/info"
+        self.status_topic = topic + b"/status"
+        self.info_provider = info_provider
+
+        # Пакеты сэмплов, накопленных во время обрыва связи
+        self.replay_topic = topic + b"/replay"
+
+        # Входящие команды и конфигурация: полный топик -> обработчик payload
+        self.subscriptions = {}
+
+        # Периодическая статистика профайлера (pico_profile_*)
+        self.profile_topic = topic + b"/profile"
+
+        # Пакетный режим: K сэмплов с временем и номером одним сообщением
+        self.batch = None
+        self.batch_topic = topic + b"/batch"
+        if batch_size > 1:
+            self.batch_encoder = encoder or BinaryEncoder()
+            self.batch = BatchWriter(batch_size, len(self.batch_encoder.buffer))
+            self.batch_max_latency_ms = batch_max_latency_ms
+            self.batch_started = 0
+
+        # Без encoder публикуется JSON, иначе - компактный бинарный payload
+        self.encoder = encoder
+        # JSON из реестра пишется в переиспользуемый буфер вместо строки ujson.dumps
+        self.json = JSONWriter() if encoder is None else None
+        self.data_topic = topic if encoder is None else topic + encoder.TOPIC_SUFFIX
+
+    def connect(self, max_attempts: int = 3) -> bool:
         """Подключение к MQTT брокеру с повторными попытками."""
         print(f"Connecting to MQTT at {self.server}:{self.port}...")
 
-        max_attempts = 3
         for attempt in range(max_attempts):
             try:
                 self.client = MQTTClient(
                     self.client_id,
                     self.server,
                     port=self.port,
-                    keepalive=60,
+                    keepalive=self.keepalive,
                 )
+                # Брокер сам отметит устройство offline при обрыве соединения
+                self.client.set_last_will(self.status_topic, STATUS_OFFLINE, retain=True)
 
-                self.client.connect(clean_session=True)
-                print("MQTT connected!")
+                self.feed()
+                if self.socket_timeout_ms:
+                    # umqtt.simple 1.4+: settimeout() до connect() нового сокета
+                    session_present = self.client.connect(
+                        clean_session=self.clean_session,
+                        timeout=self.socket_timeout_ms / 1000,
+                    )
+                else:
+                    session_present = self.client.connect(clean_session=self.clean_session)
+                print(f"MQTT connected! (session present: {bool(session_present)})")
+                self.feed()
+                self.publish_birth()
+                self.subscribe_all()
+                if self.link is not None:
+                    self.link.attach(self.client)
                 return True
 
             except OSError as e:
@@ -38,7 +127,7 @@ class MQTTPublisher:
                 if attempt < max_attempts - 1:
                     wait_time = (attempt + 1) * 2
                     print(f"Retrying in {wait_time} seconds...")
-                    time.sleep(wait_time)
+                    self.wait_ms(wait_time * 1000)
 
             except Exception as e:
                 print(f"Unexpected error during MQTT connection: {e}")
@@ -48,6 +137,50 @@ class MQTTPublisher:
         print("MQTT connection failed after all attempts")
         return False
 
+    def publish_birth(self):
+        """Retained birth-сообщение: статус online и статичная информация об устройстве."""
+        self.client.publish(self.status_topic, STATUS_ONLINE, retain=True)
+        if self.info_provider is not None:
+            payload = ujson.dumps(self.info_provider())
+            self.client.publish(self.info_topic, payload, retain=True)
+            print(f"Birth published: {payload}")
+
+    def subscribe(self, suffix: bytes, handler):
+        """Обработчик сообщений топика <topic><suffix>; подписка на каждом подключении."""
+        self.subscriptions[self.topic + suffix] = handler
+
+    def subscribe_all(self):
+        """Подписки после подключения; retained-сообщения приходят сразу."""
+        if not self.subscriptions:
+            return
+        self.client.set_callback(self._on_message)
+        for topic in self.subscriptions:
+            self.feed()
+            self.client.subscribe(topic)
+            print(f"Subscribed: {topic.decode()}")
+
+    def _on_message(self, topic, msg):
+        handler = self.subscriptions.get(bytes(topic))
+        if handler is None:
+            return
+        try:
+            handler(msg)
+        except Exception as e:
+            print(f"Message handler error ({bytes(topic).decode()}): {e}")
+
+    def poll_messages(self):
+        """Забрать входящие сообщения подписок без блокировки.
+
+        С MQTTLink сокет уже вычитывается в is_connected(), здесь ничего не нужно.
+        """
+        if self.client is None or not self.subscriptions or self.link is not None:
+            return
+        try:
+            self.client.check_msg()
+        except OSError as e:
+            print(f"MQTT receive error: {e}")
+            self.disconnect()
+
     def publish(self, data: dict) -> bool:
         """Публикация данных в MQTT."""
         if not self.client:
@@ -55,9 +188,12 @@ class MQTTPublisher:
             return False
 
         try:
-            payload = ujson.dumps(data)
-            self.client.publish(self.topic, payload)
-            print(f"Published: {payload}")
+            payload = self._serialize(data)
+            self._write(self.data_topic, payload)
+            if self.encoder is None:
+                print(f"Published: {len(payload)} bytes (json)")
+            else:
+                print(f"Published: {len(payload)} bytes (binary)")
             return True
 
         except OSError as e:
@@ -70,16 +206,126 @@ class MQTTPublisher:
             self.disconnect()
             return False
 
+    def _serialize(self, data: dict):
+        """Сериализация сэмпла в выбранный формат."""
+        if self.encoder is None:
+            if isinstance(data, MetricReader):
+                return self.json.render(data)
+            return ujson.dumps(data)
+        return self.encoder.encode(data)
+
+    def _write(self, topic: bytes, payload):
+        """Запись сообщения в сокет."""
+        if self.qos:
+            self.link.publish(topic, payload)
+            # Забрать уже пришедшие PUBACK, не дожидаясь следующего цикла
+            self.link.poll()
+        else:
+            self.client.publish(topic, payload)
+
+    def add_to_batch(self, data: dict, sequence: int, timestamp: int = None) -> bool:
+        """Добавить сэмпл в пакет; True, если пакет пора отправлять."""
+        if self.batch.count == 0:
+            self.batch_started = time.ticks_ms()
+        if timestamp is None:
+            timestamp = int(time.time())
+        self.batch.add(timestamp, sequence, self.batch_encoder.encode(data))
+        return self.batch_due()
+
+    def batch_due(self) -> bool:
+        """Пакет заполнен или истёк максимальный срок ожидания первого сэмпла."""
+        if self.batch.count == 0:
+            return False
+        if self.batch.count >= self.batch.max_records:
+            return True
+        return time.ticks_diff(time.ticks_ms(), self.batch_started) >= self.batch_max_latency_ms
+
+    def flush_batch(self) -> bool:
+        """Отправить накопленный пакет одним сообщением.
+
+        При ошибке пакет не сбрасывается: вызывающий код решает, переложить
+        записи в offline-буфер или повторить отправку.
+        """
+        if not self.client:
+            print("No MQTT client available")
+            return False
+
+        try:
+            payload = self.batch.finish(int(time.time()))
+            self._write(self.batch_topic, payload)
+            print(f"Published batch: {self.batch.count} samples, {len(payload)} bytes")
+            self.batch.reset()
+            return True
+
+        except Exception as e:
+            print(f"Batch publish error: {e}")
+            self.disconnect()
+            return False
+
+    def publish_replay(self, payload) -> bool:
+        """Публикация пакета отложенных сэмплов с их исходным временем."""
+        if not self.client:
+            return False
+
+        try:
+            self._write(self.replay_topic, payload)
+            print(f"Replayed batch: {len(payload)} bytes")
+            return True
+
+        except Exception as e:
+            print(f"Replay publish error: {e}")
+            self.disconnect()
+            return False
+
+    def publish_profile(self, stats: dict) -> bool:
+        """Публикация статистики профайлера в JSON."""
+        if not self.client:
+            return False
+
+        try:
+            self.client.publish(self.profile_topic, ujson.dumps(stats))
+            return True
+
+        except Exception as e:
+            print(f"Profile publish error: {e}")
+            self.disconnect()
+            return False
+
     def disconnect(self):
         """Отключение от MQTT брокера."""
         if self.client:
             try:
+                # Штатный DISCONNECT не вызывает LWT, поэтому статус ставим сами
+                self.client.publish(self.status_topic, STATUS_OFFLINE, retain=True)
                 self.client.disconnect()
                 print("MQTT disconnected")
             except:
                 pass
             self.client = None
+            if self.link is not None:
+                self.link.detach()
+
+    def ping(self):
+        """PINGREQ брокеру; ответ прошлого пинга вычитывается из сокета."""
+        if self.link is not None:
+            if not self.link.poll():
+                raise OSError("MQTT link lost")
+            return
+        self.client.check_msg()
+        self.client.ping()
 
     def is_connected(self) -> bool:
-        """Проверка наличия активного подключения."""
-        return self.client is not None
+        """Проверка подключения; с пингами - по ответам брокера, а не по наличию клиента."""
+        if self.client is None:
+            return False
+        if self.link is not None and not self.link.poll():
+            # Сокет уже закрыт, DISCONNECT не отправляем: брокер сам опубликует LWT
+            self.client = None
+            return False
+        return True
+
+    def get_link_stats(self) -> dict:
+        """Окно QoS 1, повторные отправки и время обнаружения разрыва."""
+        if self.link is None:
+            return {}
+        return self.link.get_stats()
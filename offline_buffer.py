@@ -0,0 +1,266 @@
+"""Store-and-forward буфер сэмплов на время обрыва WiFi/MQTT."""
+
+import struct
+import time
+
+import uos
+
+from payload_codec import BatchWriter, BinaryEncoder
+from payload_schema import RECORD_HEADER_FORMAT, RECORD_HEADER_SIZE
+
+SEGMENT_PREFIX = "offline_"
+SEGMENT_SUFFIX = ".bin"
+# Неудачных чтений сегмента подряд, после которых он считается потерянным
+READ_RETRIES = 3
+
+
+class OfflineBuffer:
+    def __init__(
+        self,
+        capacity: int = 64,
+        flash_segments: int = 0,
+        batch_size: int = 16,
+        batches_per_cycle: int = 2,
+        directory: str = "",
+    ):
+        self.encoder = BinaryEncoder()
+        self.slot_size = RECORD_HEADER_SIZE + len(self.encoder.buffer)
+
+        # Кольцо фиксированных слотов в RAM: объём известен заранее
+        self.capacity = capacity
+        self.slots = bytearray(capacity * self.slot_size)
+        self.view = memoryview(self.slots)
+        self.head = 0
+        self.count = 0
+
+        self.stored_total = 0
+        self.replayed_total = 0
+        self.dropped_total = 0
+
+        # Переполнение уходит на flash целыми сегментами (одна запись файла
+        # на заполненное кольцо), число сегментов ограничено. Для каждого
+        # сегмента помнится число записей: недочитанные считаются потерянными
+        self.flash_segments = flash_segments
+        self.directory = directory
+        self.segments = []
+        self.segment_records = []
+        self.segment_offset = 0
+        self.segment_replayed = 0
+        self.read_failures = 0
+        if flash_segments:
+            self._drop_previous_boot()
+
+        self.batch = BatchWriter(batch_size, len(self.encoder.buffer))
+        self.batches_per_cycle = batches_per_cycle
+
+    def memory_bytes(self) -> int:
+        """Зарезервированная память буфера."""
+        return len(self.slots) + len(self.batch.buffer) + len(self.encoder.buffer)
+
+    def pending(self) -> int:
+        """Сэмплы в RAM (сегменты на flash считаются отдельно)."""
+        return self.count
+
+    def has_pending(self) -> bool:
+        return self.count > 0 or len(self.segments) > 0
+
+    def _reserve_slot(self) -> int:
+        """Смещение свободного слота, при переполнении - сброс на flash или потеря старого."""
+        if self.count == self.capacity:
+            if self.flash_segments:
+                self._spill_to_flash()
+            else:
+                # Без flash теряем самый старый сэмпл
+                self.head = (self.head + 1) % self.capacity
+                self.count -= 1
+                self.dropped_total += 1
+
+        offset = ((self.head + self.count) % self.capacity) * self.slot_size
+        self.count += 1
+        self.stored_total += 1
+        return offset
+
+    def store(self, metrics: dict, sequence: int, timestamp: int = None):
+        """Сохранить сэмпл с его номером и временем снятия."""
+        if timestamp is None:
+            timestamp = int(time.time())
+
+        payload = self.encoder.encode(metrics)
+        offset = self._reserve_slot()
+        struct.pack_into(
+            RECORD_HEADER_FORMAT, self.slots, offset, timestamp, sequence, len(payload)
+        )
+        start = offset + RECORD_HEADER_SIZE
+        self.view[start : start + len(payload)] = payload
+
+    def store_record(self, record):
+        """Сохранить уже упакованную запись (например, из неотправленного пакета)."""
+        offset = self._reserve_slot()
+        self.view[offset : offset + len(record)] = record
+
+    def _record(self, index: int) -> memoryview:
+        """Запись по индексу от самой старой."""
+        offset = ((self.head + index) % self.capacity) * self.slot_size
+        length = struct.unpack_from(RECORD_HEADER_FORMAT, self.slots, offset)[2]
+        return self.view[offset : offset + RECORD_HEADER_SIZE + length]
+
+    def _segment_path(self, number: int) -> str:
+        return f"{self.directory}{SEGMENT_PREFIX}{number:04d}{SEGMENT_SUFFIX}"
+
+    def _scan_segments(self) -> list:
+        """Найти сегменты, оставшиеся на flash после перезагрузки."""
+        numbers = []
+        for name in uos.listdir(self.directory or "/"):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                try:
+                    numbers.append(int(name[len(SEGMENT_PREFIX) : -len(SEGMENT_SUFFIX)]))
+                except ValueError:
+                    pass
+        numbers.sort()
+        return numbers
+
+    def _count_records(self, path: str) -> int:
+        """Целые записи в файле сегмента (обрезанный хвост не считается)."""
+        count = 0
+        header = bytearray(RECORD_HEADER_SIZE)
+        try:
+            with open(path, "rb") as f:
+                while f.readinto(header) == RECORD_HEADER_SIZE:
+                    length = struct.unpack_from(RECORD_HEADER_FORMAT, header, 0)[2]
+                    if len(f.read(length)) != length:
+                        break
+                    count += 1
+        except OSError:
+            pass
+        return count
+
+    def _drop_previous_boot(self):
+        """Удалить сегменты прошлых загрузок.
+
+        Время записей - часы устройства без NTP, после сброса они идут заново,
+        а хост восстанавливает время по часам текущей загрузки: досланные
+        сэмплы легли бы на графики со сдвигом. Записи считаются потерянными.
+        """
+        for number in self._scan_segments():
+            path = self._segment_path(number)
+            dropped = self._count_records(path)
+            self.dropped_total += dropped
+            try:
+                uos.remove(path)
+            except OSError:
+                pass
+            print(f"Offline segment from previous boot dropped ({dropped} samples)")
+
+    def _remove_oldest_segment(self):
+        """Удалить самый старый сегмент; недосланные записи - в dropped_total."""
+        self.dropped_total += max(0, self.segment_records.pop(0) - self.segment_replayed)
+        try:
+            uos.remove(self._segment_path(self.segments.pop(0)))
+        except OSError:
+            pass
+        self.segment_offset = 0
+        self.segment_replayed = 0
+        self.read_failures = 0
+
+    def _spill_to_flash(self):
+        """Сбросить всё кольцо одним сегментом и освободить RAM."""
+        if len(self.segments) >= self.flash_segments:
+            self._remove_oldest_segment()
+
+        number = self.segments[-1] + 1 if self.segments else 0
+        try:
+            with open(self._segment_path(number), "wb") as f:
+                for index in range(self.count):
+                    f.write(self._record(index))
+            self.segments.append(number)
+            self.segment_records.append(self.count)
+        except OSError as e:
+            print(f"Offline flash write failed: {e}")
+            self.dropped_total += self.count
+
+        self.head = 0
+        self.count = 0
+
+    def _fill_from_flash(self) -> bool:
+        """Добавить в пакет записи из самого старого сегмента; True - сегмент исчерпан."""
+        path = self._segment_path(self.segments[0])
+        try:
+            with open(path, "rb") as f:
+                f.seek(self.segment_offset)
+                header = bytearray(RECORD_HEADER_SIZE)
+                while self.batch.count < self.batch.max_records:
+                    if f.readinto(header) != RECORD_HEADER_SIZE:
+                        return True
+                    length = struct.unpack_from(RECORD_HEADER_FORMAT, header, 0)[2]
+                    record = header + f.read(length)
+                    if len(record) != RECORD_HEADER_SIZE + length:
+                        # Обрезанная запись (сброс посреди записи файла) не досылается
+                        return True
+                    if not self.batch.add_record(record):
+                        return False
+                    self.segment_offset += len(record)
+                # Пакет заполнен: сегмент исчерпан, только если дальше ничего нет
+                return f.readinto(header) != RECORD_HEADER_SIZE
+        except OSError as e:
+            # Ошибка чтения flash бывает временной: сегмент остаётся до READ_RETRIES
+            self.read_failures += 1
+            print(f"Offline segment read failed ({self.read_failures}/{READ_RETRIES}): {e}")
+            if self.read_failures < READ_RETRIES:
+                return False
+            self.read_failures = 0
+            return True
+
+    def replay(self, publish) -> int:
+        """Отправить накопленное пакетами, не больше batches_per_cycle за вызов.
+
+        publish(payload) -> bool. Записи удаляются только после успешной
+        отправки, при ошибке повтор будет на следующем цикле.
+        """
+        sent = 0
+        for _ in range(self.batches_per_cycle):
+            if not self.has_pending():
+                break
+
+            self.batch.reset()
+            from_flash = len(self.segments) > 0
+            segment_done = False
+            if from_flash:
+                segment_start = self.segment_offset
+                segment_done = self._fill_from_flash()
+                if not self.batch.count and not segment_done:
+                    # Сегмент не прочитался: повтор на следующем цикле
+                    break
+            else:
+                while self.batch.count < self.count and self.batch.add_record(
+                    self._record(self.batch.count)
+                ):
+                    pass
+
+            count = self.batch.count
+            if count and not publish(self.batch.finish(int(time.time()))):
+                if from_flash:
+                    self.segment_offset = segment_start
+                break
+
+            if from_flash:
+                self.read_failures = 0
+                self.segment_replayed += count
+                if segment_done:
+                    self._remove_oldest_segment()
+            else:
+                self.head = (self.head + count) % self.capacity
+                self.count -= count
+
+            sent += count
+            self.replayed_total += count
+
+        return sent
+
+    def get_stats(self) -> dict:
+        """Метрики буфера для основного payload."""
+        return {
+            "offline_buffer_pending": self.count,
+            "offline_flash_segments": len(self.segments),
+            "offline_samples_replayed_total": self.replayed_total,
+            "offline_samples_dropped_total": self.dropped_total,
+        }
@@ -0,0 +1,160 @@
+"""Бинарное кодирование метрик в переиспользуемый буфер."""
+
+import struct
+
+from metric_registry import MetricReader
+from payload_schema import (
+    BATCH_HEADER_FORMAT,
+    BATCH_HEADER_SIZE,
+    BATCH_MAGIC,
+    BATCH_VERSION,
+    ENUM_UNKNOWN,
+    ENUMS,
+    FIELDS,
+    FORMAT_RANGES,
+    HEADER_FORMAT,
+    HEADER_SIZE,
+    MAGIC,
+    RECORD_HEADER_FORMAT,
+    RECORD_HEADER_SIZE,
+    SCHEMA_VERSION,
+    bitmap_size,
+)
+
+
+class BinaryEncoder:
+    # Бинарный поток идёт в отдельный топик, JSON-потребители его не видят
+    TOPIC_SUFFIX = b"/bin"
+
+    def __init__(self):
+        self.bitmap_size = bitmap_size(len(FIELDS))
+        self.data_offset = HEADER_SIZE + self.bitmap_size
+
+        # Предвычисленные параметры полей, чтобы не считать их на каждом цикле
+        self.fields = []
+        size = self.data_offset
+        for key, fmt, scale in FIELDS:
+            low, high = FORMAT_RANGES[fmt]
+            enum = ENUMS.get(key)
+            self.fields.append((key, "<" + fmt, scale, struct.calcsize("<" + fmt), low, high, enum))
+            size += struct.calcsize("<" + fmt)
+
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+
+    def _start(self):
+        buffer = self.buffer
+        struct.pack_into(HEADER_FORMAT, buffer, 0, MAGIC, SCHEMA_VERSION, len(self.fields))
+        for i in range(HEADER_SIZE, self.data_offset):
+            buffer[i] = 0
+
+    def _encode_slots(self, data: MetricReader) -> memoryview:
+        """Слоты реестра уже масштабированы: поле схемы с индексом i лежит в слоте i."""
+        self._start()
+        buffer = self.buffer
+        values = data.values
+        present = data.present
+        fields = self.fields
+        offset = self.data_offset
+        for index in range(len(fields)):
+            if not present[index]:
+                continue
+            _, fmt, _, size, low, high, enum = fields[index]
+            value = values[index]
+            if enum is not None and not 0 <= value < len(enum):
+                value = ENUM_UNKNOWN
+            elif value < low:
+                value = low
+            elif value > high:
+                value = high
+            struct.pack_into(fmt, buffer, offset, value)
+            buffer[HEADER_SIZE + (index >> 3)] |= 1 << (index & 7)
+            offset += size
+        return self.view[:offset]
+
+    def encode(self, data: dict) -> memoryview:
+        """Записать метрики в буфер и вернуть срез с готовым payload."""
+        if isinstance(data, MetricReader):
+            return self._encode_slots(data)
+
+        self._start()
+        buffer = self.buffer
+        offset = self.data_offset
+        index = 0
+        for key, fmt, scale, size, low, high, enum in self.fields:
+            value = data.get(key)
+            if value is not None:
+                if enum is not None:
+                    value = enum.index(value) if value in enum else ENUM_UNKNOWN
+                elif scale != 1:
+                    value = int(round(value * scale))
+                else:
+                    value = int(value)
+
+                if value < low:
+                    value = low
+                elif value > high:
+                    value = high
+
+                struct.pack_into(fmt, buffer, offset, value)
+                buffer[HEADER_SIZE + (index >> 3)] |= 1 << (index & 7)
+                offset += size
+            index += 1
+
+        return self.view[:offset]
+
+
+class BatchWriter:
+    """Сборка пакета сэмплов с временными метками в переиспользуемый буфер."""
+
+    def __init__(self, max_records: int, max_record_size: int):
+        self.max_records = max_records
+        self.buffer = bytearray(
+            BATCH_HEADER_SIZE + max_records * (RECORD_HEADER_SIZE + max_record_size)
+        )
+        self.view = memoryview(self.buffer)
+        self.reset()
+
+    def reset(self):
+        """Начать новый пакет."""
+        self.count = 0
+        self.offset = BATCH_HEADER_SIZE
+
+    def add(self, timestamp: int, sequence: int, payload) -> bool:
+        """Добавить запись; False, если пакет заполнен."""
+        end = self.offset + RECORD_HEADER_SIZE + len(payload)
+        if self.count >= self.max_records or end > len(self.buffer):
+            return False
+        struct.pack_into(
+            RECORD_HEADER_FORMAT, self.buffer, self.offset, timestamp, sequence, len(payload)
+        )
+        self.view[self.offset + RECORD_HEADER_SIZE : end] = payload
+        self.offset = end
+        self.count += 1
+        return True
+
+    def add_record(self, record) -> bool:
+        """Добавить уже упакованную запись (заголовок + payload)."""
+        end = self.offset + len(record)
+        if self.count >= self.max_records or end > len(self.buffer):
+            return False
+        self.view[self.offset : end] = record
+        self.offset = end
+        self.count += 1
+        return True
+
+    def records(self):
+        """Записи текущего пакета (заголовок + payload) по порядку."""
+        offset = BATCH_HEADER_SIZE
+        for _ in range(self.count):
+            length = struct.unpack_from(RECORD_HEADER_FORMAT, self.buffer, offset)[2]
+            end = offset + RECORD_HEADER_SIZE + length
+            yield self.view[offset:end]
+            offset = end
+
+    def finish(self, now: int) -> memoryview:
+        """Записать заголовок и вернуть готовый пакет."""
+        struct.pack_into(
+            BATCH_HEADER_FORMAT, self.buffer, 0, BATCH_MAGIC, BATCH_VERSION, self.count, now
+        )
+        return self.view[: self.offset]
@@ -0,0 +1,176 @@
+"""Схема компактного бинарного payload.
+
+Модуль общий для прошивки и хоста: только данные, без зависимостей.
+Поля добавляются строго в конец списка вместе с новой версией схемы,
+чтобы старые декодеры могли читать известный им префикс.
+"""
+
+MAGIC = 0xB1
+SCHEMA_VERSION = 9
+
+# Перечисления для строковых полей: значение кодируется индексом
+ENUM_UNKNOWN = 255
+ENUMS = {
+    "wifi_link_quality": ("disconnected", "poor", "fair", "good", "excellent"),
+    "power_source": ("unknown", "usb", "battery", "critical"),
+    "cpu_mode": ("power_save", "normal", "performance"),
+    "health_status": ("healthy", "warning", "critical"),
+}
+
+# (ключ, формат struct, множитель). Множитель 1 - целое значение,
+# иначе хранится round(value * scale), а при декодировании делится обратно
+FIELDS_V1 = (
+    ("temperature_celsius", "h", 100),
+    ("uptime_seconds", "I", 1),
+    ("error_count", "H", 1),
+    ("memory_free_bytes", "I", 1),
+    ("memory_allocated_bytes", "I", 1),
+    ("memory_total_bytes", "I", 1),
+    ("memory_usage_percent", "H", 100),
+    ("memory_fragmentation", "h", 100),
+    ("memory_largest_free_block_bytes", "I", 1),
+    ("wifi_connected", "B", 1),
+    ("wifi_status", "b", 1),
+    ("wifi_reconnect_count", "H", 1),
+    ("wifi_rssi_dbm", "b", 1),
+    ("wifi_rssi_min_dbm", "b", 1),
+    ("wifi_signal_quality_percent", "B", 1),
+    ("wifi_link_quality", "B", 1),
+    ("wifi_channel", "b", 1),
+    ("gc_collections_total", "I", 1),
+    ("gc_pause_us", "I", 1),
+    ("gc_pause_max_us", "I", 1),
+    ("gc_time_since_last", "I", 100),
+    ("vsys_voltage", "H", 100),
+    ("power_source", "B", 1),
+    ("battery_percent", "H", 100),
+    ("cpu_frequency_hz", "I", 1),
+    ("cpu_frequency_mhz", "H", 100),
+    ("cpu_mode", "B", 1),
+    ("cpu_temp_max_celsius", "h", 100),
+    ("mqtt_publish_success_total", "I", 1),
+    ("mqtt_publish_failed_total", "I", 1),
+    ("mqtt_publish_total", "I", 1),
+    ("mqtt_publish_success_rate", "H", 100),
+    ("mqtt_publish_interval_seconds", "I", 100),
+    ("health_status", "B", 1),
+    ("health_issues_count", "B", 1),
+    ("health_score", "B", 1),
+)
+
+FIELDS_V2 = FIELDS_V1 + (
+    ("offline_buffer_pending", "H", 1),
+    ("offline_flash_segments", "B", 1),
+    ("offline_samples_replayed_total", "I", 1),
+    ("offline_samples_dropped_total", "I", 1),
+)
+
+FIELDS_V3 = FIELDS_V2 + (
+    ("temperature_min_celsius", "h", 100),
+    ("temperature_max_celsius", "h", 100),
+    ("temperature_stddev_celsius", "H", 100),
+    ("temperature_p95_celsius", "h", 100),
+    ("vsys_min_voltage", "H", 100),
+    ("vsys_max_voltage", "H", 100),
+    ("vsys_stddev_voltage", "H", 1000),
+    ("vsys_p95_voltage", "H", 100),
+    ("adc_samples", "H", 1),
+)
+
+FIELDS_V4 = FIELDS_V3 + (
+    ("power_sample_interval_seconds", "H", 1),
+    ("power_duty_cycle_percent", "H", 100),
+    ("power_energy_per_sample_mj", "I", 10),
+    ("power_fast_path_total", "I", 1),
+)
+
+FIELDS_V5 = FIELDS_V4 + (
+    ("mqtt_inflight", "B", 1),
+    ("mqtt_acked_total", "I", 1),
+    ("mqtt_redelivered_total", "I", 1),
+    ("mqtt_window_full_total", "I", 1),
+    ("mqtt_link_lost_total", "H", 1),
+    ("mqtt_link_detect_ms", "I", 1),
+    ("mqtt_ack_rtt_ms", "H", 1),
+)
+
+FIELDS_V6 = FIELDS_V5 + (
+    ("wifi_fast_rejoin_total", "H", 1),
+    ("wifi_fast_rejoin_failed_total", "H", 1),
+    ("wifi_reconnect_ms_count", "H", 1),
+    ("wifi_reconnect_ms_last", "I", 1),
+    ("wifi_reconnect_ms_p95", "I", 1),
+    ("wifi_first_publish_ms_count", "H", 1),
+    ("wifi_first_publish_ms_last", "I", 1),
+    ("wifi_first_publish_ms_p95", "I", 1),
+)
+
+FIELDS_V7 = FIELDS_V6 + (
+    ("temperature_ewma_celsius", "h", 100),
+    ("temperature_window_max_celsius", "h", 100),
+    ("wifi_rssi_ewma_dbm", "h", 100),
+    ("wifi_rssi_window_min_dbm", "b", 1),
+    ("mqtt_publish_success_rate_window", "H", 100),
+    ("memory_alloc_slope_bytes_per_hour", "i", 1),
+)
+
+FIELDS_V8 = FIELDS_V7 + (
+    ("device_resets_total", "I", 1),
+    ("device_watchdog_resets_total", "I", 1),
+    ("state_checkpoint_writes_total", "I", 1),
+    ("state_checkpoint_errors_total", "H", 1),
+    ("boot_wifi_ms", "I", 1),
+    ("boot_mqtt_ms", "I", 1),
+    ("boot_first_publish_ms", "I", 1),
+)
+
+FIELDS_V9 = FIELDS_V8 + (
+    ("schedule_publish_interval_seconds", "H", 1),
+    ("schedule_reloads_total", "H", 1),
+    ("schedule_rejected_total", "H", 1),
+)
+
+SCHEMAS = {
+    1: FIELDS_V1,
+    2: FIELDS_V2,
+    3: FIELDS_V3,
+    4: FIELDS_V4,
+    5: FIELDS_V5,
+    6: FIELDS_V6,
+    7: FIELDS_V7,
+    8: FIELDS_V8,
+    9: FIELDS_V9,
+}
+FIELDS = SCHEMAS[SCHEMA_VERSION]
+
+# Заголовок: magic, версия схемы, число полей; за ним битовая карта присутствия
+HEADER_FORMAT = "<BBB"
+HEADER_SIZE = 3
+
+# Пакет сэмплов с временными метками устройства:
+# magic, версия, число записей, текущее время устройства на момент отправки.
+# Запись: время сэмпла, порядковый номер, длина, бинарный payload по схеме выше
+BATCH_MAGIC = 0xB2
+BATCH_VERSION = 2
+BATCH_HEADER_FORMAT = "<BBHI"
+BATCH_HEADER_SIZE = 8
+RECORD_HEADER_FORMAT = "<IIH"
+RECORD_HEADER_SIZE = 10
+
+# Заголовки записей прошлых версий пакета (версия 1 - без номера сэмпла)
+RECORD_HEADERS = {1: ("<IH", 6), 2: (RECORD_HEADER_FORMAT, RECORD_HEADER_SIZE)}
+
+# Допустимые диапазоны форматов struct (значения за пределами обрезаются)
+FORMAT_RANGES = {
+    "b": (-128, 127),
+    "B": (0, 255),
+    "h": (-32768, 32767),
+    "H": (0, 65535),
+    "i": (-2147483648, 2147483647),
+    "I": (0, 4294967295),
+}
+
+
+def bitmap_size(field_count: int) -> int:
+    """Размер битовой карты присутствия полей в байтах."""
+    return (field_count + 7) // 8
@@ -0,0 +1,161 @@
+"""Адаптивный интервал сэмплирования и энергосбережение между циклами.
+
+Интервал растягивается от питания (USB - базовый, батарея - длиннее по мере
+разряда, critical - максимальный) и сжимается, когда метрики быстро меняются.
+Между циклами - machine.lightsleep на батарее и режим энергосбережения WLAN;
+сон идёт кусками, после каждого проверяется здоровье для внеочередного сэмпла.
+Потребление оценивается по типовым токам Pico W в каждом состоянии.
+"""
+
+import time
+
+import machine
+
+# Типовые токи Pico W при 5 В, мА: работа с радио, ожидание в time.sleep
+# с WLAN PM_PERFORMANCE / PM_POWERSAVE, lightsleep с WLAN в PM_POWERSAVE
+CURRENT_ACTIVE_MA = 50
+CURRENT_IDLE_MA = 35
+CURRENT_IDLE_POWERSAVE_MA = 18
+CURRENT_LIGHTSLEEP_MA = 8
+
+# Пороги "быстрого изменения" метрики за один цикл
+CHANGE_THRESHOLDS = {
+    "temperature_celsius": 0.5,
+    "memory_usage_percent": 2.0,
+    "wifi_rssi_dbm": 5,
+    "vsys_voltage": 0.05,
+}
+
+SHRINK_FACTOR = 0.5
+STRETCH_FACTOR = 1.5
+
+
+class PowerScheduler:
+    def __init__(
+        self,
+        base_interval: int,
+        min_interval: int = 5,
+        max_interval: int = 300,
+        health_check_interval: int = 5,
+        lightsleep: bool = True,
+    ):
+        self.base_interval = base_interval
+        self.min_interval = min(min_interval, base_interval)
+        self.max_interval = max(max_interval, base_interval)
+        self.check_interval_ms = health_check_interval * 1000
+        self.lightsleep_allowed = lightsleep
+
+        self.interval = base_interval
+        self.power_source = "unknown"
+        self.pm_mode = None
+        self.powersave = False
+        self.previous = {}
+
+        # Учёт времени и энергии с момента загрузки
+        self.last_wake = time.ticks_ms()
+        self.active_ms = 0
+        self.sleep_ms = 0
+        self.energy_uj = 0
+        self.samples_published = 0
+        self.fast_path_total = 0
+        self.voltage = 5.0
+
+    def _interval_cap(self, power_source: str, battery_percent: float) -> float:
+        """Верхняя граница интервала для текущего питания."""
+        if power_source == "usb":
+            return self.base_interval
+        if power_source == "battery":
+            drained = 1 - max(0, min(100, battery_percent)) / 100
+            return self.base_interval + (self.max_interval - self.base_interval) * drained
+        return self.max_interval
+
+    def next_interval(self, metrics: dict) -> int:
+        """Интервал до следующего сэмпла по питанию и скорости изменения метрик."""
+        self.power_source = metrics.get("power_source", "unknown")
+        self.voltage = metrics.get("vsys_voltage") or self.voltage
+        cap = self._interval_cap(self.power_source, metrics.get("battery_percent", 0))
+
+        changing = False
+        for key, threshold in CHANGE_THRESHOLDS.items():
+            value = metrics.get(key)
+            last = self.previous.get(key)
+            if value is not None and last is not None and abs(value - last) >= threshold:
+                changing = True
+            if value is not None:
+                self.previous[key] = value
+
+        if changing:
+            interval = int(self.interval * SHRINK_FACTOR)
+        else:
+            # Не меньше секунды за шаг: int(1 * 1.5) == 1, и интервал не рос бы
+            interval = max(self.interval + 1, int(self.interval * STRETCH_FACTOR))
+        self.interval = int(max(self.min_interval, min(cap, interval)))
+        return self.interval
+
+    def apply_power_mode(self, wlan):
+        """Энергосбережение WLAN на батарее, полная производительность от USB."""
+        mode = wlan.PM_PERFORMANCE if self.power_source == "usb" else wlan.PM_POWERSAVE
+        if mode != self.pm_mode:
+            wlan.config(pm=mode)
+            self.pm_mode = mode
+            self.powersave = mode != wlan.PM_PERFORMANCE
+
+    def _idle_current(self, lightsleep: bool) -> int:
+        if lightsleep:
+            return CURRENT_LIGHTSLEEP_MA
+        if self.powersave:
+            return CURRENT_IDLE_POWERSAVE_MA
+        return CURRENT_IDLE_MA
+
+    def sleep(self, seconds: int, wake_check=None, wait_ms=None) -> bool:
+        """Спать до следующего цикла; True - wake_check() прервал сон (fast path).
+
+        wait_ms - пауза без lightsleep вместо time.sleep_ms (например, обслуживание /metrics).
+        """
+        now = time.ticks_ms()
+        active = time.ticks_diff(now, self.last_wake)
+        self.active_ms += active
+        self.energy_uj += active * CURRENT_ACTIVE_MA * self.voltage
+
+        # lightsleep останавливает USB и таймеры, поэтому только на батарее
+        lightsleep = self.lightsleep_allowed and self.power_source != "usb"
+        idle_current = self._idle_current(lightsleep)
+
+        woke = False
+        remaining = seconds * 1000
+        while remaining > 0:
+            chunk = min(remaining, self.check_interval_ms)
+            if lightsleep:
+                machine.lightsleep(chunk)
+            elif wait_ms is not None:
+                wait_ms(chunk)
+            else:
+                time.sleep_ms(chunk)
+            remaining -= chunk
+            self.sleep_ms += chunk
+            self.energy_uj += chunk * idle_current * self.voltage
+            if remaining > 0 and wake_check is not None and wake_check():
+                self.fast_path_total += 1
+                woke = True
+                break
+
+        self.last_wake = time.ticks_ms()
+        return woke
+
+    def record_publish(self, samples: int = 1):
+        self.samples_published += samples
+
+    def get_stats(self) -> dict:
+        """Текущий интервал, доля активного времени и энергия на опубликованный сэмпл."""
+        total_ms = self.active_ms + self.sleep_ms
+        energy_per_sample = 0
+        if self.samples_published:
+            energy_per_sample = round(self.energy_uj / 1000 / self.samples_published, 1)
+        return {
+            "power_sample_interval_seconds": self.interval,
+            "power_duty_cycle_percent": round(self.active_ms * 100 / total_ms, 2)
+            if total_ms
+            else 100,
+            "power_energy_per_sample_mj": energy_per_sample,
+            "power_fast_path_total": self.fast_path_total,
+        }
@@ -0,0 +1,117 @@
+"""Профилирование горячего пути цикла сбора и публикации метрик.
+
+Методы оборачиваются на уровне экземпляра только при включённом
+профилировании, поэтому выключенный профайлер ничего не стоит.
+Для каждой секции копятся время (ticks_us) и прирост gc.mem_alloc()
+в гистограммах фиксированного размера с корзинами по степеням двойки.
+"""
+
+import gc
+import time
+from array import array
+
+HIST_BINS = 20
+
+# Индексы счётчиков секции
+COUNT = 0
+TOTAL_US = 1
+MAX_US = 2
+TOTAL_ALLOC = 3
+MAX_ALLOC = 4
+
+
+def _log2_bin(value: int) -> int:
+    """Номер корзины: число значащих бит, не больше HIST_BINS - 1."""
+    index = 0
+    while value > 0 and index < HIST_BINS - 1:
+        value >>= 1
+        index += 1
+    return index
+
+
+class ProfileSection:
+    def __init__(self, name: str):
+        self.name = name
+        self.counters = array("I", bytes(4 * 5))
+        self.time_hist = array("I", bytes(4 * HIST_BINS))
+        self.alloc_hist = array("I", bytes(4 * HIST_BINS))
+
+    def record(self, elapsed_us: int, allocated: int):
+        # Сборка мусора внутри секции даёт отрицательный прирост
+        if allocated < 0:
+            allocated = 0
+        counters = self.counters
+        counters[COUNT] += 1
+        counters[TOTAL_US] += elapsed_us
+        counters[TOTAL_ALLOC] += allocated
+        if elapsed_us > counters[MAX_US]:
+            counters[MAX_US] = elapsed_us
+        if allocated > counters[MAX_ALLOC]:
+            counters[MAX_ALLOC] = allocated
+        self.time_hist[_log2_bin(elapsed_us)] += 1
+        self.alloc_hist[_log2_bin(allocated)] += 1
+
+    def reset(self):
+        for i in range(5):
+            self.counters[i] = 0
+        for i in range(HIST_BINS):
+            self.time_hist[i] = 0
+            self.alloc_hist[i] = 0
+
+
+def _quantile_upper_bound(hist, count: int, quantile: float) -> int:
+    """Верхняя граница корзины, в которую попадает квантиль."""
+    target = quantile * count
+    cumulative = 0
+    for i in range(HIST_BINS):
+        cumulative += hist[i]
+        if cumulative >= target:
+            return (1 << i) - 1 if i else 0
+    return (1 << (HIST_BINS - 1)) - 1
+
+
+class Profiler:
+    def __init__(self):
+        self.sections = []
+
+    def wrap(self, name: str, func):
+        """Обёртка функции с замером времени и аллокаций."""
+        section = ProfileSection(name)
+        self.sections.append(section)
+        ticks_us = time.ticks_us
+        ticks_diff = time.ticks_diff
+        mem_alloc = gc.mem_alloc
+
+        def profiled(*args, **kwargs):
+            allocated = mem_alloc()
+            start = ticks_us()
+            result = func(*args, **kwargs)
+            section.record(ticks_diff(ticks_us(), start), mem_alloc() - allocated)
+            return result
+
+        return profiled
+
+    def instrument(self, obj, method: str, name: str = None):
+        """Подменить метод экземпляра профилирующей обёрткой."""
+        setattr(obj, method, self.wrap(name or method, getattr(obj, method)))
+
+    def get_stats(self, reset: bool = True) -> dict:
+        """Метрики семейства pico_profile_* за прошедший период."""
+        stats = {}
+        for section in self.sections:
+            counters = section.counters
+            count = counters[COUNT]
+            prefix = "pico_profile_" + section.name
+            stats[prefix + "_calls"] = count
+            if count:
+                stats[prefix + "_avg_us"] = counters[TOTAL_US] // count
+                stats[prefix + "_max_us"] = counters[MAX_US]
+                stats[prefix + "_p95_us"] = _quantile_upper_bound(section.time_hist, count, 0.95)
+                stats[prefix + "_avg_alloc_bytes"] = counters[TOTAL_ALLOC] // count
+                stats[prefix + "_max_alloc_bytes"] = counters[MAX_ALLOC]
+                stats[prefix + "_p95_alloc_bytes"] = _quantile_upper_bound(
+                    section.alloc_hist, count, 0.95
+                )
+            if reset:
+                section.reset()
+        return stats
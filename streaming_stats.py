@@ -0,0 +1,196 @@
+"""Потоковая статистика за скользящее окно с постоянной памятью.
+
+Все структуры выделяют массивы фиксированного размера при создании и
+обновляются за O(1) на сэмпл (окно min/max - амортизированно) в целых
+числах, поэтому память не растёт с временем работы, а значения отражают
+последние N сэмплов, а не всю историю с загрузки.
+"""
+
+import time
+from array import array
+
+from metric_registry import percent_x100
+
+# Дробная часть EWMA: значение хранится умноженным на 16
+EWMA_SHIFT = 4
+
+# Предел окна тренда: суммы регрессии остаются small int на MicroPython
+TREND_MAX_WINDOW = 48
+
+
+class EWMA:
+    """Экспоненциальное скользящее среднее, alpha в тысячных."""
+
+    def __init__(self, alpha_permille: int):
+        self.alpha = alpha_permille
+        self.value = 0
+        self.ready = False
+
+    def update(self, x: int) -> int:
+        scaled = x << EWMA_SHIFT
+        if not self.ready:
+            self.value = scaled
+            self.ready = True
+        else:
+            self.value += (scaled - self.value) * self.alpha // 1000
+        return self.get()
+
+    def get(self) -> int:
+        return (self.value + (1 << (EWMA_SHIFT - 1))) >> EWMA_SHIFT
+
+
+class WindowExtreme:
+    """Максимум (или минимум) последних size значений: монотонная очередь в кольце."""
+
+    def __init__(self, size: int, maximum: bool = True):
+        self.size = size
+        self.maximum = maximum
+        self.values = array("i", bytes(4 * size))
+        self.seqs = array("i", bytes(4 * size))
+        self.head = 0
+        self.count = 0
+        self.seq = 0
+
+    def push(self, value: int) -> int:
+        size = self.size
+        values = self.values
+        seq = self.seq
+        self.seq = seq + 1
+
+        # Голова вышла за окно (за одно добавление - не больше одного элемента)
+        if self.count and self.seqs[self.head] <= seq - size:
+            self.head = (self.head + 1) % size
+            self.count -= 1
+
+        # С хвоста уходят значения, которые уже никогда не станут экстремумом
+        while self.count:
+            tail = (self.head + self.count - 1) % size
+            if self.maximum:
+                if values[tail] > value:
+                    break
+            elif values[tail] < value:
+                break
+            self.count -= 1
+
+        tail = (self.head + self.count) % size
+        values[tail] = value
+        self.seqs[tail] = seq
+        self.count += 1
+        return values[self.head]
+
+    def get(self) -> int:
+        return self.values[self.head] if self.count else 0
+
+
+class RollingRate:
+    """Доля успехов среди последних size событий."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.outcomes = bytearray(size)
+        self.index = 0
+        self.count = 0
+        self.successes = 0
+
+    def add(self, success: bool):
+        outcome = 1 if success else 0
+        if self.count == self.size:
+            self.successes -= self.outcomes[self.index]
+        else:
+            self.count += 1
+        self.outcomes[self.index] = outcome
+        self.successes += outcome
+        self.index = (self.index + 1) % self.size
+
+    def rate_x100(self) -> int:
+        """Процент успехов в сотых долях (100.00% без событий)."""
+        if not self.count:
+            return 10000
+        return percent_x100(self.successes, self.count)
+
+
+class LinearTrend:
+    """Наклон линейной регрессии последних size значений, в единицах за час.
+
+    Точки считаются равноотстоящими по номеру сэмпла, перевод в час - по
+    среднему интервалу окна. Суммы пересчитываются при сдвиге окна за O(1);
+    значения хранятся относительно первого, чтобы суммы оставались small int.
+    """
+
+    def __init__(self, size: int):
+        if not 2 <= size <= TREND_MAX_WINDOW:
+            raise ValueError(f"trend window must be 2..{TREND_MAX_WINDOW}")
+        self.size = size
+        self.values = array("i", bytes(4 * size))
+        self.times = array("i", bytes(4 * size))
+        self.head = 0
+        self.count = 0
+        self.base = None
+        # S = сумма y, T = сумма k * y (k = 0 у самого старого)
+        self.total = 0
+        self.weighted = 0
+
+    def push(self, value: int, now: int):
+        if self.base is None:
+            self.base = value
+        y = value - self.base
+        size = self.size
+        if self.count < size:
+            slot = (self.head + self.count) % size
+            self.weighted += self.count * y
+            self.total += y
+            self.count += 1
+        else:
+            slot = self.head
+            oldest = self.values[slot]
+            # Индексы оставшихся точек уменьшаются на 1, новая получает size - 1
+            self.total -= oldest
+            self.weighted -= self.total
+            self.weighted += (size - 1) * y
+            self.total += y
+            self.head = (self.head + 1) % size
+        self.values[slot] = y
+        self.times[slot] = now
+
+    def slope_per_hour(self) -> int:
+        """Наклон в единицах значения за час (0, пока точек меньше трёх)."""
+        n = self.count
+        if n < 3:
+            return 0
+        span = self.times[(self.head + n - 1) % self.size] - self.times[self.head]
+        if span <= 0:
+            return 0
+        # Удвоенные числитель и знаменатель МНК: 2 * sum((k - mean_k) * y) и n(n^2-1)/6
+        numerator = 2 * self.weighted - (n - 1) * self.total
+        denominator = (n - 1) * n * (n + 1) // 6
+        samples_per_hour = 3600 * (n - 1) // span
+        quotient, remainder = divmod(numerator, denominator)
+        return quotient * samples_per_hour + remainder * samples_per_hour // denominator
+
+
+class IntervalJitter:
+    """Отклонение интервала между сэмплами от номинального, в микросекундах."""
+
+    def __init__(self, interval_us: int):
+        self.interval_us = interval_us
+        self.last_us = None
+        self.jitter_us = 0
+        self.jitter_max_us = 0
+        self.samples = 0
+
+    def mark(self, now_us: int):
+        """Отметить момент сэмпла (time.ticks_us())."""
+        if self.last_us is not None:
+            jitter = abs(time.ticks_diff(now_us, self.last_us) - self.interval_us)
+            self.jitter_us = jitter
+            if jitter > self.jitter_max_us:
+                self.jitter_max_us = jitter
+        self.last_us = now_us
+        self.samples += 1
+
+    def get_stats(self) -> dict:
+        return {
+            "sample_jitter_us": self.jitter_us,
+            "sample_jitter_max_us": self.jitter_max_us,
+            "samples_total": self.samples,
+        }
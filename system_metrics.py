@@ -1,4 +1,17 @@
-"""Сбор системных метрик Pico W"""
+"""Сбор системных метрик Pico W
+
+Сборщики пишут значения прямо в слоты MetricRegistry целыми числами
+с множителем схемы (температура в сотых градуса, напряжение в сотых
+вольта и т.д.), поэтому на цикле не создаются словари и float-объекты.
+
+Сбор идёт в две стадии. Снимок (read_*) читает каждый источник - АЦП,
+кучу, WLAN, частоту CPU, счётчики компонентов - ровно один раз за цикл.
+Производные метрики (derive_*) и правила здоровья считаются только по
+значениям снимка, поэтому все метрики одного сэмпла согласованы.
+
+С расписанием (collector_schedule) снимок читает только сборщики, которым
+пора; остальные отдают значения прошлого чтения из слотов реестра.
+"""
 
 import machine
 import gc
@@ -7,67 +20,108 @@ import network
 import ubinascii
 import uos
 
+from collector_schedule import (
+    ALL_COLLECTORS,
+    COLLECTORS,
+    SOURCE_ALWAYS,
+    source,
+)
+from health_rules import HealthRules
+from memory_diagnostics import MemoryDiagnostics
+from metric_registry import MetricRegistry, MetricSnapshot, percent_x100
+from streaming_stats import EWMA, LinearTrend, RollingRate, WindowExtreme
+
+# Индексы значений перечислений (payload_schema.ENUMS)
+LINK_DISCONNECTED, LINK_POOR, LINK_FAIR, LINK_GOOD, LINK_EXCELLENT = range(5)
+POWER_UNKNOWN, POWER_USB, POWER_BATTERY, POWER_CRITICAL = range(4)
+CPU_POWER_SAVE, CPU_NORMAL, CPU_PERFORMANCE = range(3)
+HEALTH_HEALTHY, HEALTH_WARNING, HEALTH_CRITICAL = range(3)
+HEALTH_NAMES = ("healthy", "warning", "critical")
+
+# Биты сборщиков в маске расписания
+ADC, WIFI, MEMORY, CPU, STATS = (1 << i for i in range(len(COLLECTORS)))
+
+
+def adc_to_centicelsius(raw: int) -> int:
+    """Отсчёт read_u16 датчика температуры в сотые доли °C.
+
+    27 - (V - 0.706) / 0.001721, V = raw * 3.3 / 65535 (в микровольтах - по частям,
+    чтобы произведения оставались small int).
+    """
+    microvolts = raw * 50 + raw * 354 // 1000
+    return 2700 - (microvolts - 706000) * 100 // 1721
+
 
 class SystemMetrics:
-    def __init__(self):
+    def __init__(
+        self,
+        memory_diagnostics=None,
+        adc_sampler=None,
+        registry=None,
+        health_rules=None,
+        stats_window: int = 30,
+        ewma_alpha: float = 0.2,
+        trend_window: int = 30,
+        schedule=None,
+    ):
         self.temp_sensor = machine.ADC(4)
         self.vsys_pin = machine.ADC(29)
         self.start_time = time.time()
         self.wlan = network.WLAN(network.STA_IF)
 
-        # Счётчики
-        self.last_gc_time = time.time()
-        self.gc_count = 0
+        # Слоты всех метрик сэмпла объявляются один раз
+        self.registry = registry or MetricRegistry()
 
-        # Новые счетчики для дополнительных метрик
-        self.mqtt_publish_success = 0
-        self.mqtt_publish_failed = 0
-        self.last_publish_time = time.time()
-        self.max_temp = 0.0
-        self.min_rssi = 0
+        # Паузы GC и фрагментация кучи
+        self.memory = memory_diagnostics or MemoryDiagnostics()
 
-    def get_temperature(self) -> float:
-        """Температура процессора в °C."""
-        reading = self.temp_sensor.read_u16() * 3.3 / 65535
-        temperature = 27 - (reading - 0.706) / 0.001721
-        temp = round(temperature, 2)
+        # Высокочастотное сэмплирование АЦП: агрегаты за интервал вместо одного отсчёта
+        self.adc_sampler = adc_sampler
 
-        # Отслеживаем максимальную температуру
-        self.max_temp = max(self.max_temp, temp)
-        return temp
+        # Пороги статуса здоровья (заменяются на лету из топика конфигурации)
+        self.health_rules = health_rules or HealthRules()
 
-    def get_memory_stats(self) -> dict:
-        """Статистика памяти."""
-        gc.collect()
-        free_mem = gc.mem_free()
-        allocated_mem = gc.mem_alloc()
-        total_mem = free_mem + allocated_mem
+        # Счётчики других компонентов (offline-буфер, MQTT, WiFi): функции -> dict,
+        # читаются в стадии снимка, чтобы правила здоровья видели и их
+        self.stats_providers = []
 
-        return {
-            "memory_free_bytes": free_mem,
-            "memory_allocated_bytes": allocated_mem,
-            "memory_total_bytes": total_mem,
-            "memory_usage_percent": round((allocated_mem / total_mem) * 100, 2),
-            "memory_fragmentation": self.get_memory_fragmentation(),
-        }
+        # Периоды сборщиков (None - все читаются каждый цикл) и маска
+        # сборщиков, прочитанных в последнем снимке
+        self.schedule = schedule
+        self.fresh = ALL_COLLECTORS
 
-    def get_memory_fragmentation(self) -> float:
-        """Оценка фрагментации памяти (0-100%)."""
-        try:
-            test_size = gc.mem_free() // 2
-            test_block = bytearray(test_size)
-            del test_block
-            return 0.0
-        except MemoryError:
-            return round((1 - (test_size / gc.mem_free())) * 100, 2)
-        except:
-            return -1.0
+        # Черновик с раскладкой реестра для проверок здоровья между циклами
+        self._check = MetricSnapshot(self.registry)
 
-    def get_vsys_voltage(self) -> float:
-        """Напряжение системы Vsys."""
-        reading = self.vsys_pin.read_u16()
-        voltage = reading * (3.3 / 65535) * 3
-        return round(voltage, 2)
+        # Новые счетчики для дополнительных метрик
+        self.mqtt_publish_success = 0
+        self.mqtt_publish_failed = 0
+        self.last_publish_time = time.time()
+        self.max_temp_x100 = -27300
+        self.min_rssi = 0
+
+        # То же за последние stats_window сэмплов: экстремумы с загрузки
+        # через неделю работы уже ничего не говорят о текущем состоянии
+        alpha = int(ewma_alpha * 1000)
+        self.temperature_ewma = EWMA(alpha)
+        self.temperature_window_max = WindowExtreme(stats_window)
+        self.rssi_ewma = EWMA(alpha)
+        self.rssi_window_min = WindowExtreme(stats_window, maximum=False)
+        self.publish_rate = RollingRate(stats_window)
+        # Наклон занятой памяти после gc.collect(): рост - признак утечки
+        self.alloc_trend = LinearTrend(trend_window)
+
+        # Статичная информация об устройстве (заполняется один раз)
+        self._system_info = None
+        self._wifi_mac = None
+
+    def read_temperature_x100(self) -> int:
+        """Одно чтение датчика температуры, сотые доли °C."""
+        return adc_to_centicelsius(self.temp_sensor.read_u16())
+
+    def read_vsys_x100(self) -> int:
+        """Одно чтение Vsys (делитель 1:3), сотые доли вольта."""
+        return self.vsys_pin.read_u16() * 990 // 65535
 
     def get_cpu_frequency(self) -> int:
         """Частота CPU в Hz."""
@@ -77,149 +131,301 @@ class SystemMetrics:
         """Время работы в секундах."""
         return int(time.time() - self.start_time)
 
-    def get_wifi_metrics(self, reconnect_count: int) -> dict:
-        """Метрики WiFi соединения."""
-        metrics = {
-            "wifi_connected": 1 if self.wlan.isconnected() else 0,
-            "wifi_status": self.wlan.status(),
-            "wifi_reconnect_count": reconnect_count,
-        }
-
-        if self.wlan.isconnected():
-            rssi = self.wlan.status("rssi")
-            metrics["wifi_rssi_dbm"] = rssi
-
-            # Отслеживаем минимальный (худший) RSSI
-            if self.min_rssi == 0:
-                self.min_rssi = rssi
-            else:
-                self.min_rssi = min(self.min_rssi, rssi)
-            metrics["wifi_rssi_min_dbm"] = self.min_rssi
-
-            # Качество сигнала в процентах
-            signal_quality = max(0, min(100, 2 * (rssi + 100)))
-            metrics["wifi_signal_quality_percent"] = round(signal_quality, 2)
-
-            # Оценка стабильности (на основе качества сигнала)
-            if signal_quality >= 80:
-                metrics["wifi_link_quality"] = "excellent"
-            elif signal_quality >= 60:
-                metrics["wifi_link_quality"] = "good"
-            elif signal_quality >= 40:
-                metrics["wifi_link_quality"] = "fair"
-            else:
-                metrics["wifi_link_quality"] = "poor"
-
-            # MAC и сетевая информация
-            mac = ubinascii.hexlify(self.wlan.config("mac"), ":").decode()
-            ifconfig = self.wlan.ifconfig()
-            metrics["wifi_mac"] = mac
-            metrics["wifi_ip"] = ifconfig[0]
-            metrics["wifi_netmask"] = ifconfig[1]
-            metrics["wifi_gateway"] = ifconfig[2]
-            metrics["wifi_dns"] = ifconfig[3]
-
-            # Канал WiFi
-            try:
-                channel = self.wlan.config("channel")
-                metrics["wifi_channel"] = channel
-            except:
-                metrics["wifi_channel"] = -1
-
-        else:
-            metrics["wifi_rssi_dbm"] = -100
-            metrics["wifi_signal_quality_percent"] = 0
-            metrics["wifi_link_quality"] = "disconnected"
-            metrics["wifi_mac"] = "disconnected"
-            metrics["wifi_ip"] = "0.0.0.0"
-            metrics["wifi_channel"] = -1
+    # --- стадия 1: снимок источников ---------------------------------------
 
-        return metrics
+    def read_adc(self, registry, aggregate: bool = True):
+        """Температура и Vsys: агрегаты АЦП за интервал или одно чтение.
 
-    def get_system_info(self) -> dict:
-        """Информация о прошивке и ID устройства."""
-        unique_id = ubinascii.hexlify(machine.unique_id()).decode()
-        uname = uos.uname()
-
-        return {
-            "sys_unique_id": unique_id,
-            "sys_version": uname.version,
-            "sys_platform": uname.sysname,
-            "sys_machine": uname.machine,
-            "sys_release": uname.release,
-        }
+        aggregate=False - только одно чтение, агрегаты интервала не сбрасываются.
+        """
+        slot = registry.index
+        if not aggregate or self.adc_sampler is None or not self.adc_sampler.collect(registry):
+            registry.put(slot["temperature_celsius"], self.read_temperature_x100())
+            registry.put(slot["vsys_voltage"], self.read_vsys_x100())
 
-    def get_garbage_collector_stats(self) -> dict:
-        """Статистика сборщика мусора."""
-        current_time = time.time()
-        time_since_last = current_time - self.last_gc_time
-
-        self.gc_count += 1
-        self.last_gc_time = current_time
-
-        return {
-            "gc_collections_total": self.gc_count,
-            "gc_time_since_last": round(time_since_last, 2),
-        }
-
-    def get_power_metrics(self) -> dict:
-        """Метрики питания и энергопотребления."""
-        vsys = self.get_vsys_voltage()
-
-        battery_percent = -1
-        power_source = "unknown"
-
-        if vsys > 4.5:
-            power_source = "usb"
-            battery_percent = 100
-        elif vsys >= 3.3:
-            power_source = "battery"
-            battery_percent = round(((vsys - 3.3) / 0.9) * 100, 2)
+    def read_memory(self, registry, collect: bool = True):
+        """Куча: сборка мусора с замером паузы и один замер free/alloc."""
+        memory = self.memory
+        if collect:
+            memory.collect()
+        free_mem = gc.mem_free()
+        allocated_mem = gc.mem_alloc()
+        if collect:
+            memory.maybe_probe(free_mem, allocated_mem)
+
+        put = registry.put
+        slot = registry.index
+        put(slot["memory_free_bytes"], free_mem)
+        put(slot["memory_allocated_bytes"], allocated_mem)
+        put(slot["memory_fragmentation"], memory.fragmentation_x100)
+        put(slot["memory_largest_free_block_bytes"], memory.largest_free_block)
+        put(slot["gc_collections_total"], memory.gc_collections)
+        put(slot["gc_pause_us"], memory.gc_pause_us)
+        put(slot["gc_pause_max_us"], memory.gc_pause_max_us)
+        put(slot["gc_time_since_last"], int(memory.gc_interval * 100))
+
+    def read_wifi(self, registry, reconnect_count: int):
+        """WLAN: состояние, статус, RSSI и канал - по одному запросу к драйверу."""
+        wlan = self.wlan
+        put = registry.put
+        slot = registry.index
+        connected = wlan.isconnected()
+        put(slot["wifi_connected"], 1 if connected else 0)
+        put(slot["wifi_status"], wlan.status())
+        put(slot["wifi_reconnect_count"], reconnect_count)
+
+        if not connected:
+            put(slot["wifi_rssi_dbm"], -100)
+            put(slot["wifi_channel"], -1)
+            return
+
+        put(slot["wifi_rssi_dbm"], wlan.status("rssi"))
+        # Канал WiFi
+        try:
+            channel = wlan.config("channel")
+        except:
+            channel = -1
+        put(slot["wifi_channel"], channel)
+
+    def read_cpu(self, registry):
+        """Частота CPU."""
+        registry.put(registry.index["cpu_frequency_hz"], self.get_cpu_frequency())
+
+    def read_stats(self, registry):
+        """Счётчики компонентов от stats_providers."""
+        for provider in self.stats_providers:
+            registry.update(provider())
+
+    def read_counters(self, registry):
+        """Время работы и счётчики публикаций."""
+        now = time.time()
+        put = registry.put
+        slot = registry.index
+        put(slot["uptime_seconds"], int(now - self.start_time))
+        put(slot["mqtt_publish_success_total"], self.mqtt_publish_success)
+        put(slot["mqtt_publish_failed_total"], self.mqtt_publish_failed)
+        put(slot["mqtt_publish_interval_seconds"], int(now - self.last_publish_time) * 100)
+
+    def read_snapshot(self, reconnect_count: int, error_count: int = 0):
+        """Стадия 1: каждый источник, которому пора, читается один раз.
+
+        Слоты помечаются номером сборщика, чтобы пропущенные сборщики
+        вернули в сэмпл прошлые значения.
+        """
+        registry = self.registry
+        schedule = self.schedule
+        due = schedule.due() if schedule is not None else ALL_COLLECTORS
+        if due & ADC:
+            registry.source = source(0)
+            self.read_adc(registry)
+        if due & WIFI:
+            registry.source = source(1)
+            self.read_wifi(registry, reconnect_count)
+        if due & MEMORY:
+            registry.source = source(2)
+            self.read_memory(registry)
+        if due & CPU:
+            registry.source = source(3)
+            self.read_cpu(registry)
+        if due & STATS:
+            registry.source = source(4)
+            self.read_stats(registry)
+        registry.source = SOURCE_ALWAYS
+        self.read_counters(registry)
+        registry.put(registry.index["error_count"], error_count)
+        if schedule is not None:
+            schedule.restore(registry, due)
+        self.fresh = due
+
+    # --- стадия 2: производные метрики ---------------------------------------
+
+    def derive_memory(self, registry):
+        values = registry.values
+        slot = registry.index
+        if not registry.present[slot["memory_free_bytes"]]:
+            return
+        allocated_mem = values[slot["memory_allocated_bytes"]]
+        total_mem = values[slot["memory_free_bytes"]] + allocated_mem
+        registry.put(slot["memory_total_bytes"], total_mem)
+        registry.put(slot["memory_usage_percent"], percent_x100(allocated_mem, total_mem))
+
+    def derive_wifi(self, registry, track: bool = True):
+        """Качество сигнала по RSSI из снимка; track - обновлять худший RSSI."""
+        values = registry.values
+        put = registry.put
+        slot = registry.index
+        if not registry.present[slot["wifi_connected"]]:
+            return
+        if not values[slot["wifi_connected"]]:
+            put(slot["wifi_signal_quality_percent"], 0)
+            put(slot["wifi_link_quality"], LINK_DISCONNECTED)
+            return
+
+        rssi = values[slot["wifi_rssi_dbm"]]
+        # Отслеживаем минимальный (худший) RSSI
+        if track and (self.min_rssi == 0 or rssi < self.min_rssi):
+            self.min_rssi = rssi
+        put(slot["wifi_rssi_min_dbm"], self.min_rssi)
+
+        # Качество сигнала в процентах
+        signal_quality = max(0, min(100, 2 * (rssi + 100)))
+        put(slot["wifi_signal_quality_percent"], signal_quality)
+
+        # Оценка стабильности (на основе качества сигнала)
+        if signal_quality >= 80:
+            quality = LINK_EXCELLENT
+        elif signal_quality >= 60:
+            quality = LINK_GOOD
+        elif signal_quality >= 40:
+            quality = LINK_FAIR
         else:
-            power_source = "critical"
-            battery_percent = 0
-
-        return {
-            "vsys_voltage": vsys,
-            "power_source": power_source,
-            "battery_percent": max(0, min(100, battery_percent)),
-        }
-
-    def get_performance_metrics(self) -> dict:
-        """Метрики производительности."""
-        cpu_freq = self.get_cpu_frequency()
-
+            quality = LINK_POOR
+        put(slot["wifi_link_quality"], quality)
+
+    def derive_power(self, registry):
+        """Источник питания и заряд по Vsys из снимка."""
+        slot = registry.index
+        if not registry.present[slot["vsys_voltage"]]:
+            return
+        vsys = registry.values[slot["vsys_voltage"]]
+
+        if vsys > 450:
+            power_source = POWER_USB
+            battery = 10000
+        elif vsys >= 330:
+            power_source = POWER_BATTERY
+            battery = min(10000, (vsys - 330) * 1000 // 9)
+        else:
+            power_source = POWER_CRITICAL
+            battery = 0
+
+        registry.put(slot["power_source"], power_source)
+        registry.put(slot["battery_percent"], battery)
+
+    def derive_performance(self, registry, track: bool = True):
+        """Режим CPU и максимум температуры; track - учитывать сэмпл в максимуме."""
+        values = registry.values
+        slot = registry.index
+        put = registry.put
+        if track:
+            # Максимум по всем отсчётам интервала, а не по одному чтению
+            peak_slot = slot["temperature_max_celsius"]
+            if not registry.present[peak_slot]:
+                peak_slot = slot["temperature_celsius"]
+            if values[peak_slot] > self.max_temp_x100:
+                self.max_temp_x100 = values[peak_slot]
+        put(slot["cpu_temp_max_celsius"], self.max_temp_x100)
+
+        if not registry.present[slot["cpu_frequency_hz"]]:
+            return
+        cpu_freq = values[slot["cpu_frequency_hz"]]
         if cpu_freq >= 250_000_000:
-            cpu_mode = "performance"
+            cpu_mode = CPU_PERFORMANCE
         elif cpu_freq >= 125_000_000:
-            cpu_mode = "normal"
+            cpu_mode = CPU_NORMAL
         else:
-            cpu_mode = "power_save"
+            cpu_mode = CPU_POWER_SAVE
+        put(slot["cpu_frequency_mhz"], cpu_freq // 10_000)
+        put(slot["cpu_mode"], cpu_mode)
+
+    def derive_mqtt(self, registry):
+        values = registry.values
+        slot = registry.index
+        success = values[slot["mqtt_publish_success_total"]]
+        total_publishes = success + values[slot["mqtt_publish_failed_total"]]
+        registry.put(slot["mqtt_publish_total"], total_publishes)
+        registry.put(slot["mqtt_publish_success_rate"], percent_x100(success, total_publishes))
+
+    def derive_trends(self, registry, fresh: int = ALL_COLLECTORS):
+        """Скользящие окна и EWMA по свежим сборщикам (fresh - маска, 0 - без обновления)."""
+        values = registry.values
+        present = registry.present
+        slot = registry.index
+        if fresh & ADC:
+            peak_slot = slot["temperature_max_celsius"]
+            if not present[peak_slot]:
+                peak_slot = slot["temperature_celsius"]
+            self.temperature_window_max.push(values[peak_slot])
+            self.temperature_ewma.update(values[slot["temperature_celsius"]])
+        if fresh & WIFI and values[slot["wifi_connected"]]:
+            rssi = values[slot["wifi_rssi_dbm"]]
+            self.rssi_window_min.push(rssi)
+            self.rssi_ewma.update(rssi * 100)
+        if fresh & MEMORY:
+            self.alloc_trend.push(
+                values[slot["memory_allocated_bytes"]], values[slot["uptime_seconds"]]
+            )
+
+        put = registry.put
+        if self.temperature_window_max.count:
+            put(slot["temperature_ewma_celsius"], self.temperature_ewma.get())
+            put(slot["temperature_window_max_celsius"], self.temperature_window_max.get())
+        if self.rssi_window_min.count:
+            put(slot["wifi_rssi_ewma_dbm"], self.rssi_ewma.get())
+            put(slot["wifi_rssi_window_min_dbm"], self.rssi_window_min.get())
+        put(slot["mqtt_publish_success_rate_window"], self.publish_rate.rate_x100())
+        put(slot["memory_alloc_slope_bytes_per_hour"], self.alloc_trend.slope_per_hour())
+
+    def derive_health(self, registry):
+        """Статус здоровья по правилам, применённым к этому же сэмплу."""
+        slot = registry.index
+        health = self.health_rules.evaluate(registry)
+        issues = health & 15
+        registry.put(slot["health_status"], health >> 4)
+        registry.put(slot["health_issues_count"], issues)
+        registry.put(slot["health_score"], max(0, 100 - issues * 25))
+
+    def derive(self, registry, fresh: int = ALL_COLLECTORS):
+        """Стадия 2: производные метрики и здоровье только из значений снимка.
+
+        fresh - маска сборщиков, прочитанных заново: только их значения
+        учитываются в экстремумах и скользящих окнах.
+        """
+        self.derive_memory(registry)
+        self.derive_wifi(registry, bool(fresh & WIFI))
+        self.derive_power(registry)
+        self.derive_performance(registry, bool(fresh & ADC))
+        self.derive_mqtt(registry)
+        self.derive_trends(registry, fresh)
+        self.derive_health(registry)
+
+    # --- информация об устройстве ---------------------------------------------
 
-        return {
-            "cpu_frequency_hz": cpu_freq,
-            "cpu_frequency_mhz": round(cpu_freq / 1_000_000, 2),
-            "cpu_mode": cpu_mode,
-            "cpu_temp_max_celsius": self.max_temp,
-        }
-
-    def get_mqtt_stats(self) -> dict:
-        """Статистика MQTT публикаций."""
-        current_time = time.time()
-        publish_interval = current_time - self.last_publish_time
-
-        total_publishes = self.mqtt_publish_success + self.mqtt_publish_failed
-        success_rate = 0
-        if total_publishes > 0:
-            success_rate = round((self.mqtt_publish_success / total_publishes) * 100, 2)
+    def get_system_info(self) -> dict:
+        """Информация о прошивке и ID устройства (кэшируется после загрузки)."""
+        if self._system_info is None:
+            unique_id = ubinascii.hexlify(machine.unique_id()).decode()
+            uname = uos.uname()
+
+            self._system_info = {
+                "sys_unique_id": unique_id,
+                "sys_version": uname.version,
+                "sys_platform": uname.sysname,
+                "sys_machine": uname.machine,
+                "sys_release": uname.release,
+            }
+        return self._system_info
+
+    def get_device_info(self) -> dict:
+        """Идентичность устройства для retained birth-сообщения."""
+        if self._wifi_mac is None:
+            self._wifi_mac = ubinascii.hexlify(self.wlan.config("mac"), ":").decode()
+
+        info = dict(self.get_system_info())
+        info["wifi_mac"] = self._wifi_mac
+
+        # Сетевые параметры меняются только при переподключении,
+        # а birth-сообщение отправляется как раз на каждом подключении
+        if self.wlan.isconnected():
+            ifconfig = self.wlan.ifconfig()
+            info["wifi_ip"] = ifconfig[0]
+            info["wifi_netmask"] = ifconfig[1]
+            info["wifi_gateway"] = ifconfig[2]
+            info["wifi_dns"] = ifconfig[3]
+        else:
+            info["wifi_ip"] = "0.0.0.0"
 
-        return {
-            "mqtt_publish_success_total": self.mqtt_publish_success,
-            "mqtt_publish_failed_total": self.mqtt_publish_failed,
-            "mqtt_publish_total": total_publishes,
-            "mqtt_publish_success_rate": success_rate,
-            "mqtt_publish_interval_seconds": round(publish_interval, 2),
-        }
+        return info
 
     def record_mqtt_publish(self, success: bool):
         """Записать результат MQTT публикации."""
@@ -227,51 +433,36 @@ class SystemMetrics:
             self.mqtt_publish_success += 1
         else:
             self.mqtt_publish_failed += 1
+        self.publish_rate.add(success)
         self.last_publish_time = time.time()
 
     def get_health_status(self) -> dict:
-        """Общий статус здоровья системы."""
-        temp = self.get_temperature()
-        mem_usage = (gc.mem_alloc() / (gc.mem_alloc() + gc.mem_free())) * 100
-
-        # Определяем статус здоровья
-        health_issues = []
-
-        if temp > 70:
-            health_issues.append("high_temperature")
-        if mem_usage > 90:
-            health_issues.append("high_memory_usage")
-        if self.wlan.isconnected():
-            rssi = self.wlan.status("rssi")
-            if rssi < -80:
-                health_issues.append("weak_wifi_signal")
-        else:
-            health_issues.append("wifi_disconnected")
-
-        health_status = "healthy" if len(health_issues) == 0 else "warning"
-        if temp > 75 or mem_usage > 95:
-            health_status = "critical"
-
+        """Статус здоровья по свежему облегчённому снимку (проверки между циклами).
+
+        Без сборки мусора, пробы фрагментации и сброса агрегатов АЦП; максимумы
+        температуры и худший RSSI не обновляются.
+        """
+        registry = self._check
+        registry.clear()
+        self.read_adc(registry, aggregate=False)
+        self.read_memory(registry, collect=False)
+        self.read_wifi(registry, 0)
+        self.read_cpu(registry)
+        self.read_counters(registry)
+        self.derive(registry, fresh=0)
         return {
-            "health_status": health_status,
-            "health_issues_count": len(health_issues),
-            "health_score": max(0, 100 - (len(health_issues) * 25)),
+            "health_status": registry.get("health_status"),
+            "health_issues_count": registry.get("health_issues_count"),
+            "health_score": registry.get("health_score"),
         }
 
-    def get_all_metrics(self, reconnect_count: int, error_count: int = 0) -> dict:
-        """Собрать все метрики."""
-        metrics = {
-            "temperature_celsius": self.get_temperature(),
-            "uptime_seconds": self.get_uptime(),
-            "error_count": error_count,
-        }
-        metrics.update(self.get_memory_stats())
-        metrics.update(self.get_wifi_metrics(reconnect_count))
-        metrics.update(self.get_system_info())
-        metrics.update(self.get_garbage_collector_stats())
-        metrics.update(self.get_power_metrics())
-        metrics.update(self.get_performance_metrics())
-        metrics.update(self.get_mqtt_stats())
-        metrics.update(self.get_health_status())
-
-        return metrics
+    def get_all_metrics(self, reconnect_count: int, error_count: int = 0) -> MetricRegistry:
+        """Собрать динамические метрики в реестр (идентичность уходит в birth-сообщение).
+
+        Реестр переиспользуется: значения действительны до следующего вызова.
+        """
+        registry = self.registry
+        registry.clear()
+        self.read_snapshot(reconnect_count, error_count)
+        self.derive(registry, self.fresh)
+        return registry
@@ -0,0 +1,65 @@
+"""Сценарии прошивки в host.sim: регрессии, которые видны только на часах работы.
+
+Запуск из корня репозитория:
+    python -m pytest -q tests
+"""
+
+from host.sim import Simulation
+
+# Сырые отсчёты АЦП: Vsys 3.2 В (батарея разряжена - самый длинный интервал)
+# и постоянная температура 27 °C, чтобы интервал не сжимался
+VSYS_CRITICAL_RAW = int(3.2 / 3 / 3.3 * 65535)
+TEMPERATURE_RAW = int(0.706 / 3.3 * 65535)
+
+
+def test_watchdog_survives_max_power_interval():
+    """Интервал POWER_MAX_INTERVAL на батарее - не зависание сэмплера."""
+    simulation = Simulation(
+        duration=3600,
+        config={"POWER_SCHEDULER": True, "WATCHDOG_TIMEOUT": 8},
+        adc={29: lambda now: VSYS_CRITICAL_RAW, 4: lambda now: TEMPERATURE_RAW},
+    )
+    simulation.env.network.rssi_fn = lambda now: -60
+    result = simulation.run()
+
+    scheduler = result.monitor.scheduler
+    assert scheduler.interval == scheduler.max_interval
+    assert result.env.boots == 1
+    assert result.monitor.state.watchdog_resets_total == 0
+
+
+def test_power_interval_stretches_from_one_second():
+    """Базовый интервал 1 с на батарее растёт до максимума, а не застревает на 1 с."""
+    simulation = Simulation(
+        duration=600,
+        config={"PUBLISH_INTERVAL": 1, "POWER_SCHEDULER": True, "POWER_MAX_INTERVAL": 30},
+        adc={29: lambda now: VSYS_CRITICAL_RAW, 4: lambda now: TEMPERATURE_RAW},
+    )
+    simulation.env.network.rssi_fn = lambda now: -60
+    result = simulation.run()
+
+    assert result.monitor.scheduler.interval == 30
+
+
+def test_async_runtime_samples_through_wifi_outage():
+    """AsyncRuntime на фейковом uasyncio: сетка сэмплов не ждёт сеть, пропуск досылается."""
+    result = Simulation(
+        duration=1800,
+        config={"RUNTIME_MODE": "async", "OFFLINE_BUFFER_SAMPLES": 64},
+        wifi_outages=[(600, 700)],
+    ).run()
+
+    monitor = result.monitor
+    assert result.env.boots == 1
+    assert monitor.error_count == 0
+    assert monitor.sample_seq >= 1800 // 10 - 1
+    stats = monitor.offline.get_stats()
+    assert stats["offline_samples_replayed_total"] >= 9
+    assert stats["offline_samples_dropped_total"] == 0
+
+
+def test_cycle_allocation_stays_bounded():
+    """Цикл сбор + публикация без проб фрагментации: рост аллокаций - регрессия."""
+    result = Simulation(duration=1800, config={"MEMORY_PROBE_EVERY": 0}).run()
+
+    assert result.summary()["alloc_bytes_per_cycle"] < 4096
@@ -1,34 +1,264 @@
-"""Управление WiFi подключением."""
+"""Управление WiFi подключением.
+
+Статус опрашивается мелким шагом, а не раз в секунду. После первого
+подключения BSSID и канал точки запоминаются на flash, и повторное
+подключение идёт прямо к ним, без сканирования эфира. Если задан
+статический адрес, DHCP тоже пропускается. Паузы между неудачными
+попытками растут экспоненциально со случайным разбросом, чтобы устройства
+парка после общего обрыва не ломились к точке одновременно.
+"""
 
 import network
 import time
+import ubinascii
+import urandom
+
+from array import array
+
+# Файл с BSSID и каналом последней точки доступа
+AP_CACHE_FILE = "wifi_ap.txt"
+
+# Сканирование эфира блокирует на 1-2 с: обновление точки не чаще раза в минуту
+AP_SCAN_INTERVAL_MS = 60000
+
+# Верхние границы корзин гистограмм задержек, мс (последняя - всё остальное)
+LATENCY_BOUNDS_MS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с фиксированными корзинами."""
+
+    def __init__(self):
+        self.buckets = array("I", bytes(4 * (len(LATENCY_BOUNDS_MS) + 1)))
+        self.count = 0
+        self.total_ms = 0
+        self.last_ms = 0
+        self.max_ms = 0
+
+    def record(self, value_ms: int):
+        index = 0
+        while index < len(LATENCY_BOUNDS_MS) and value_ms > LATENCY_BOUNDS_MS[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        self.last_ms = value_ms
+        if value_ms > self.max_ms:
+            self.max_ms = value_ms
+
+    def quantile(self, quantile: float) -> int:
+        """Верхняя граница корзины с квантилем; для последней - максимум."""
+        target = quantile * self.count
+        cumulative = 0
+        for i in range(len(LATENCY_BOUNDS_MS)):
+            cumulative += self.buckets[i]
+            if cumulative >= target:
+                return LATENCY_BOUNDS_MS[i]
+        return self.max_ms
+
+    def get_stats(self, prefix: str, buckets: bool = False) -> dict:
+        """<prefix>_{count,last,max,p95}; с buckets - ещё _sum и накопительные _le_<граница>."""
+        stats = {
+            prefix + "_count": self.count,
+            prefix + "_last": self.last_ms,
+            prefix + "_max": self.max_ms,
+            prefix + "_p95": self.quantile(0.95) if self.count else 0,
+        }
+        if buckets:
+            stats[prefix + "_sum"] = self.total_ms
+            cumulative = 0
+            for i, bound in enumerate(LATENCY_BOUNDS_MS):
+                cumulative += self.buckets[i]
+                stats[prefix + "_le_" + str(bound)] = cumulative
+        return stats
 
 
 class WiFiManager:
-    def __init__(self, ssid: str, password: str):
+    def __init__(
+        self,
+        ssid: str,
+        password: str,
+        static_ip: tuple = None,
+        fast_rejoin: bool = True,
+        poll_ms: int = 50,
+        timeout_ms: int = 15000,
+        backoff_min_ms: int = 500,
+        backoff_max_ms: int = 10000,
+        wait_ms=None,
+    ):
         self.ssid = ssid
         self.password = password
+        self.static_ip = static_ip
+        self.fast_rejoin = fast_rejoin
+        self.poll_ms = poll_ms
+        self.timeout_ms = timeout_ms
+        self.backoff_min_ms = backoff_min_ms
+        self.backoff_max_ms = backoff_max_ms
+        # Пауза между опросами статуса (со сторожевым таймером - с кормлением)
+        self.wait_ms = wait_ms or time.sleep_ms
         self.wlan = network.WLAN(network.STA_IF)
 
-    def connect(self) -> bool:
-        print(f"Connecting to WiFi '{self.ssid}'...")
+        self.ap = self._load_ap() if fast_rejoin else None
+        self.ap_stale = False
+        self.last_scan = None
+        self.fast_attempt = False
+        self.backoff_ms = 0
+
+        # Моменты обнаружения обрыва: WiFi - для времени переподключения,
+        # любого (WiFi или MQTT) - для времени до первой публикации
+        self.wifi_lost_at = None
+        self.link_lost_at = None
+        self.reconnect_hist = LatencyHistogram()
+        self.first_publish_hist = LatencyHistogram()
+        self.fast_rejoin_total = 0
+        self.fast_rejoin_failed_total = 0
+        # Корзины гистограмм публикуются один раз после изменения, а не в каждом сэмпле
+        self.buckets_changed = False
+
+    def _load_ap(self):
+        try:
+            with open(AP_CACHE_FILE) as f:
+                bssid, channel = f.read().split()
+            return ubinascii.unhexlify(bssid), int(channel)
+        except (OSError, ValueError):
+            return None
+
+    def scan_ap(self) -> bool:
+        """Найти точку с лучшим сигналом для нашего SSID и запомнить её; False - не видна."""
+        self.last_scan = time.ticks_ms()
+        best = None
+        for ssid, bssid, channel, rssi, *_ in self.wlan.scan():
+            if ssid.decode() == self.ssid and (best is None or rssi > best[2]):
+                best = (bssid, channel, rssi)
+        if best is None:
+            return False
+        if self.ap == best[:2]:
+            return True
+        self.ap = best[:2]
+        try:
+            with open(AP_CACHE_FILE, "w") as f:
+                f.write(f"{ubinascii.hexlify(best[0]).decode()} {best[1]}")
+        except OSError as e:
+            print(f"AP cache write failed: {e}")
+        return True
+
+    def start_connect(self, fast: bool = True):
+        """Запустить подключение, не дожидаясь результата."""
         self.wlan.active(True)
-        self.wlan.connect(self.ssid, self.password)
+        if self.static_ip:
+            self.wlan.ifconfig(self.static_ip)
+        self.fast_attempt = fast and self.ap is not None
+        if self.fast_attempt:
+            print(f"Rejoining WiFi '{self.ssid}' (channel {self.ap[1]})...")
+            self.wlan.connect(self.ssid, self.password, bssid=self.ap[0], channel=self.ap[1])
+        else:
+            print(f"Connecting to WiFi '{self.ssid}'...")
+            self.wlan.connect(self.ssid, self.password)
 
-        max_wait = 15
-        while max_wait > 0:
-            if self.wlan.status() < 0 or self.wlan.status() >= 3:
-                break
-            max_wait -= 1
-            print("Waiting for connection...")
-            time.sleep(1)
+    def connect_finished(self) -> bool:
+        """Подключение завершилось успехом или ошибкой."""
+        status = self.wlan.status()
+        return status < 0 or status >= 3
 
+    def finish_connect(self) -> bool:
+        """Итог попытки: учёт быстрого пути и времени переподключения."""
         if self.wlan.status() != 3:
-            print("WiFi connection failed")
+            self.wlan.disconnect()
+            if self.fast_attempt:
+                self.fast_rejoin_failed_total += 1
             return False
 
+        if self.fast_attempt:
+            self.fast_rejoin_total += 1
+        # Без MQTT record_publish() не вызывается: пауза сбрасывается здесь
+        self.backoff_ms = 0
+        if self.wifi_lost_at is not None:
+            self.reconnect_hist.record(time.ticks_diff(time.ticks_ms(), self.wifi_lost_at))
+            self.wifi_lost_at = None
+            self.buckets_changed = True
         print(f"Connected! IP: {self.wlan.ifconfig()[0]}")
+        # Полное подключение прошло, а быстрое нет (или кэша не было) - точку
+        # нужно запомнить заново; сканирование позже, в refresh_ap()
+        if self.fast_rejoin and not self.fast_attempt:
+            self.ap_stale = True
         return True
 
+    def connect(self) -> bool:
+        """Подключение с опросом статуса каждые poll_ms.
+
+        Сначала к запомненной точке. Не вышло - сканирование: точки нет в эфире,
+        значит, она выключена и полное подключение тоже не пройдёт; есть - полное
+        подключение (точка могла сменить BSSID или канал).
+        """
+        fast = True
+        while True:
+            self.start_connect(fast)
+            started = time.ticks_ms()
+            while not self.connect_finished():
+                if time.ticks_diff(time.ticks_ms(), started) > self.timeout_ms:
+                    break
+                self.wait_ms(self.poll_ms)
+
+            if self.finish_connect():
+                return True
+            if not self.fast_attempt or not self.scan_ap():
+                break
+            print("Cached AP rejoin failed, falling back to full connect")
+            fast = False
+
+        print("WiFi connection failed")
+        return False
+
     def is_connected(self) -> bool:
         return self.wlan.status() == 3
+
+    def mark_lost(self, wifi: bool = True):
+        """Обнаружен обрыв; повторные вызовы до восстановления не сдвигают отсчёт."""
+        now = time.ticks_ms()
+        if wifi and self.wifi_lost_at is None:
+            self.wifi_lost_at = now
+        if self.link_lost_at is None:
+            self.link_lost_at = now
+
+    def record_publish(self):
+        """Успешная публикация: закрыть отсчёт времени до первой публикации."""
+        if self.link_lost_at is not None:
+            self.first_publish_hist.record(time.ticks_diff(time.ticks_ms(), self.link_lost_at))
+            self.link_lost_at = None
+            self.buckets_changed = True
+        else:
+            # Этот сэмпл уже унёс корзины, собранные до него
+            self.buckets_changed = False
+        self.backoff_ms = 0
+
+    def refresh_ap(self):
+        """Запомнить точку после полного подключения.
+
+        Сканирование блокирует: вызывается только между сэмплами, где пауза
+        не сдвигает замер, и не чаще AP_SCAN_INTERVAL_MS.
+        """
+        if not self.ap_stale or not self.is_connected():
+            return
+        if (
+            self.last_scan is not None
+            and time.ticks_diff(time.ticks_ms(), self.last_scan) < AP_SCAN_INTERVAL_MS
+        ):
+            return
+        self.ap_stale = False
+        self.scan_ap()
+
+    def next_backoff(self) -> int:
+        """Пауза перед следующей попыткой: удвоение и случайная половина сверху."""
+        self.backoff_ms = min(self.backoff_max_ms, max(self.backoff_min_ms, self.backoff_ms * 2))
+        half = self.backoff_ms // 2
+        return half + (urandom.getrandbits(16) * half >> 16)
+
+    def get_stats(self) -> dict:
+        stats = {
+            "wifi_fast_rejoin_total": self.fast_rejoin_total,
+            "wifi_fast_rejoin_failed_total": self.fast_rejoin_failed_total,
+        }
+        buckets = self.buckets_changed
+        stats.update(self.reconnect_hist.get_stats("wifi_reconnect_ms", buckets))
+        stats.update(self.first_publish_hist.get_stats("wifi_first_publish_ms", buckets))
+        return stats